@@ -0,0 +1,364 @@
+import math
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from QQDP_scoring import (
+    MAX_DISTANCE_KM,
+    MIN_QUALITY,
+    MIN_QUANTITY_RATIO,
+    compute_quality,
+    compute_weights,
+    haversine_km,
+)
+
+# Values this close to a rounding or filter boundary are recomputed with the
+# pure-Python functions, so SIMD ulp differences can never change the output.
+BOUNDARY_TOLERANCE = 1e-7
+
+NUMERIC_FIELDS = (
+    "seller_lat", "seller_lon",
+    "product_quality", "reliability", "avg_rating", "review_count",
+    "available_qty", "required_qty", "price",
+)
+
+# -------------------------------------------------
+# COLUMNAR CATALOG
+# -------------------------------------------------
+class ColumnarCatalog:
+    """
+    Catalog items stored as NumPy columns.
+
+    Quality depends only on the item, so it is computed once here rather
+    than on every ranking request.
+    """
+
+    def __init__(
+        self,
+        columns: Dict[str, np.ndarray],
+        labels: Dict[str, Sequence],
+        quality: Optional[np.ndarray] = None
+    ):
+        self.columns = columns
+        self.labels = labels
+        self.size = len(labels["item_id"])
+        self.quality = _quality(columns, labels) if quality is None else quality
+
+    @classmethod
+    def from_items(cls, items: Sequence[Mapping]) -> "ColumnarCatalog":
+        columns = {
+            field: np.array([item[field] for item in items], dtype=np.float64)
+            for field in NUMERIC_FIELDS
+        }
+        labels = {
+            "item_id": [item["item_id"] for item in items],
+            "category": [item["category"] for item in items],
+            "name": [item["name"] for item in items],
+            "seller": [item["seller_name"] for item in items],
+            # Original objects, so output prices keep their JSON type (int/float).
+            "price": [item["price"] for item in items],
+            "review_count": [item["review_count"] for item in items],
+        }
+        return cls(columns, labels)
+
+    @classmethod
+    def from_binary(cls, binary, rows: Sequence[int]) -> "ColumnarCatalog":
+        """
+        Columns over rows of a catalog_binary.BinaryCatalog. A contiguous
+        range of rows (a whole category) is a zero-copy view of the mapping;
+        labels are decoded only for the rows that end up in a result.
+        """
+        columns = {field: binary.numpy_column(field, rows) for field in NUMERIC_FIELDS}
+        labels = {
+            "item_id": binary.label_column("item_id", rows),
+            "category": binary.label_column("category", rows),
+            "name": binary.label_column("name", rows),
+            "seller": binary.label_column("seller_name", rows),
+            "price": binary.label_column("price", rows),
+            "review_count": binary.label_column("review_count", rows),
+        }
+        return cls(columns, labels, binary.numpy_column("quality", rows))
+
+    def replace_rows(self, rows: Sequence[int], items: Sequence[Mapping]) -> "ColumnarCatalog":
+        """
+        A copy with rows[i] holding items[i]; this catalog is left as it is.
+        Only the columns and labels the new items change are copied.
+        """
+        patch = ColumnarCatalog.from_items(items)
+        index = np.asarray(rows, dtype=np.intp)
+        columns = dict(self.columns)
+        for field, column in self.columns.items():
+            if not np.array_equal(column[index], patch.columns[field]):
+                columns[field] = column.copy()
+                columns[field][index] = patch.columns[field]
+        labels = dict(self.labels)
+        for field, values in self.labels.items():
+            changed = [(row, value) for row, value in zip(rows, patch.labels[field]) if values[row] != value]
+            if changed:
+                labels[field] = list(values)
+                for row, value in changed:
+                    labels[field][row] = value
+        quality = self.quality.copy()
+        quality[index] = patch.quality
+        return ColumnarCatalog(columns, labels, quality)
+
+
+def _needs_exact(values: np.ndarray, ndigits: int) -> np.ndarray:
+    scaled = values * (10 ** ndigits)
+    return np.abs(scaled - np.floor(scaled) - 0.5) < BOUNDARY_TOLERANCE
+
+
+def _round(values: np.ndarray, ndigits: int) -> np.ndarray:
+    """np.round, patched with Python's round() where the two can disagree."""
+    out = np.round(values, ndigits)
+    ties = _needs_exact(values, ndigits)
+    if ties.any():
+        out[ties] = [round(v, ndigits) for v in values[ties].tolist()]
+    return out
+
+
+def _quality(columns: Dict[str, np.ndarray], labels: Dict[str, list]) -> np.ndarray:
+    rating = columns["avg_rating"]
+    reviews = columns["review_count"]
+
+    review_signal = np.minimum((rating / 5) * np.log10(reviews + 1), 1)
+    review_signal = np.where((reviews == 0) | (rating == 0), 0, review_signal)
+
+    raw = (
+        0.45 * columns["product_quality"] +
+        0.35 * columns["reliability"] +
+        0.20 * review_signal
+    )
+    quality = np.round(raw, 3)
+
+    # log10 may differ from math.log10 by an ulp; settle edge cases exactly.
+    fragile = np.flatnonzero(_needs_exact(raw, 3))
+    for pos in fragile.tolist():
+        quality[pos] = compute_quality({
+            "review_count": labels["review_count"][pos],
+            "avg_rating": rating[pos].item(),
+            "product_quality": columns["product_quality"][pos].item(),
+            "reliability": columns["reliability"][pos].item(),
+        })
+    return quality
+
+
+# -------------------------------------------------
+# VECTORIZED HAVERSINE
+# -------------------------------------------------
+def haversine_km_vec(lat1: float, lon1: float, lat2: np.ndarray, lon2: np.ndarray) -> np.ndarray:
+    R = 6371
+    phi1, phi2 = math.radians(lat1), np.radians(lat2)
+    dphi = np.radians(lat2 - lat1)
+    dlambda = np.radians(lon2 - lon1)
+
+    a = (
+        np.sin(dphi / 2) ** 2 +
+        math.cos(phi1) * np.cos(phi2) *
+        np.sin(dlambda / 2) ** 2
+    )
+    return 2 * R * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def _top_order(scores: np.ndarray, k: Optional[int]) -> np.ndarray:
+    """Indices of the k best scores, ordered like a stable descending sort."""
+    if k is not None and k < scores.size:
+        kth = scores[np.argpartition(-scores, k - 1)[:k]].min()
+        above = np.flatnonzero(scores > kth)
+        # Among ties at the cut-off, earlier rows win (stable order).
+        at_cut = np.flatnonzero(scores == kth)[:k - above.size]
+        chosen = np.sort(np.concatenate((above, at_cut)))
+        return chosen[np.argsort(-scores[chosen], kind="stable")]
+
+    # Stable sort on the negated score == sorted(..., reverse=True).
+    return np.argsort(-scores, kind="stable")
+
+
+# -------------------------------------------------
+# RANK ITEMS (COLUMNAR)
+# -------------------------------------------------
+def rank_items_numpy(
+    catalog: ColumnarCatalog,
+    preference: Dict[str, str],
+    farmer: Tuple[float, float],
+    positions: Optional[Sequence[int]] = None,
+    k: Optional[int] = None
+) -> List[Dict]:
+    """
+    Same output as QQDP_scoring.rank_items over the catalog's items
+    (same rounding, same tie order).
+
+    positions: optional candidate rows (e.g. from a GridIndex query) in
+    ascending order. Price normalisation always spans the whole catalog.
+    k: return only the top k (rank_items_topk semantics) using a partial
+    selection instead of a full sort.
+    """
+    if k is not None and k <= 0:
+        return []
+    if catalog.size == 0:
+        return []
+
+    rows = np.arange(catalog.size) if positions is None else np.asarray(positions, dtype=np.intp)
+    if rows.size == 0:
+        return []
+
+    cols = catalog.columns
+    distance_km = haversine_km_vec(
+        farmer[0], farmer[1], cols["seller_lat"][rows], cols["seller_lon"][rows]
+    )
+    return _rank_rows(catalog, rows, distance_km, preference, farmer, k)
+
+
+def rank_items_numpy_batch(
+    catalog: ColumnarCatalog,
+    farmers: Sequence[Tuple[float, float]],
+    preferences: Sequence[Dict[str, str]],
+    k: Optional[int] = None,
+    max_cells: int = 4_000_000
+) -> List[List[Dict]]:
+    """
+    rank_items_numpy for many farmers over one catalog.
+
+    Quality/quantity filters are applied once for all farmers, then the
+    farmer x seller distance matrix is computed in blocks of at most
+    max_cells entries. Result i equals rank_items_numpy(catalog,
+    preferences[i], farmers[i], k=k).
+    """
+    if not farmers:
+        return []
+    if catalog.size == 0 or (k is not None and k <= 0):
+        return [[] for _ in farmers]
+
+    cols = catalog.columns
+    quantity = np.minimum(cols["available_qty"] / cols["required_qty"], 1)
+    rows = np.flatnonzero((catalog.quality >= MIN_QUALITY) & (quantity >= MIN_QUANTITY_RATIO))
+    if rows.size == 0:
+        return [[] for _ in farmers]
+
+    seller_lat = cols["seller_lat"][rows]
+    seller_lon = cols["seller_lon"][rows]
+    farmer_arr = np.asarray(farmers, dtype=np.float64).reshape(-1, 2)
+    block = max(1, max_cells // rows.size)
+
+    results = []
+    for start in range(0, len(farmer_arr), block):
+        lat1 = farmer_arr[start:start + block, 0:1]
+        lon1 = farmer_arr[start:start + block, 1:2]
+        matrix = _haversine_matrix(lat1, lon1, seller_lat, seller_lon)
+
+        for offset in range(matrix.shape[0]):
+            i = start + offset
+            near = np.flatnonzero(matrix[offset] <= MAX_DISTANCE_KM + 1)
+            results.append(_rank_rows(
+                catalog, rows[near], matrix[offset, near].copy(),
+                preferences[i], tuple(farmers[i]), k,
+            ))
+    return results
+
+
+def _haversine_matrix(lat1: np.ndarray, lon1: np.ndarray, lat2: np.ndarray, lon2: np.ndarray) -> np.ndarray:
+    """haversine_km_vec broadcast over a column of farmers and a row of sellers."""
+    R = 6371
+    phi1, phi2 = np.radians(lat1), np.radians(lat2)
+    dphi = np.radians(lat2 - lat1)
+    dlambda = np.radians(lon2 - lon1)
+
+    a = (
+        np.sin(dphi / 2) ** 2 +
+        np.cos(phi1) * np.cos(phi2) *
+        np.sin(dlambda / 2) ** 2
+    )
+    return 2 * R * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def _rank_rows(
+    catalog: ColumnarCatalog,
+    rows: np.ndarray,
+    distance_km: np.ndarray,
+    preference: Dict[str, str],
+    farmer: Tuple[float, float],
+    k: Optional[int]
+) -> List[Dict]:
+    """Filter, score and order catalog `rows` given their (approximate) distances."""
+    if rows.size == 0:
+        return []
+
+    cols = catalog.columns
+    price_all = cols["price"]
+    price_min, price_max = price_all.min(), price_all.max()
+
+    seller_lat = cols["seller_lat"][rows]
+    seller_lon = cols["seller_lon"][rows]
+    price = price_all[rows]
+    quality = catalog.quality[rows]
+
+    # Re-run the scalar haversine where an ulp could flip the radius filter
+    # or the 2-decimal rounding of distance_km.
+    fragile = (
+        (np.abs(distance_km - MAX_DISTANCE_KM) < BOUNDARY_TOLERANCE) |
+        _needs_exact(distance_km, 2)
+    )
+    for i in np.flatnonzero(fragile).tolist():
+        distance_km[i] = haversine_km(
+            farmer[0], farmer[1], seller_lat[i].item(), seller_lon[i].item()
+        )
+
+    quantity = np.minimum(cols["available_qty"][rows] / cols["required_qty"][rows], 1)
+    distance_score = np.maximum(0, 1 - (distance_km / MAX_DISTANCE_KM))
+    if price_max == price_min:
+        price_score = np.ones_like(price)
+    else:
+        price_score = (price_max - price) / (price_max - price_min)
+
+    # ---------------- HARD FILTERS ----------------
+    keep = np.flatnonzero(
+        (quality >= MIN_QUALITY) &
+        (quantity >= MIN_QUANTITY_RATIO) &
+        (distance_km <= MAX_DISTANCE_KM)
+    )
+    if keep.size == 0:
+        return []
+
+    wQ, wQt, wD, wP = compute_weights(preference)
+    final_score = (
+        wQ  * quality[keep] +
+        wQt * quantity[keep] +
+        wD  * distance_score[keep] +
+        wP  * price_score[keep]
+    )
+
+    # Near a 3-decimal tie the distance ulp matters too: redo those rows in
+    # scalar Python exactly as qqdp_score does.
+    for j in np.flatnonzero(_needs_exact(final_score, 3)).tolist():
+        i = keep[j]
+        distance_km[i] = haversine_km(
+            farmer[0], farmer[1], seller_lat[i].item(), seller_lon[i].item()
+        )
+        final_score[j] = (
+            wQ  * quality[i].item() +
+            wQt * quantity[i].item() +
+            wD  * max(0, 1 - (distance_km[i].item() / MAX_DISTANCE_KM)) +
+            wP  * price_score[i].item()
+        )
+    final_score = _round(final_score, 3)
+
+    order = _top_order(final_score, k)
+    keep_sorted = keep[order]
+    final_sorted = final_score[order].tolist()
+    distance_sorted = _round(distance_km[keep_sorted], 2).tolist()
+    quality_sorted = quality[keep_sorted].tolist()
+
+    labels = catalog.labels
+    ranked = []
+    for n, row in enumerate(rows[keep_sorted].tolist()):
+        ranked.append({
+            "item_id": labels["item_id"][row],
+            "category": labels["category"][row],
+            "name": labels["name"][row],
+            "seller": labels["seller"][row],
+            "distance_km": distance_sorted[n],
+            "quality": quality_sorted[n],
+            "final_score": final_sorted[n],
+            "price": labels["price"][row],
+        })
+    return ranked
@@ -1,7 +1,10 @@
 import os
 import math
 import json
-from typing import List, Dict, Tuple
+import heapq
+from typing import List, Dict, Tuple, Mapping, Optional
+
+from spatial_index import bounding_box
 
 # -------------------------------------------------
 # CONFIG
@@ -36,6 +39,33 @@ def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     )
     return 2 * R * math.atan2(math.sqrt(a), math.sqrt(1 - a))
 
+
+def within_radius_box(
+    items: List[Mapping],
+    farmer: Tuple[float, float],
+    radius_km: float = MAX_DISTANCE_KM
+) -> List[Mapping]:
+    """
+    Bounding-box reject ahead of the exact distance check. Keeps the items
+    whose seller lies inside the lat/lon box holding every point within
+    radius_km of the farmer (spatial_index.bounding_box, computed once per
+    farmer); the box only drops sellers farther than radius_km. The exact
+    haversine check then runs for the kept items alone, in qqdp_score.
+    Longitudes are expected in [-180, 180].
+    """
+    lat_min, lat_max, lon_ranges = bounding_box(farmer[0], farmer[1], radius_km)
+    if len(lon_ranges) == 1:
+        lon_min, lon_max = lon_ranges[0]
+        return [
+            item for item in items
+            if lat_min <= item["seller_lat"] <= lat_max and lon_min <= item["seller_lon"] <= lon_max
+        ]
+    return [
+        item for item in items
+        if lat_min <= item["seller_lat"] <= lat_max and
+        any(lon_lo <= item["seller_lon"] <= lon_hi for lon_lo, lon_hi in lon_ranges)
+    ]
+
 # -------------------------------------------------
 # QUALITY (FINAL, COMPOSITE)
 # -------------------------------------------------
@@ -87,27 +117,49 @@ def compute_weights(preference: Dict[str, str]) -> Tuple[float, float, float, fl
 # QQDP SCORE (FINAL)
 # -------------------------------------------------
 def qqdp_score(
-    item: Dict,
+    item: Mapping,
     price_min: float,
     price_max: float,
-    preference: Dict[str, str]
+    preference: Dict[str, str],
+    farmer: Optional[Tuple[float, float]] = None
 ) -> Dict | None:
+    """
+    farmer: (lat, lon). When omitted, item["farmer_lat"] / item["farmer_lon"]
+    are used, so catalog items can be scored without being mutated.
+    """
+
+    farmer_lat, farmer_lon = farmer or (item["farmer_lat"], item["farmer_lon"])
 
     # Distance
     distance_km = haversine_km(
-        item["farmer_lat"], item["farmer_lon"],
+        farmer_lat, farmer_lon,
         item["seller_lat"], item["seller_lon"]
     )
 
     # Core components
     quality = compute_quality(item)
     quantity = min(item["available_qty"] / item["required_qty"], 1)
-    distance_score = max(0, 1 - (distance_km / MAX_DISTANCE_KM))
-
     price_score = 1 if price_max == price_min else (
         (price_max - item["price"]) / (price_max - price_min)
     )
 
+    return score_from_components(item, distance_km, quality, quantity, price_score, preference)
+
+
+def score_from_components(
+    item: Mapping,
+    distance_km: float,
+    quality: float,
+    quantity: float,
+    price_score: float,
+    preference: Dict[str, str]
+) -> Dict | None:
+    """
+    Second half of qqdp_score, for callers that cached the farmer-independent
+    components (quality, quantity, price_score) and only computed distance_km.
+    """
+    distance_score = max(0, 1 - (distance_km / MAX_DISTANCE_KM))
+
     # ---------------- HARD FILTERS ----------------
     if (
         quality < MIN_QUALITY or
@@ -140,17 +192,59 @@ def qqdp_score(
 # -------------------------------------------------
 # RANK ITEMS (GENERIC)
 # -------------------------------------------------
-def rank_items(items: List[Dict], preference: Dict[str, str]) -> List[Dict]:
+def rank_items(
+    items: List[Mapping],
+    preference: Dict[str, str],
+    farmer: Optional[Tuple[float, float]] = None,
+    spatial_index=None
+) -> List[Dict]:
+    """
+    spatial_index: optional spatial_index.GridIndex built over `items`.
+    When given (with `farmer`), only sellers inside the MAX_DISTANCE_KM box
+    are scored. Price normalisation still spans all items, so the result is
+    identical to a full scan.
+    """
+    scored = _score_items(items, preference, farmer, spatial_index)
+    return sorted(scored, key=lambda x: x["final_score"], reverse=True)
+
+
+def rank_items_topk(
+    items: List[Mapping],
+    preference: Dict[str, str],
+    k: int,
+    farmer: Optional[Tuple[float, float]] = None,
+    spatial_index=None
+) -> List[Dict]:
+    """
+    rank_items(...)[:k] via heap selection: O(n log k) instead of a full sort.
+    heapq.nlargest is stable, so ties keep the same order as rank_items.
+    """
+    if k <= 0:
+        return []
+    scored = _score_items(items, preference, farmer, spatial_index)
+    return heapq.nlargest(k, scored, key=lambda x: x["final_score"])
+
+
+def _score_items(items, preference, farmer, spatial_index) -> List[Dict]:
     prices = [i["price"] for i in items]
     price_min, price_max = min(prices), max(prices)
 
+    candidates = items
+    if farmer is not None:
+        if spatial_index is not None:
+            # The index query already applies the same bounding box.
+            candidates = [
+                items[pos] for pos in spatial_index.query(farmer[0], farmer[1], MAX_DISTANCE_KM)
+            ]
+        else:
+            candidates = within_radius_box(items, farmer)
+
     scored = []
-    for item in items:
-        result = qqdp_score(item, price_min, price_max, preference)
+    for item in candidates:
+        result = qqdp_score(item, price_min, price_max, preference, farmer)
         if result:
             scored.append(result)
-
-    return sorted(scored, key=lambda x: x["final_score"], reverse=True)
+    return scored
 
 # -------------------------------------------------
 # MAIN (EXAMPLE FLOW)
@@ -1,17 +1,27 @@
 import os
 import re
-import json
+import hmac
 import logging
-import requests
 import google.generativeai as genai
 from dotenv import load_dotenv
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+from flask import Flask, Response, render_template, request, jsonify, session, redirect, url_for
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
-from werkzeug.security import generate_password_hash, check_password_hash
 
-from QQDP_scoring import rank_items
-from db import init_db, load_users, save_user, load_orders, save_order
+from QQDP_scoring import MAX_DISTANCE_KM, rank_items_topk
+from catalog_store import CatalogStore
+from catalog_updates import ChangeLog, LiveCatalogStore
+from explanation_cache import ExplanationCache
+from explanations import build_prompt, call_with_deadline, stream_explanation, template_reply
+from ranking_cache import RankingCache, rank_candidates
+from recommendation_tiles import RecommendationTiles
+from gazetteer import GAZETTEER_PATH, LazyGazetteer
+from instrumentation import Instrumentation
+from pincode_client import CircuitBreaker, PincodeClient
+from product_flow import PRODUCT_FLOW, preference_levels
+from password_hasher import DEFAULT_METHOD, HasherBusy, PasswordHasher
+from db import init_db, get_user, user_exists, create_user, update_password_hash, list_orders
 
 # --------------------
 # Logging
@@ -29,6 +39,12 @@ load_dotenv()
 
 app = Flask(__name__)
 
+# Per-stage timings (Server-Timing header + /metrics); off unless METRICS_ENABLED=1.
+metrics = Instrumentation(enabled=os.getenv("METRICS_ENABLED", "0") == "1")
+metrics.init_app(app)
+# /metrics and /stats answer only with this bearer token (404 when unset).
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
 SECRET_KEY = os.getenv("SECRET_KEY")
 if not SECRET_KEY:
     # Keep production strict, but allow local development to boot without .env.
@@ -38,20 +54,102 @@ if not SECRET_KEY:
     SECRET_KEY = "dev-secret-key-change-me"
 app.secret_key = SECRET_KEY
 
+# "python" (default) or "numpy" for the columnar QQDP_numpy engine
+QQDP_ENGINE = os.getenv("QQDP_ENGINE", "python").lower()
+if QQDP_ENGINE not in {"python", "numpy"}:
+    raise RuntimeError(f"Unknown QQDP_ENGINE: {QQDP_ENGINE}")
+if QQDP_ENGINE == "numpy":
+    from QQDP_numpy import rank_items_numpy
+
+try:
+    from QQDP_numpy import rank_items_numpy_batch
+except ImportError:  # NumPy not installed: batches are ranked member by member
+    rank_items_numpy_batch = None
+
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 GEMINI_MODEL_ID = os.getenv("GEMINI_MODEL_ID")
 
+# GEMINI_API_ENDPOINT points the client at another host, e.g. the stub in
+# benchmarks/stub_services.py; custom endpoints are spoken to over REST.
+GEMINI_API_ENDPOINT = os.getenv("GEMINI_API_ENDPOINT")
+GEMINI_TRANSPORT = os.getenv("GEMINI_TRANSPORT") or ("rest" if GEMINI_API_ENDPOINT else None)
+# The REST transport has no async client: asgi.py then streams explanations
+# from a thread like the WSGI app does.
+GEMINI_ASYNC = GEMINI_TRANSPORT != "rest"
+
 model = None
 if GOOGLE_API_KEY and GEMINI_MODEL_ID:
-    genai.configure(api_key=GOOGLE_API_KEY)
+    genai.configure(
+        api_key=GOOGLE_API_KEY,
+        transport=GEMINI_TRANSPORT,
+        client_options={"api_endpoint": GEMINI_API_ENDPOINT} if GEMINI_API_ENDPOINT else None,
+    )
     model = genai.GenerativeModel(GEMINI_MODEL_ID)
 
 BASE_PATH = os.path.dirname(os.path.abspath(__file__))
 MATERIALS_PATH = os.path.join(BASE_PATH, "list_material.json")
 
-# Initialise persistent storage (Supabase or JSON fallback)
+# Parsed once per worker; reloaded only when the file changes on disk.
+# CATALOG_PATH may point at a compiled catalog (python -m catalog_binary build),
+# which is memory-mapped and shared by all workers instead of parsed; with
+# CATALOG_SOURCE_PATH set, a compiled file older than that JSON is refused.
+# With CATALOG_CHANGELOG_PATH set, sellers' price/stock updates
+# (POST /api/catalog/changes) are logged there and applied in place by
+# every worker, on top of the file.
+CATALOG_CHANGELOG_PATH = os.getenv("CATALOG_CHANGELOG_PATH")
+CATALOG_UPDATE_TOKEN = os.getenv("CATALOG_UPDATE_TOKEN")
+if CATALOG_CHANGELOG_PATH:
+    catalog = LiveCatalogStore(
+        os.getenv("CATALOG_PATH", MATERIALS_PATH),
+        ChangeLog(CATALOG_CHANGELOG_PATH),
+        poll_seconds=float(os.getenv("CATALOG_CHANGES_POLL", 1)),
+        source_path=os.getenv("CATALOG_SOURCE_PATH"),
+    )
+else:
+    catalog = CatalogStore(os.getenv("CATALOG_PATH", MATERIALS_PATH), os.getenv("CATALOG_SOURCE_PATH"))
+
+# Identical (top items, preference, product) inputs reuse one Gemini answer.
+explanation_cache = ExplanationCache(
+    max_entries=int(os.getenv("EXPLANATION_CACHE_SIZE", 512)),
+    ttl_seconds=float(os.getenv("EXPLANATION_CACHE_TTL", 3600)),
+)
+
+# Latency budget (seconds) for a Gemini explanation; past it the farmer gets
+# the template reply built from the ranked items.
+EXPLANATION_TIMEOUT = float(os.getenv("EXPLANATION_TIMEOUT", 4))
+
+# A streamed recommendation hands out a signed token carrying the
+# explanation's inputs, so starting a stream writes nothing to the session.
+explanation_tokens = URLSafeTimedSerializer(SECRET_KEY, salt="explanation")
+EXPLANATION_TOKEN_MAX_AGE = 600
+
+# Farmers in the same ~1 km cell share ranking candidates; 0 disables.
+RANKING_CACHE_SIZE = int(os.getenv("RANKING_CACHE_SIZE", 4096))
+ranking_cache = RankingCache(
+    max_entries=RANKING_CACHE_SIZE,
+    cell_deg=float(os.getenv("RANKING_CACHE_CELL_DEG", 0.01)),
+) if RANKING_CACHE_SIZE > 0 else None
+
+# Offline-built tiles (python -m recommendation_tiles build) answer tiled
+# cells in O(1); anything missing or built from another catalog ranks live.
+RECOMMENDATION_TILES_PATH = os.getenv("RECOMMENDATION_TILES_PATH")
+tiles = RecommendationTiles.load(RECOMMENDATION_TILES_PATH) if RECOMMENDATION_TILES_PATH else None
+
+# Initialise persistent storage (Supabase or JSON fallback); users are
+# read one keyed row at a time.
 init_db()
 
+# scrypt runs in a small process pool: bounded CPU and memory per worker,
+# and a full queue answers 503 at once instead of stalling logins.
+password_hasher = PasswordHasher(
+    method=os.getenv("PASSWORD_HASH_METHOD", DEFAULT_METHOD),
+    workers=int(os.getenv("PASSWORD_HASH_WORKERS", 2)),
+    max_pending=int(os.getenv("PASSWORD_HASH_QUEUE", 32)),
+)
+
+# Orders are read one keyset page of the user's own rows at a time.
+ORDERS_PAGE_SIZE = 10
+
 # --------------------
 # Rate Limiter
 # --------------------
@@ -60,53 +158,45 @@ limiter = Limiter(
     key_func=get_remote_address,
     default_limits=[],                 # no global limit
     storage_uri="memory://",
+    # Load tests log many users in from one address; keep limits on otherwise.
+    enabled=os.getenv("RATE_LIMIT_ENABLED", "1") != "0",
 )
 
 
 # --------------------
 # Geocoding helpers
 # --------------------
+pincode_client = PincodeClient(
+    base_url=os.getenv("PINCODE_API_URL", "https://api.postalpincode.in"),
+    cache_path=os.getenv("PINCODE_CACHE_PATH", os.path.join(BASE_PATH, "pincode_cache.sqlite3")),
+    breaker=CircuitBreaker(
+        failure_threshold=int(os.getenv("PINCODE_BREAKER_FAILURES", 5)),
+        reset_timeout=float(os.getenv("PINCODE_BREAKER_RESET", 30)),
+    ),
+)
+
+
 def pincode_to_coords(pincode: str):
     """Returns (lat, lon) or None if lookup fails."""
-    try:
-        resp = requests.get(
-            f"https://api.postalpincode.in/pincode/{pincode}",
-            timeout=5
-        )
-        data = resp.json()
-        if not data or data[0].get("Status") != "Success":
-            return None
-
-        post_offices = data[0].get("PostOffice", [])
-        if not post_offices:
-            return None
-
-        # First post office with valid coords
-        for po in post_offices:
-            lat = po.get("Latitude")
-            lon = po.get("Longitude")
-            if lat and lon and lat != "NA" and lon != "NA":
-                return float(lat), float(lon)
-
-        return None
-    except Exception:
-        logger.exception("PIN code geocoding failed for %s", pincode)
-        return None
-
-
-# City name fallback — expand as needed
-CITY_COORDS = {
-    "mumbai": (19.0760, 72.8777),
-    "pune": (18.5204, 73.8567),
-    "nagpur": (21.1458, 79.0882),
-    "nashik": (19.9975, 73.7898),
-    "aurangabad": (19.8762, 75.3433),
-    "delhi": (28.6139, 77.2090),
-    "bangalore": (12.9716, 77.5946),
-    "hyderabad": (17.3850, 78.4867),
-    "chennai": (13.0827, 80.2707),
-    "kolkata": (22.5726, 88.3639),
-}
+    return pincode_client.lookup(pincode)
+
+
+# Offline PIN code / place-name lookup, loaded on first use; the live API
+# is only a fallback.
+gazetteer = LazyGazetteer(os.getenv("GAZETTEER_PATH", GAZETTEER_PATH))
+
+
+def is_pincode(text):
+    return re.fullmatch(r"\d{6}", text) is not None
+
+
+def resolve_location_text(text):
+    """(lat, lon) for a 6-digit PIN code or a village / city name, or None."""
+    with metrics.stage("geocode"):
+        if is_pincode(text):
+            return gazetteer.lookup_pin(text) or pincode_to_coords(text)
+        # Prefix and misspelling tolerant
+        return gazetteer.lookup_name(text)
 
 
 def validate_coords(lat, lon):
@@ -132,37 +222,6 @@ AGRI_KEYWORDS = {
 }
 
 
-PRODUCT_FLOW = {
-    "seeds": {
-        "question": "Which seed do you want?",
-        "options": ["Wheat Seeds", "Rice Seeds", "Corn Seeds"],
-        "filters": {
-            "wheat seeds": "wheat",
-            "rice seeds": "rice",
-            "corn seeds": "corn",
-        },
-    },
-    "fertilizers": {
-        "question": "Which fertilizer do you want?",
-        "options": ["Urea", "DAP", "NPK Fertilizer"],
-        "filters": {
-            "urea": "urea",
-            "dap": "dap",
-            "npk fertilizer": "npk",
-        },
-    },
-    "pesticides": {
-        "question": "Which pesticide do you want?",
-        "options": ["Neem Oil", "Chlorpyrifos", "Imidacloprid"],
-        "filters": {
-            "neem oil": "neem",
-            "chlorpyrifos": "chlorpyrifos",
-            "imidacloprid": "imidacloprid",
-        },
-    },
-}
-
-
 # --------------------
 # Stage prerequisite validation
 # --------------------
@@ -186,8 +245,11 @@ def is_non_agri_message(text):
     if not text:
         return False
     words = set(text.lower().replace(",", " ").replace(".", " ").split())
-    has_agri_signal = any(word in AGRI_KEYWORDS for word in words)
-    return not has_agri_signal
+    if any(word in AGRI_KEYWORDS for word in words):
+        return False
+    # Same vocabulary as product search: catalog names, variety codes,
+    # Hindi/Marathi synonyms and near-misspellings.
+    return not catalog.snapshot().mentions_product(text)
 
 
 def agri_only_reply(next_stage):
@@ -199,6 +261,216 @@ def agri_only_reply(next_stage):
         "stage": next_stage
     })
 
+# --------------------
+# Ranking helpers
+# --------------------
+RESULTS_PAGE_SIZE = 5
+MAX_RESULTS_PAGE_SIZE = 20
+
+
+def product_keyword(category, selected_product):
+    """Search query for the selected product: the menu option's keyword, else the free text."""
+    return PRODUCT_FLOW.get(category, {}).get("filters", {}).get(selected_product) or selected_product
+
+
+def rank_top(snapshot, category, keyword, preference, farmer, k):
+    """Top k ranked items for a product selection, using the configured engine."""
+    if tiles is not None:
+        ranked = tiles.rank(snapshot, category, keyword, preference, farmer, k)
+        if ranked is not None:
+            return ranked
+
+    if snapshot.live and QQDP_ENGINE != "numpy":
+        # Changed in place by seller updates: rank from its incremental indexes.
+        return snapshot.rank_topk(category, keyword, preference_levels(preference), farmer, k)
+
+    items, seller_index = snapshot.select(category, keyword)
+    if not items:
+        return []
+
+    farmer_preference = preference_levels(preference)
+    cell = ranking_cache.candidates(snapshot, category, keyword, farmer) if ranking_cache is not None else None
+    if QQDP_ENGINE == "numpy":
+        return rank_items_numpy(
+            snapshot.columns(category, keyword),
+            farmer_preference,
+            farmer,
+            cell.positions if cell is not None else seller_index.query(farmer[0], farmer[1], MAX_DISTANCE_KM),
+            k=k,
+        )
+    if cell is not None:
+        return rank_candidates(cell, farmer_preference, farmer, k)
+    return rank_items_topk(items, farmer_preference, k, farmer, seller_index)
+
+
+def recommend(farmer, category, selected_product, preference, stream=False, limit=RESULTS_PAGE_SIZE):
+    """
+    Rank and explain one product selection; returns (body, status).
+
+    Shared by the chat's ASK_PREFERENCE stage and /api/recommend, so both
+    answer with the same payload.
+    """
+    with metrics.stage("catalog"):
+        snapshot = catalog.snapshot()
+        category_count = snapshot.count(category)
+        keyword = product_keyword(category, selected_product)
+        product_count = snapshot.count(category, keyword) if keyword else category_count
+
+    if not category_count:
+        return {"error": "No data found"}, 404
+
+    category_flow = PRODUCT_FLOW.get(category, {})
+    if not product_count:
+        product_options = "\n".join(f"• {opt}" for opt in category_flow.get("options", []))
+        return {
+            "reply": (
+                "No matching products found for that selection. Please choose another option:\n\n"
+                f"{product_options}"
+            ),
+            "stage": "ASK_PRODUCT"
+        }, 200
+
+    # One extra item tells us whether a second page exists.
+    with metrics.stage("rank"):
+        ranked = rank_top(snapshot, category, keyword, preference, farmer, limit + 1)
+    if not ranked:
+        return {
+            "reply": "No suitable options found nearby based on quality, quantity, distance, and price.",
+            "stage": "DONE",
+            "ranked_items": []
+        }, 200
+
+    has_more = len(ranked) > limit
+    ranked = ranked[:limit]
+    top_items = ranked[:2]
+
+    reply = template_reply(top_items, preference)
+    cache_key = explanation_cache.key(top_items, preference, selected_product)
+
+    if stream:
+        # Answer with the ranking now; the text follows over SSE.
+        token = explanation_tokens.dumps({
+            "user": session.get("user_email"),
+            "top_items": top_items,
+            "preference": preference,
+            "selected_product": selected_product,
+        })
+        return {
+            "reply": reply,
+            "stage": "DONE",
+            "top_items": top_items,
+            "ranked_items": ranked,
+            "next_offset": limit if has_more else None,
+            "explanation_token": token,
+            "explanation_url": url_for("chat_explanation", token=token)
+        }, 200
+
+    if model:
+        prompt = build_prompt(top_items, preference, selected_product)
+
+        def generate():
+            res = model.generate_content(prompt, request_options={"timeout": EXPLANATION_TIMEOUT})
+            return res.text.strip() if res.text else None
+
+        try:
+            with metrics.stage("explain"):
+                reply = call_with_deadline(
+                    lambda: explanation_cache.get_or_compute(cache_key, generate, timeout=EXPLANATION_TIMEOUT),
+                    EXPLANATION_TIMEOUT,
+                ) or reply
+        except Exception as e:
+            logger.exception("Gemini API error: %s", e)
+            # reply already set to the template fallback above
+
+    return {
+        "reply": reply,
+        "stage": "DONE",
+        "top_items": top_items,
+        "ranked_items": ranked,
+        "next_offset": limit if has_more else None
+    }, 200
+
+def location_not_found_reply(text):
+    if is_pincode(text):
+        return "Couldn't find that PIN code. Try a nearby PIN or enter your city name."
+    return (
+        "Couldn't find that location. "
+        "Please enter a 6-digit PIN code or a city name (e.g. Mumbai, Pune, Nagpur)."
+    )
+
+
+def parse_recommend_request(member):
+    """Validate one API request with the chat rules; returns (request, error)."""
+    if not isinstance(member, dict):
+        return None, "Each request must be an object."
+
+    try:
+        lat = float(member.get("lat"))
+        lon = float(member.get("lon"))
+    except (TypeError, ValueError):
+        return None, "Invalid location coordinates."
+    if not validate_coords(lat, lon):
+        return None, "Coordinates out of range. Latitude must be -90 to 90, longitude -180 to 180."
+
+    category = str(member.get("category") or "").strip().lower()
+    if category not in PRODUCT_FLOW:
+        return None, "category must be one of: " + ", ".join(PRODUCT_FLOW)
+
+    product = str(member.get("product") or "").strip().lower()
+    keyword = product_keyword(category, product)
+    if not keyword:
+        return None, "product is required, e.g. one of: " + ", ".join(PRODUCT_FLOW[category]["options"])
+
+    preference = str(member.get("preference") or "").strip().lower()
+    if preference not in {"quality", "price", "distance", "quantity"}:
+        return None, "preference must be one of: quality, price, distance, quantity."
+
+    return {
+        "farmer": (lat, lon),
+        "category": category,
+        "selected_product": product,
+        "keyword": keyword,
+        "preference": preference,
+    }, None
+
+
+def rank_batch(snapshot, batch, k):
+    """
+    Top k per farmer for many (farmer, product, preference) requests.
+
+    Requests for the same product share one catalog selection; with NumPy
+    each group is scored as one farmer x seller distance matrix.
+    """
+    # Keyed by the canonical query, so "wheat", "gehun" and "whaet" share one selection.
+    groups = {}
+    for n, req in enumerate(batch):
+        key = snapshot.selection_key(req["category"], req["keyword"])
+        groups.setdefault(key, []).append(n)
+
+    results = [None] * len(batch)
+    for members in groups.values():
+        category, keyword = batch[members[0]]["category"], batch[members[0]]["keyword"]
+        if not snapshot.select(category, keyword)[0]:
+            for n in members:
+                results[n] = []
+            continue
+
+        if rank_items_numpy_batch is not None:
+            ranked = rank_items_numpy_batch(
+                snapshot.columns(category, keyword),
+                [batch[n]["farmer"] for n in members],
+                [preference_levels(batch[n]["preference"]) for n in members],
+                k,
+            )
+        else:
+            ranked = [
+                rank_top(snapshot, category, keyword, batch[n]["preference"], batch[n]["farmer"], k)
+                for n in members
+            ]
+        for n, items in zip(members, ranked):
+            results[n] = items
+    return results
+
 # --------------------
 # Home
 # --------------------
@@ -231,14 +503,21 @@ def auth_signup():
     if not name or not email or not password:
         return jsonify({"error": "Please fill all signup fields."}), 400
 
-    users = load_users()
-    if email in users:
+    with metrics.stage("db_user_exists"):
+        exists = user_exists(email)
+    if exists:
         return jsonify({"error": "Account already exists. Please log in."}), 409
 
-    save_user(email, {
-        "name": name,
-        "password_hash": generate_password_hash(password)
-    })
+    with metrics.stage("password_hash"):
+        password_hash = password_hasher.hash(password)
+    with metrics.stage("db_user_create"):
+        created = create_user(email, {
+            "name": name,
+            "password_hash": password_hash
+        })
+    if not created:
+        # Lost a race with a concurrent signup for the same email.
+        return jsonify({"error": "Account already exists. Please log in."}), 409
 
     session["user_email"] = email
     session["user_name"] = name
@@ -253,10 +532,18 @@ def auth_login():
     email = (data.get("email") or "").strip().lower()
     password = (data.get("password") or "").strip()
 
-    users = load_users()
-    user = users.get(email)
-    if not user or not check_password_hash(user.get("password_hash", ""), password):
+    with metrics.stage("db_user_get"):
+        user = get_user(email)
+    valid, new_hash = False, None
+    if user:
+        with metrics.stage("password_check"):
+            valid, new_hash = password_hasher.verify(user.get("password_hash", ""), password)
+    if not valid:
         return jsonify({"error": "Invalid email or password."}), 401
+    if new_hash:
+        # Stored with older hash parameters: upgrade while we have the password.
+        with metrics.stage("db_user_rehash"):
+            update_password_hash(email, new_hash)
 
     session["user_email"] = email
     session["user_name"] = user.get("name", "Farmer")
@@ -275,14 +562,32 @@ def orders_page():
     if "user_email" not in session:
         return redirect(url_for("auth_page"))
 
-    all_orders = load_orders()
-    orders = all_orders.get(session["user_email"], [])
+    with metrics.stage("db_orders"):
+        orders, next_cursor = list_orders(session["user_email"], limit=ORDERS_PAGE_SIZE)
     return render_template(
         "orders.html",
         user_name=session.get("user_name", "Farmer"),
         orders=orders,
+        next_cursor=next_cursor,
     )
 
+
+@app.route("/orders/page", methods=["GET"])
+def orders_next_page():
+    if "user_email" not in session:
+        return jsonify({"error": "Please log in first.", "redirect": url_for("auth_page")}), 401
+
+    try:
+        with metrics.stage("db_orders"):
+            orders, next_cursor = list_orders(
+                session["user_email"],
+                cursor=request.args.get("cursor"),
+                limit=ORDERS_PAGE_SIZE,
+            )
+    except ValueError:
+        return jsonify({"error": "Invalid cursor."}), 400
+    return jsonify({"orders": orders, "next_cursor": next_cursor})
+
 # --------------------
 # Start chat
 # --------------------
@@ -359,27 +664,12 @@ def chat():
                 "stage": "ASK_LOCATION_TEXT"
             })
 
-        coords = None
-
-        # Try PIN code first
-        if re.fullmatch(r"\d{6}", message):
-            coords = pincode_to_coords(message)
-            if not coords:
-                return jsonify({
-                    "reply": "Couldn't find that PIN code. Try a nearby PIN or enter your city name.",
-                    "stage": "ASK_LOCATION_TEXT"
-                })
-        else:
-            # Try city name lookup
-            coords = CITY_COORDS.get(message.lower().strip())
-            if not coords:
-                return jsonify({
-                    "reply": (
-                        "Couldn't find that location. "
-                        "Please enter a 6-digit PIN code or a city name (e.g. Mumbai, Pune, Nagpur)."
-                    ),
-                    "stage": "ASK_LOCATION_TEXT"
-                })
+        coords = resolve_location_text(message)
+        if not coords:
+            return jsonify({
+                "reply": location_not_found_reply(message),
+                "stage": "ASK_LOCATION_TEXT"
+            })
 
         session["farmer_lat"], session["farmer_lon"] = coords
 
@@ -432,13 +722,17 @@ def chat():
                 "stage": "ASK_CATEGORY"
             })
 
+        # Menu options, or free text such as "HD-2967", "gehun" or "chlorpyriphos".
         valid_options = set(category_flow["filters"].keys())
         if message not in valid_options:
-            product_options = "\n".join(f"• {opt}" for opt in category_flow["options"])
-            return jsonify({
-                "reply": f"Please choose one option below:\n\n{product_options}",
-                "stage": "ASK_PRODUCT"
-            })
+            with metrics.stage("search"):
+                matches = catalog.snapshot().search(category, message) if message else ()
+            if not matches:
+                product_options = "\n".join(f"• {opt}" for opt in category_flow["options"])
+                return jsonify({
+                    "reply": f"Please choose one option below:\n\n{product_options}",
+                    "stage": "ASK_PRODUCT"
+                })
 
         session["selected_product"] = message
 
@@ -466,151 +760,326 @@ def chat():
 
         session["preference"] = message
 
-        with open(MATERIALS_PATH, "r") as f:
-            materials = json.load(f)
+        body, status = recommend(
+            (session["farmer_lat"], session["farmer_lon"]),
+            session["category"],
+            session.get("selected_product"),
+            session["preference"],
+            stream=bool(data.get("stream")),
+        )
+        return jsonify(body), status
 
-        items = materials.get(session["category"], [])
-        if not items:
-            return jsonify({"error": "No data found"}), 404
+    return jsonify({"error": "Invalid stage"}), 400
 
-        selected_product = session.get("selected_product")
-        category_flow = PRODUCT_FLOW.get(session["category"], {})
-        keyword = category_flow.get("filters", {}).get(selected_product)
-        if keyword:
-            filtered_items = [item for item in items if keyword in (item.get("name", "").lower())]
-            if not filtered_items:
-                product_options = "\n".join(f"• {opt}" for opt in category_flow.get("options", []))
-                return jsonify({
-                    "reply": (
-                        "No matching products found for that selection. Please choose another option:\n\n"
-                        f"{product_options}"
-                    ),
-                    "stage": "ASK_PRODUCT"
-                })
-            items = filtered_items
 
-        for item in items:
-            item["farmer_lat"] = session["farmer_lat"]
-            item["farmer_lon"] = session["farmer_lon"]
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
 
-        farmer_preference = {
-        "quality": "high" if session["preference"] == "quality" else "average",
-        "price": "high" if session["preference"] == "price" else "average",
-        "distance": "high" if session["preference"] == "distance" else "average",
-        "quantity": "high" if session["preference"] == "quantity" else "average",
-        }
 
-        ranked = rank_items(items, farmer_preference)
-        if not ranked:
-            return jsonify({
-                "reply": "No suitable options found nearby based on quality, quantity, distance, and price.",
-                "stage": "DONE",
-                "ranked_items": []
-            })
+def pending_explanation(token):
+    """
+    Prompt and cache key of a streamed recommendation's token, as
+    (job, None), or (None, (error body, status)). Also used by asgi.py.
+    """
+    if "user_email" not in session:
+        return None, ({"error": "Please log in first.", "redirect": url_for("auth_page")}, 401)
 
-        top_items = ranked[:2]
+    try:
+        pending = explanation_tokens.loads(token, max_age=EXPLANATION_TOKEN_MAX_AGE)
+    except BadSignature:  # includes expired tokens
+        pending = None
+    if not pending or pending.get("user") != session["user_email"]:
+        return None, ({"error": "Unknown or expired explanation."}, 404)
+
+    top_items = pending["top_items"]
+    preference = pending["preference"]
+    selected_product = pending["selected_product"]
+    return {
+        "prompt": build_prompt(top_items, preference, selected_product),
+        "cache_key": explanation_cache.key(top_items, preference, selected_product),
+        "fallback": template_reply(top_items, preference),
+    }, None
+
+
+@app.route("/chat/explanation/<token>", methods=["GET"])
+def chat_explanation(token):
+    """Stream the Gemini explanation for a streamed recommendation (SSE)."""
+    job, error = pending_explanation(token)
+    if error:
+        return jsonify(error[0]), error[1]
+
+    frames = stream_explanation(
+        model, job["prompt"], fallback=job["fallback"],
+        cache=explanation_cache, cache_key=job["cache_key"], timeout=EXPLANATION_TIMEOUT,
+    )
+    return Response(frames, mimetype="text/event-stream", headers=SSE_HEADERS)
+
+
+@app.route("/chat/results", methods=["GET"])
+def chat_results():
+    """Further pages of the last recommendation, ranked on demand."""
+    if "user_email" not in session:
+        return jsonify({"error": "Please log in first.", "redirect": url_for("auth_page")}), 401
 
-        reply = (
-            "Based on your preference, the top option ranks highest "
-            "due to better balance of quality, availability, distance, and price."
+    prereq_error = validate_prerequisites("ASK_PREFERENCE")
+    if prereq_error or "preference" not in session:
+        return jsonify({"error": prereq_error or "No recommendation yet. Please restart the chat."}), 400
+
+    offset = request.args.get("offset", default=0, type=int)
+    limit = request.args.get("limit", default=RESULTS_PAGE_SIZE, type=int)
+    if offset < 0 or not 1 <= limit <= MAX_RESULTS_PAGE_SIZE:
+        return jsonify({"error": f"offset must be >= 0 and limit between 1 and {MAX_RESULTS_PAGE_SIZE}."}), 400
+
+    with metrics.stage("rank"):
+        ranked = rank_top(
+            catalog.snapshot(),
+            session["category"],
+            product_keyword(session["category"], session.get("selected_product")),
+            session["preference"],
+            (session["farmer_lat"], session["farmer_lon"]),
+            offset + limit + 1,
         )
+    has_more = len(ranked) > offset + limit
+    return jsonify({
+        "ranked_items": ranked[offset:offset + limit],
+        "offset": offset,
+        "next_offset": offset + limit if has_more else None
+    })
 
-        if model:
-            prompt = f"""
-You are an agricultural recommendation assistant.
-
-You must answer ONLY agriculture-related content.
-If the user asks anything outside agriculture, reply exactly:
-"I can only assist with agriculture-related topics."
-
-Your job is to EXPLAIN a pre-selected best option to a farmer.
-You DO NOT choose products.
-You DO NOT change scores.
-You DO NOT invent data.
-
-====================
-INPUT DATA
-====================
-Farmer Preference: {session["preference"]}
-Selected Product: {session.get("selected_product", "not specified")}
-
-Top Ranked Options (already scored, do not reorder):
-{json.dumps(top_items, indent=2)}
-
-====================
-OUTPUT FORMAT (MANDATORY)
-====================
-
-🌾 Best Recommendation for You
-
-Product: <product name>
-Seller: <seller name>
-
-Why this is the best choice:
-• <reason 1 – use data>
-• <reason 2 – use data>
-• <reason 3 – use data>
-
-✅ Pros:
-• <pro 1>
-• <pro 2>
-
-⚠️ Cons:
-• <exactly one con>
-
-🔍 Comparison:
-Compared to <2nd product name>, this option <short comparison sentence>.
-
-====================
-STRICT RULES
-====================
-1. Follow the format EXACTLY (headings, emojis, bullets).
-2. Reasons:
-   - EXACTLY 3 reasons
-   - Data-backed only
-3. Pros:
-   - EXACTLY 2 points
-4. Cons:
-   - EXACTLY 1 point
-5. Comparison:
-   - Mention ONLY the 2nd-ranked option
-6. Use simple, farmer-friendly language.
-7. Do NOT mention:
-   - AI
-   - model
-   - algorithm
-   - scoring logic
-8. Do NOT add extra sections.
-9. Do NOT exceed 140 words.
-10. If data is missing, SKIP that point instead of guessing.
-
-Return ONLY the formatted answer.
-""".strip()
-
-            try:
-                res = model.generate_content(prompt)
-                if res.text:
-                    reply = res.text.strip()
-            except Exception as e:
-                logger.exception("Gemini API error: %s", e)
-                # reply already set to the fallback above
+# --------------------
+# One-shot recommendation API
+# --------------------
+@app.route("/api/recommend", methods=["POST"])
+def recommend_api():
+    """
+    The whole chat flow in one request.
+
+    Body: {"lat", "lon"} or {"location": PIN code / place name}, plus
+    "category", "product", "preference", optional "limit" and "stream".
+    Nothing is kept in the chat session; the answer matches the chat's
+    ASK_PREFERENCE response.
+    """
+    if "user_email" not in session:
+        return jsonify({"error": "Please log in first.", "redirect": url_for("auth_page")}), 401
 
-        return jsonify({
-            "reply": reply,
-            "stage": "DONE",
-            "top_items": top_items,
-            "ranked_items": ranked
-        })
+    data = request.get_json(silent=True) or {}
 
-    return jsonify({"error": "Invalid stage"}), 400
+    if data.get("lat") is None and data.get("lon") is None and data.get("location"):
+        location = str(data["location"]).strip().lower()
+        coords = resolve_location_text(location)
+        if not coords:
+            return jsonify({"error": location_not_found_reply(location)}), 404
+        data = {**data, "lat": coords[0], "lon": coords[1]}
+
+    req, error = parse_recommend_request(data)
+    if error:
+        return jsonify({"error": error}), 400
+
+    limit = data.get("limit", RESULTS_PAGE_SIZE)
+    if not isinstance(limit, int) or isinstance(limit, bool) or not 1 <= limit <= MAX_RESULTS_PAGE_SIZE:
+        return jsonify({"error": f"limit must be between 1 and {MAX_RESULTS_PAGE_SIZE}."}), 400
+
+    body, status = recommend(
+        req["farmer"], req["category"], req["selected_product"], req["preference"],
+        stream=bool(data.get("stream")), limit=limit,
+    )
+    return jsonify(body), status
 
 # --------------------
-# Rate-limit error handler
+# Batch ranking (cooperatives)
+# --------------------
+BATCH_MAX_REQUESTS = int(os.getenv("BATCH_MAX_REQUESTS", 500))
+
+
+@app.route("/api/rank/batch", methods=["POST"])
+@limiter.limit("30/minute")
+def rank_batch_api():
+    """
+    Rank for many farmers in one call.
+
+    Body: {"k": 5, "requests": [{"id", "lat", "lon", "category", "product",
+    "preference"}, ...]}. Results come back in request order; an invalid
+    entry gets an "error" instead of failing the whole batch.
+    """
+    if "user_email" not in session:
+        return jsonify({"error": "Please log in first.", "redirect": url_for("auth_page")}), 401
+
+    data = request.get_json(silent=True) or {}
+    members = data.get("requests")
+    if not isinstance(members, list) or not members:
+        return jsonify({"error": "requests must be a non-empty list."}), 400
+    if len(members) > BATCH_MAX_REQUESTS:
+        return jsonify({"error": f"At most {BATCH_MAX_REQUESTS} requests per batch."}), 400
+
+    k = data.get("k", RESULTS_PAGE_SIZE)
+    if not isinstance(k, int) or isinstance(k, bool) or not 1 <= k <= MAX_RESULTS_PAGE_SIZE:
+        return jsonify({"error": f"k must be between 1 and {MAX_RESULTS_PAGE_SIZE}."}), 400
+
+    results = []
+    valid = []
+    for n, member in enumerate(members):
+        req, error = parse_recommend_request(member)
+        member_id = member.get("id", n) if isinstance(member, dict) else n
+        results.append({"id": member_id, "error": error} if error else {"id": member_id})
+        if req:
+            valid.append((n, req))
+
+    with metrics.stage("rank"):
+        ranked = rank_batch(catalog.snapshot(), [req for _, req in valid], k)
+    for (n, _), items in zip(valid, ranked):
+        results[n]["ranked_items"] = items
+
+    return jsonify({"k": k, "results": results})
+
+# --------------------
+# Catalog updates (sellers)
+# --------------------
+CATALOG_CHANGES_PAGE_SIZE = 500
+
+
+def catalog_update_error():
+    """Error response unless catalog updates are enabled and the bearer token matches."""
+    if not CATALOG_UPDATE_TOKEN or not isinstance(catalog, LiveCatalogStore):
+        return jsonify({"error": "Catalog updates are disabled."}), 404
+    supplied = request.headers.get("Authorization", "").removeprefix("Bearer ")
+    if not hmac.compare_digest(supplied.encode("utf-8"), CATALOG_UPDATE_TOKEN.encode("utf-8")):
+        return jsonify({"error": "Invalid catalog update token."}), 401
+    return None
+
+
+@app.route("/api/catalog/changes", methods=["POST"])
+def catalog_changes_apply():
+    """
+    Apply seller changes without rewriting the catalog file.
+
+    Body: {"changes": [{"op": "patch", "category", "item_id", "price",
+    "available_qty"}, {"op": "upsert", "category", "item": {...}},
+    {"op": "delete", "category", "item_id"}, ...]}, applied in order,
+    all or none.
+    """
+    error = catalog_update_error()
+    if error:
+        return error
+    data = request.get_json(silent=True) or {}
+    changes = data.get("changes")
+    if not isinstance(changes, list) or not changes:
+        return jsonify({"error": "changes must be a non-empty list."}), 400
+    if len(changes) > CATALOG_CHANGES_PAGE_SIZE:
+        return jsonify({"error": f"At most {CATALOG_CHANGES_PAGE_SIZE} changes per request."}), 400
+    try:
+        result = catalog.apply(changes)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"applied": len(changes), **result})
+
+
+@app.route("/api/catalog/changes", methods=["GET"])
+def catalog_changes_list():
+    """The change log after ?since=<seq>, oldest first, one page at a time."""
+    error = catalog_update_error()
+    if error:
+        return error
+    since = request.args.get("since", "0")
+    if not since.isdigit():
+        return jsonify({"error": "since must be a change seq."}), 400
+    changes = catalog.changelog.since(int(since), limit=CATALOG_CHANGES_PAGE_SIZE)
+    return jsonify({
+        "changes": changes,
+        "next_since": changes[-1]["seq"] if changes else int(since),
+        "last_seq": catalog.changelog.last_seq(),
+    })
+
+# --------------------
+# Runtime stats
+# --------------------
+def runtime_metric_lines():
+    """Catalog, cache and geocoder state as Prometheus gauges/counters."""
+    catalog_stats = catalog.stats()
+    cache_stats = explanation_cache.stats()
+    breaker = pincode_client.breaker
+    yield "# TYPE kisansevak_catalog_reloads_total counter"
+    yield f"kisansevak_catalog_reloads_total {catalog_stats['reload_count']}"
+    yield "# TYPE kisansevak_catalog_load_seconds gauge"
+    yield f"kisansevak_catalog_load_seconds {catalog_stats['last_load_seconds']}"
+    yield "# TYPE kisansevak_catalog_items gauge"
+    yield f"kisansevak_catalog_items {catalog_stats['items']}"
+    if "seq" in catalog_stats:
+        yield "# TYPE kisansevak_catalog_change_seq gauge"
+        yield f"kisansevak_catalog_change_seq {catalog_stats['seq']}"
+    yield "# TYPE kisansevak_explanation_cache_total counter"
+    for result in ("hits", "misses", "coalesced"):
+        yield f'kisansevak_explanation_cache_total{{result="{result}"}} {cache_stats[result]}'
+    if ranking_cache:
+        ranking_stats = ranking_cache.stats()
+        yield "# TYPE kisansevak_ranking_cache_total counter"
+        for result in ("hits", "misses"):
+            yield f'kisansevak_ranking_cache_total{{result="{result}"}} {ranking_stats[result]}'
+        yield "# TYPE kisansevak_ranking_cache_bytes gauge"
+        yield f"kisansevak_ranking_cache_bytes {ranking_stats['approx_bytes']}"
+    if tiles:
+        tile_stats = tiles.stats()
+        yield "# TYPE kisansevak_recommendation_tiles_total counter"
+        for result in ("hits", "misses", "stale"):
+            yield f'kisansevak_recommendation_tiles_total{{result="{result}"}} {tile_stats[result]}'
+    hasher_stats = password_hasher.stats()
+    yield "# TYPE kisansevak_password_hash_pending gauge"
+    yield f"kisansevak_password_hash_pending {hasher_stats['pending']}"
+    yield "# TYPE kisansevak_password_hash_rejected_total counter"
+    yield f"kisansevak_password_hash_rejected_total {hasher_stats['rejected']}"
+    yield "# TYPE kisansevak_password_hash_pool_restarts_total counter"
+    yield f"kisansevak_password_hash_pool_restarts_total {hasher_stats['pool_restarts']}"
+    yield "# TYPE kisansevak_pincode_breaker_open gauge"
+    yield f"kisansevak_pincode_breaker_open {int(breaker.state == 'open')}"
+
+
+metrics.add_collector(runtime_metric_lines)
+
+
+def metrics_auth_error():
+    """Error response unless METRICS_TOKEN is set and the bearer token matches."""
+    if not METRICS_TOKEN:
+        return jsonify({"error": "Not found."}), 404
+    supplied = request.headers.get("Authorization", "").removeprefix("Bearer ")
+    if not hmac.compare_digest(supplied.encode("utf-8"), METRICS_TOKEN.encode("utf-8")):
+        return jsonify({"error": "Invalid metrics token."}), 401
+    return None
+
+
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    error = metrics_auth_error()
+    if error:
+        return error
+    if not metrics.enabled:
+        return jsonify({"error": "Metrics are disabled."}), 404
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
+@app.route("/stats", methods=["GET"])
+def runtime_stats():
+    error = metrics_auth_error()
+    if error:
+        return error
+    return jsonify({
+        "catalog": catalog.stats(),
+        "explanation_cache": explanation_cache.stats(),
+        "ranking_cache": ranking_cache.stats() if ranking_cache else None,
+        "password_hasher": password_hasher.stats(),
+        "recommendation_tiles": tiles.stats() if tiles else None,
+    })
+
+# --------------------
+# Rate-limit / overload error handlers
 # --------------------
 @app.errorhandler(429)
 def ratelimit_handler(e):
     return jsonify({"error": "Too many requests. Please try again in a minute."}), 429
 
+
+@app.errorhandler(HasherBusy)
+def hasher_busy_handler(e):
+    logger.warning("Password hashing queue full: %s", e)
+    return jsonify({"error": "Server is busy. Please try again in a moment."}), 503, {"Retry-After": "1"}
+
 # --------------------
 # Run
 # --------------------
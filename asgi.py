@@ -0,0 +1,236 @@
+"""
+ASGI entry point, next to wsgi.py:
+
+    uvicorn asgi:app --workers 2
+    gunicorn -k uvicorn.workers.UvicornWorker -w 2 asgi:app
+
+Flask views run on a per-process thread pool (ASGI_THREADS), so a request
+waiting on Gemini or the PIN code API parks one thread instead of a whole
+worker, and cheap requests such as /chat/start keep being answered. The
+Gemini explanation stream, the longest call, is awaited on the event loop
+and holds no thread at all.
+"""
+import io
+import os
+import re
+import sys
+import json
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Optional, Tuple
+
+import app as kisansevak
+from explanations import astream_explanation
+
+ASGI_THREADS = int(os.getenv("ASGI_THREADS", 64))
+# Bodies are buffered before Flask sees them, so they are capped here
+# (Flask's MAX_CONTENT_LENGTH wins when the app sets it).
+ASGI_MAX_BODY_BYTES = int(os.getenv("ASGI_MAX_BODY_BYTES", 1024 * 1024))
+
+EXPLANATION_PATH = re.compile(r"/chat/explanation/([^/]+)")
+
+
+def build_environ(scope: Dict, body: bytes) -> Dict:
+    """WSGI environ for an ASGI http scope."""
+    root_path = scope.get("root_path", "")
+    path = scope["path"]
+    if root_path and path.startswith(root_path):
+        path = path[len(root_path):]
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client")
+
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": root_path.encode("utf-8").decode("latin-1"),
+        "PATH_INFO": path.encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0] if client else "",
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for raw_name, raw_value in scope.get("headers", []):
+        name = raw_name.decode("latin-1").upper().replace("-", "_")
+        if name not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            name = "HTTP_" + name
+        value = raw_value.decode("latin-1")
+        if name in environ:
+            # HTTP/2 clients may split cookies over several headers.
+            value = environ[name] + ("; " if name == "HTTP_COOKIE" else ",") + value
+        environ[name] = value
+    # The body is fully buffered, so its length is known even when the
+    # client sent it chunked (no Content-Length header).
+    environ["CONTENT_LENGTH"] = str(len(body))
+    environ["wsgi.input_terminated"] = True
+    return environ
+
+
+class BodyTooLarge(Exception):
+    pass
+
+
+def _content_length(scope: Dict) -> int:
+    for name, value in scope.get("headers", []):
+        if name.lower() == b"content-length":
+            try:
+                return int(value)
+            except ValueError:
+                return 0
+    return 0
+
+
+async def read_body(receive, limit: int) -> bytes:
+    """The request body; raises BodyTooLarge as soon as it passes `limit` bytes."""
+    chunks, size = [], 0
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            break
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if size > limit:
+            raise BodyTooLarge
+        chunks.append(chunk)
+        if not message.get("more_body"):
+            break
+    return b"".join(chunks)
+
+
+def _start_message(status: int, headers: Iterable[Tuple[str, str]]) -> Dict:
+    return {
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers],
+    }
+
+
+async def _send_json(send, status: int, body: Dict):
+    await send(_start_message(status, [("Content-Type", "application/json")]))
+    await send({"type": "http.response.body", "body": json.dumps(body).encode("utf-8")})
+
+
+# -------------------------------------------------
+# ASGI APP
+# -------------------------------------------------
+class KisanSevakASGI:
+    """
+    Serves a Flask app over ASGI.
+
+    Every route goes through Flask on the thread pool, except the Gemini
+    explanation stream, which is handled here with astream_explanation
+    (unless the Gemini client has no async transport, see GEMINI_ASYNC).
+    (asgiref's WsgiToAsgi is not used: it runs all requests on one shared
+    thread by default, which would serialise the app again.)
+    """
+
+    def __init__(self, flask_app, threads: int = ASGI_THREADS, max_body: Optional[int] = None):
+        self.flask_app = flask_app
+        self.threads = threads
+        self.max_body = max_body or flask_app.config.get("MAX_CONTENT_LENGTH") or ASGI_MAX_BODY_BYTES
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="flask")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+
+        try:
+            if _content_length(scope) > self.max_body:
+                raise BodyTooLarge
+            body = await read_body(receive, self.max_body)
+        except BodyTooLarge:
+            await _send_json(send, 413, {"error": "Request body too large."})
+            return
+
+        environ = build_environ(scope, body)
+        match = EXPLANATION_PATH.fullmatch(environ["PATH_INFO"])
+        if match and scope["method"] == "GET" and kisansevak.GEMINI_ASYNC:
+            await self._explanation(environ, match.group(1), send)
+        else:
+            await self._wsgi(environ, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.executor.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _wsgi(self, environ: Dict, send):
+        loop = asyncio.get_running_loop()
+
+        def send_from_thread(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        def run():
+            state = {"start": None, "sent": False}
+
+            def start_response(status, headers, exc_info=None):
+                if exc_info and state["sent"]:
+                    raise exc_info[1].with_traceback(exc_info[2])
+                state["start"] = _start_message(int(status.split(" ", 1)[0]), headers)
+                return write
+
+            def write(data: bytes):
+                if not state["sent"]:
+                    send_from_thread(state["start"])
+                    state["sent"] = True
+                if data:
+                    send_from_thread({"type": "http.response.body", "body": data, "more_body": True})
+
+            result = self.flask_app(environ, start_response)
+            try:
+                for chunk in result:
+                    if chunk:
+                        write(chunk)
+            finally:
+                if hasattr(result, "close"):
+                    result.close()
+            write(b"")
+            send_from_thread({"type": "http.response.body"})
+
+        await loop.run_in_executor(self.executor, run)
+
+    async def _explanation(self, environ: Dict, token: str, send):
+        # This route skips Flask's dispatch, so its before/after_request hooks
+        # do not run. That is deliberate: the view only reads the session
+        # (nothing to save) and streams on the event loop. The request
+        # metrics those hooks record are recorded here instead.
+        started = time.perf_counter()
+        # Checking the session cookie and the signed token is CPU only; no thread needed.
+        with self.flask_app.request_context(environ):
+            job, error = kisansevak.pending_explanation(token)
+
+        if error:
+            body, status = error
+            await _send_json(send, status, body)
+            kisansevak.metrics.observe_request("chat_explanation", status, time.perf_counter() - started)
+            return
+
+        headers = [("Content-Type", "text/event-stream; charset=utf-8"), *kisansevak.SSE_HEADERS.items()]
+        await send(_start_message(200, headers))
+        frames = astream_explanation(
+            kisansevak.model, job["prompt"], fallback=job["fallback"],
+            cache=kisansevak.explanation_cache, cache_key=job["cache_key"],
+            timeout=kisansevak.EXPLANATION_TIMEOUT,
+        )
+        async for frame in frames:
+            await send({"type": "http.response.body", "body": frame.encode("utf-8"), "more_body": True})
+        await send({"type": "http.response.body"})
+        kisansevak.metrics.observe_request("chat_explanation", 200, time.perf_counter() - started)
+
+
+app = KisanSevakASGI(kisansevak.app)
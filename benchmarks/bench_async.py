@@ -0,0 +1,268 @@
+"""
+Load test: concurrent slow-Gemini requests against one sync WSGI worker
+and one ASGI worker (asgi.py under uvicorn).
+
+Run from the repository root (needs uvicorn):
+
+    python -m benchmarks.bench_async --clients 32 --model-latency-ms 500
+
+Each client sends /api/recommend (Gemini answered inline, on the thread
+pool) or /api/recommend with "stream" plus the SSE explanation (awaited on
+the event loop), while a probe measures /chat/start latency. "concurrency"
+is the number of model calls in flight on average: a sync worker stays at 1.
+"""
+import os
+import sys
+import json
+import time
+import random
+import socket
+import asyncio
+import argparse
+import platform
+import statistics
+import tempfile
+import threading
+import http.client
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Mapping, Optional, Tuple
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+from benchmarks.bench_qqdp import StubModel, _StubResponse
+from benchmarks.synthetic_catalog import DEFAULT_FARMER, generate_catalog, random_point
+
+
+class AsyncStubModel(StubModel):
+    """StubModel with generate_content_async, waiting without a thread."""
+
+    async def generate_content_async(self, prompt, stream=False, **kwargs):
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+        response = StubModel().generate_content(prompt, stream=stream)
+        return _AsyncChunks(response) if stream else response
+
+
+class _AsyncChunks:
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._chunks)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class _NoCache:
+    """Every request calls the model: the load test measures uncached explanations."""
+
+    key = staticmethod(lambda *parts: json.dumps(parts, default=str))
+
+    def get_or_compute(self, key, compute, timeout=None):
+        return compute()
+
+    def join(self, key):
+        return None, object(), True  # every stream leads
+
+    def finish(self, key, call, value=None, error=None):
+        pass
+
+    def stats(self):
+        return {}
+
+
+# -------------------------------------------------
+# SERVERS
+# -------------------------------------------------
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class _BacklogServer(WSGIServer):
+    request_queue_size = 1024  # like gunicorn; connections wait instead of being reset
+
+
+def start_wsgi(flask_app) -> Tuple[int, callable]:
+    """One single-threaded WSGI server: what a sync gunicorn worker does."""
+    server = make_server(
+        "127.0.0.1", free_port(), flask_app, server_class=_BacklogServer, handler_class=_QuietHandler,
+    )
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server.server_port, server.shutdown
+
+
+def start_asgi(threads: int) -> Tuple[int, callable]:
+    import uvicorn
+
+    from asgi import KisanSevakASGI
+    import app as app_module
+
+    port = free_port()
+    config = uvicorn.Config(
+        KisanSevakASGI(app_module.app, threads=threads),
+        host="127.0.0.1", port=port, log_level="warning", lifespan="on",
+    )
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+
+    def stop():
+        server.should_exit = True
+        thread.join()
+    return port, stop
+
+
+# -------------------------------------------------
+# CLIENTS
+# -------------------------------------------------
+def request(port: int, method: str, path: str, cookie: str, body: Optional[Dict] = None) -> Tuple[int, Mapping, bytes]:
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=120)
+    headers = {"Cookie": cookie}
+    payload = None
+    if body is not None:
+        payload = json.dumps(body)
+        headers["Content-Type"] = "application/json"
+    conn.request(method, path, body=payload, headers=headers)
+    res = conn.getresponse()
+    data = res.read()
+    conn.close()
+    return res.status, res.headers, data
+
+
+def recommend_once(port: int, cookie: str, farmer: Tuple[float, float], stream: bool) -> float:
+    started = time.perf_counter()
+    status, headers, data = request(port, "POST", "/api/recommend", cookie, {
+        "lat": farmer[0], "lon": farmer[1],
+        "category": "seeds", "product": "rice seeds", "preference": "price",
+        "stream": stream,
+    })
+    assert status == 200, data
+    if stream:
+        body = json.loads(data)
+        session_cookie = headers.get("Set-Cookie", "").split(";", 1)[0] or cookie
+        status, _, frames = request(port, "GET", body["explanation_url"], session_cookie)
+        assert status == 200 and b"event: done" in frames, frames
+    return time.perf_counter() - started
+
+
+def run_load(port: int, cookie: str, clients: int, stream: bool, model_latency_ms: float, seed: int = 0) -> Dict:
+    rng = random.Random(seed)
+    farmers = [random_point(rng, DEFAULT_FARMER, 10) for _ in range(clients)]
+
+    probes: List[float] = []
+    done = threading.Event()
+
+    def probe():
+        while not done.is_set():
+            started = time.perf_counter()
+            status, _, _ = request(port, "GET", "/chat/start", cookie)
+            assert status == 200
+            probes.append(time.perf_counter() - started)
+            time.sleep(0.05)
+
+    prober = threading.Thread(target=probe, daemon=True)
+    started = time.perf_counter()
+    prober.start()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        latencies = list(pool.map(lambda f: recommend_once(port, cookie, f, stream), farmers))
+    wall = time.perf_counter() - started
+    done.set()
+    prober.join()
+
+    latencies.sort()
+    probes.sort()
+    return {
+        "requests": clients,
+        "wall_s": wall,
+        # Model calls in flight on average; a sync worker stays near 1.
+        "concurrency": clients * model_latency_ms / 1000 / wall,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000,
+        "chat_start_p50_ms": statistics.median(probes) * 1000 if probes else None,
+        "chat_start_max_ms": probes[-1] * 1000 if probes else None,
+    }
+
+
+def session_cookie(flask_app, email: str = "bench@example.com") -> str:
+    serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+    value = serializer.dumps({"user_email": email, "user_name": "Bench"})
+    return f"{flask_app.config['SESSION_COOKIE_NAME']}={value}"
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=32, help="concurrent recommendation requests")
+    parser.add_argument("--model-latency-ms", type=float, default=500)
+    parser.add_argument("--size", type=int, default=1000, help="listings per category")
+    parser.add_argument("--threads", type=int, default=64, help="ASGI thread pool size")
+    parser.add_argument("--skip-sync", action="store_true", help="skip the single sync worker run")
+    parser.add_argument("-o", "--output", help="write JSON results here (default: stdout)")
+    args = parser.parse_args(argv)
+
+    import app as app_module
+    from catalog_store import CatalogStore
+
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as f:
+        json.dump(generate_catalog(args.size, seed=args.size), f)
+        path = f.name
+
+    saved = app_module.catalog, app_module.model, app_module.explanation_cache
+    results = []
+    try:
+        app_module.catalog = CatalogStore(path)
+        app_module.model = AsyncStubModel(args.model_latency_ms)
+        app_module.explanation_cache = _NoCache()
+        cookie = session_cookie(app_module.app)
+
+        servers = [("asgi", lambda: start_asgi(args.threads))]
+        if not args.skip_sync:
+            servers.insert(0, ("wsgi-sync", lambda: start_wsgi(app_module.app)))
+        for server_name, start in servers:
+            port, stop = start()
+            try:
+                for stream in (False, True):
+                    result = run_load(port, cookie, args.clients, stream, args.model_latency_ms)
+                    result["name"] = f"{server_name}[{'sse' if stream else 'inline'}]"
+                    results.append(result)
+                    print(f"{result['name']}: concurrency {result['concurrency']:.1f}", file=sys.stderr)
+            finally:
+                stop()
+    finally:
+        app_module.catalog, app_module.model, app_module.explanation_cache = saved
+        os.unlink(path)
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.time(),
+            "clients": args.clients,
+            "model_latency_ms": args.model_latency_ms,
+            "threads": args.threads,
+        },
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,178 @@
+"""
+Login throughput and memory under concurrent logins.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_auth --clients 32 --requests 256 --workers 2
+
+Each mode sends `requests` correct-password logins from `clients` threads
+through Flask's test client: "inline" hashes on the request threads (the
+old behaviour), "pool" uses the PasswordHasher process pool. Peak RSS sums
+the app process and its hashing processes (sampled from /proc on Linux).
+Requests rejected with 503 are counted, not retried.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import statistics
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional
+
+from password_hasher import DEFAULT_METHOD, PasswordHasher
+
+
+# -------------------------------------------------
+# MEMORY
+# -------------------------------------------------
+def rss_bytes(pid: int) -> int:
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+class PeakRSS:
+    """Samples the summed RSS of this process and `children()` until stopped."""
+
+    def __init__(self, children, interval: float = 0.002):
+        self.children = children
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            total = rss_bytes(os.getpid()) + sum(rss_bytes(pid) for pid in self.children())
+            self.peak = max(self.peak, total)
+            time.sleep(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        return False
+
+
+def pool_pids(hasher: PasswordHasher) -> Iterable[int]:
+    executor = hasher._executor
+    processes = getattr(executor, "_processes", None) or {}
+    return list(processes)
+
+
+# -------------------------------------------------
+# BENCHMARK
+# -------------------------------------------------
+def bench_logins(app_module, hasher: PasswordHasher, users: List[str], clients: int, requests: int) -> Dict:
+    app_module.password_hasher = hasher
+    local = threading.local()
+
+    def login(n: int):
+        client = getattr(local, "client", None)
+        if client is None:
+            client = local.client = app_module.app.test_client()
+        started = time.perf_counter()
+        res = client.post("/auth/login", json={"email": users[n % len(users)], "password": "bench-password"})
+        return res.status_code, time.perf_counter() - started
+
+    # Warm the pool (process start-up is not part of the measurement).
+    for n in range(max(hasher.workers, 1)):
+        assert login(n)[0] == 200
+
+    with PeakRSS(lambda: pool_pids(hasher)) as rss:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=clients) as pool:
+            results = list(pool.map(login, range(requests)))
+        wall = time.perf_counter() - started
+
+    ok = sorted(seconds for status, seconds in results if status == 200)
+    statuses: Dict[str, int] = {}
+    for status, _ in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    return {
+        "requests": requests,
+        "clients": clients,
+        "wall_s": wall,
+        "logins_per_s": len(ok) / wall,
+        "p50_ms": statistics.median(ok) * 1000 if ok else None,
+        "p95_ms": ok[min(len(ok) - 1, int(len(ok) * 0.95))] * 1000 if ok else None,
+        "statuses": statuses,
+        "peak_rss_mb": rss.peak / 2 ** 20,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=32, help="concurrent login threads")
+    parser.add_argument("--requests", type=int, default=256)
+    parser.add_argument("--users", type=int, default=8)
+    parser.add_argument("--method", default=DEFAULT_METHOD, help="werkzeug hash method")
+    parser.add_argument("--workers", type=int, default=2, help="hashing processes in pool mode")
+    parser.add_argument("--max-pending", type=int, default=32, help="hashing queue limit in pool mode")
+    parser.add_argument("--modes", default="inline,pool")
+    parser.add_argument("-o", "--output", help="write JSON results here (default: stdout)")
+    args = parser.parse_args(argv)
+
+    import app as app_module
+    import db
+
+    saved = app_module.password_hasher, app_module.limiter.enabled
+    saved_db = None
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            app_module.limiter.enabled = False
+            saved_db = db.init_db(db.SqliteBackend(os.path.join(tmp, "kisansevak.sqlite3")))
+            setup = PasswordHasher(args.method, workers=0)
+            users = [f"farmer{n}@bench.example" for n in range(args.users)]
+            for email in users:
+                db.create_user(email, {"name": "Bench", "password_hash": setup.hash("bench-password")})
+
+            for mode in [m.strip() for m in args.modes.split(",") if m.strip()]:
+                workers = 0 if mode == "inline" else args.workers
+                hasher = PasswordHasher(args.method, workers=workers, max_pending=args.max_pending)
+                try:
+                    result = bench_logins(app_module, hasher, users, args.clients, args.requests)
+                finally:
+                    hasher.shutdown()
+                result["name"] = f"login[{mode}]"
+                results.append(result)
+                print(f"{result['name']}: {result['logins_per_s']:.1f}/s, peak {result['peak_rss_mb']:.0f} MB",
+                      file=sys.stderr)
+        finally:
+            app_module.password_hasher, app_module.limiter.enabled = saved
+            if saved_db is not None:
+                db.init_db(saved_db)
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "timestamp": time.time(),
+            "method": args.method,
+            "workers": args.workers,
+            "max_pending": args.max_pending,
+        },
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,268 @@
+"""
+QQDP ranking and /chat recommendation benchmarks.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_qqdp --sizes 10,1000,100000 -o bench.json
+    python -m benchmarks.bench_qqdp --baseline bench.json --threshold 0.15
+
+Results are JSON: one record per (benchmark, catalog size) with min /
+median / p95 milliseconds. With --baseline, every record whose median is
+more than --threshold slower than the baseline is flagged and the exit
+status is 1.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import statistics
+import tempfile
+from typing import Callable, Dict, List, Optional
+
+from benchmarks.synthetic_catalog import DEFAULT_FARMER, generate_catalog
+from QQDP_scoring import compute_quality, haversine_km, rank_items, rank_items_topk
+from spatial_index import GridIndex
+
+PREFERENCE = {"quality": "average", "price": "high", "distance": "average", "quantity": "average"}
+
+
+# -------------------------------------------------
+# TIMING
+# -------------------------------------------------
+def measure(fn: Callable[[], object], repeats: int, inner: int = 1) -> Dict:
+    """Time fn() `repeats` times (each a batch of `inner` calls), in ms per call."""
+    fn()  # warm-up
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        for _ in range(inner):
+            fn()
+        samples.append((time.perf_counter() - started) * 1000 / inner)
+    samples.sort()
+    return {
+        "min_ms": samples[0],
+        "median_ms": statistics.median(samples),
+        "p95_ms": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+        "repeats": repeats,
+    }
+
+
+def repeats_for(size: int, requested: int) -> int:
+    # Keep million-item runs bounded; small sizes get plenty of samples.
+    return max(3, min(requested, int(2_000_000 / max(size, 1))))
+
+
+# -------------------------------------------------
+# BENCHMARKS
+# -------------------------------------------------
+def bench_primitives(items: List[Dict], repeats: int) -> List[Dict]:
+    rng = random.Random(1)
+    sample = [rng.choice(items) for _ in range(1000)]
+    lat, lon = DEFAULT_FARMER
+
+    def run_haversine():
+        for item in sample:
+            haversine_km(lat, lon, item["seller_lat"], item["seller_lon"])
+
+    def run_quality():
+        for item in sample:
+            compute_quality(item)
+
+    # Per-call cost: 1000 calls per sample.
+    results = []
+    for name, fn in (("haversine_km", run_haversine), ("compute_quality", run_quality)):
+        stats = measure(fn, repeats)
+        results.append({
+            "name": name, "size": 1,
+            **{k: (v / 1000 if k.endswith("_ms") else v) for k, v in stats.items()},
+        })
+    return results
+
+
+def bench_ranking(items: List[Dict], repeats: int, engines: List[str]) -> List[Dict]:
+    size = len(items)
+    reps = repeats_for(size, repeats)
+    index = GridIndex(items)
+    results = []
+
+    cases = {
+        "rank_items[python]": lambda: rank_items(items, PREFERENCE, DEFAULT_FARMER),
+        "rank_items[python+grid]": lambda: rank_items(items, PREFERENCE, DEFAULT_FARMER, index),
+        "rank_items_topk[python+grid,k=6]": lambda: rank_items_topk(items, PREFERENCE, 6, DEFAULT_FARMER, index),
+    }
+    if "numpy" in engines:
+        from QQDP_numpy import ColumnarCatalog, rank_items_numpy
+
+        columns = ColumnarCatalog.from_items(items)
+        cases["rank_items[numpy]"] = lambda: rank_items_numpy(columns, PREFERENCE, DEFAULT_FARMER)
+        cases["rank_items[numpy+grid,k=6]"] = lambda: rank_items_numpy(
+            columns, PREFERENCE, DEFAULT_FARMER,
+            index.query(DEFAULT_FARMER[0], DEFAULT_FARMER[1], 25), k=6,
+        )
+
+    for name, fn in cases.items():
+        if name == "rank_items[python]" and size > 200_000:
+            continue  # minutes per sample; the indexed paths cover this size
+        results.append({"name": name, "size": size, **measure(fn, reps)})
+    return results
+
+
+class _StubResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class StubModel:
+    """Stands in for genai.GenerativeModel with a fixed latency."""
+
+    def __init__(self, latency_ms: float = 0):
+        self.latency_ms = latency_ms
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        text = "🌾 Best Recommendation for You\n\nProduct: stub"
+        return iter([_StubResponse(text)]) if stream else _StubResponse(text)
+
+
+def bench_chat(catalog: Dict, repeats: int, model_latency_ms: float) -> List[Dict]:
+    """
+    Full ASK_PREFERENCE request through Flask's test client, once with
+    ranking uncached (no ranking cache, no tiles: every request ranks the
+    catalog) and once with a warm per-worker ranking cache.
+    """
+    import app as app_module
+    from catalog_store import CatalogStore
+    from explanation_cache import ExplanationCache
+    from ranking_cache import RankingCache
+
+    size = len(catalog["seeds"])
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as f:
+        json.dump(catalog, f)
+        path = f.name
+
+    saved = (app_module.catalog, app_module.model, app_module.explanation_cache,
+             app_module.ranking_cache, app_module.tiles)
+    results = []
+    try:
+        app_module.catalog = CatalogStore(path)
+        app_module.model = StubModel(model_latency_ms)
+        # Tiles are built for the bundled catalog, never this synthetic one.
+        app_module.tiles = None
+        client = app_module.app.test_client()
+        with client.session_transaction() as sess:
+            sess["user_email"] = "bench@example.com"
+            sess["user_name"] = "Bench"
+
+        client.post("/chat/location", json={"lat": DEFAULT_FARMER[0], "lon": DEFAULT_FARMER[1]})
+        client.post("/chat", json={"stage": "ASK_CATEGORY", "message": "seeds"})
+        client.post("/chat", json={"stage": "ASK_PRODUCT", "message": "rice seeds"})
+
+        for ranking in ("uncached", "cached"):
+            # measure()'s warm-up request fills the cached run's ranking cache.
+            app_module.ranking_cache = RankingCache() if ranking == "cached" else None
+
+            def run():
+                # Fresh cache each time: measure the uncached explanation path.
+                app_module.explanation_cache = ExplanationCache()
+                res = client.post("/chat", json={"stage": "ASK_PREFERENCE", "message": "price"})
+                assert res.status_code == 200, res.get_data(as_text=True)
+
+            results.append({
+                "name": f"chat[ASK_PREFERENCE,model={model_latency_ms:g}ms,ranking={ranking}]",
+                "size": size,
+                **measure(run, repeats_for(size, repeats)),
+            })
+        return results
+    finally:
+        (app_module.catalog, app_module.model, app_module.explanation_cache,
+         app_module.ranking_cache, app_module.tiles) = saved
+        os.unlink(path)
+
+
+# -------------------------------------------------
+# BASELINE COMPARISON
+# -------------------------------------------------
+def compare(results: List[Dict], baseline: Dict, threshold: float) -> List[Dict]:
+    """Annotate results with the baseline median; return the regressions."""
+    previous = {(r["name"], r["size"]): r for r in baseline.get("results", [])}
+    regressions = []
+    for result in results:
+        before = previous.get((result["name"], result["size"]))
+        if not before:
+            continue
+        ratio = result["median_ms"] / before["median_ms"] if before["median_ms"] else 1.0
+        result["baseline_median_ms"] = before["median_ms"]
+        result["ratio"] = ratio
+        result["regression"] = ratio > 1 + threshold
+        if result["regression"]:
+            regressions.append(result)
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10,100,1000,10000,100000",
+                        help="comma-separated catalog sizes (listings per category), up to 1000000")
+    parser.add_argument("--spread-km", type=float, default=40, help="seller spread around the farmer")
+    parser.add_argument("--repeats", type=int, default=30)
+    parser.add_argument("--engines", default="python,numpy")
+    parser.add_argument("--skip-chat", action="store_true", help="skip the Flask /chat benchmark")
+    parser.add_argument("--model-latency-ms", type=float, default=0)
+    parser.add_argument("-o", "--output", help="write JSON results here (default: stdout)")
+    parser.add_argument("--baseline", help="previous JSON results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed slowdown ratio")
+    args = parser.parse_args(argv)
+
+    engines = [e.strip() for e in args.engines.split(",") if e.strip()]
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+
+    results: List[Dict] = []
+    for size in sizes:
+        catalog = generate_catalog(size, spread_km=args.spread_km, seed=size)
+        items = catalog["seeds"]
+        if size == sizes[0]:
+            results += bench_primitives(items, args.repeats)
+        results += bench_ranking(items, args.repeats, engines)
+        if not args.skip_chat:
+            results += bench_chat(catalog, args.repeats, args.model_latency_ms)
+        print(f"size {size}: done", file=sys.stderr)
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.time(),
+            "spread_km": args.spread_km,
+            "engines": engines,
+        },
+        "results": results,
+    }
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        report["regressions"] = [(r["name"], r["size"], round(r["ratio"], 3)) for r in regressions]
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    for r in regressions:
+        print(
+            f"REGRESSION {r['name']} size={r['size']}: "
+            f"{r['baseline_median_ms']:.3f} ms -> {r['median_ms']:.3f} ms (x{r['ratio']:.2f})",
+            file=sys.stderr,
+        )
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+"""
+Cost of one seller price/stock update: full catalog reload vs LiveCatalog.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_updates --sizes 1000,10000,100000
+
+"reload" is what an update cost before: re-parse the rewritten JSON and
+rebuild the snapshot and its indexes. "patch" applies one logged patch
+to a LiveCatalog (heaps, quality and indexes updated in place) and
+"logged" also writes it to a SQLite ChangeLog first. The first ranking
+after a change is timed too, with a product selection memoised.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import statistics
+import tempfile
+from typing import Dict, List, Optional
+
+from benchmarks.synthetic_catalog import DEFAULT_FARMER, generate_catalog, random_point
+from catalog_store import CatalogSnapshot
+from catalog_updates import ChangeLog, LiveCatalog, validate_change
+
+PREFERENCE = {"quality": "average", "quantity": "average", "distance": "average", "price": "high"}
+
+
+def timed(fn, repeat: int) -> List[float]:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def summary(name: str, size: int, samples: List[float]) -> Dict:
+    samples = sorted(samples)
+    return {
+        "name": name,
+        "listings": size,
+        "runs": len(samples),
+        "p50_us": statistics.median(samples) * 1e6,
+        "p95_us": samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1e6,
+    }
+
+
+def bench_size(n: int, repeat: int, log_dir: str) -> List[Dict]:
+    data = generate_catalog(n, seed=n)
+    raw = json.dumps(data).encode("utf-8")
+    rng = random.Random(n)
+    ids = [item["item_id"] for item in data["seeds"]]
+    seq = [0]
+
+    def patch_change() -> Dict:
+        seq[0] += 1
+        change = validate_change({
+            "op": "patch", "category": "seeds", "item_id": rng.choice(ids),
+            "price": rng.randint(180, 1200), "available_qty": rng.randint(80, 700),
+        })
+        change["seq"] = seq[0]
+        return change
+
+    live = LiveCatalog(CatalogSnapshot(data, "bench", 0, 1), 1)
+    live.rank_topk("seeds", "rice", PREFERENCE, DEFAULT_FARMER, 5)  # memoise the selection
+    changelog = ChangeLog(os.path.join(log_dir, f"changes-{n}.sqlite3"))
+
+    def logged():
+        change = patch_change()
+        changelog.append([change])
+        live.apply([change], change["seq"] + 1)
+
+    def patch_and_rank():
+        change = patch_change()
+        live.apply([change], change["seq"] + 1)
+        live.rank_topk("seeds", "rice", PREFERENCE, random_point(rng, DEFAULT_FARMER, 20), 5)
+
+    reload_runs = max(3, repeat // 100)
+    return [
+        summary("reload", n, timed(lambda: CatalogSnapshot(json.loads(raw), "bench", 0, 2), reload_runs)),
+        summary("patch", n, timed(lambda: live.apply([patch_change()], seq[0] + 1), repeat)),
+        summary("logged", n, timed(logged, repeat)),
+        summary("patch+rank", n, timed(patch_and_rank, repeat)),
+    ]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000,100000", help="listings per category")
+    parser.add_argument("--repeat", type=int, default=1000)
+    parser.add_argument("-o", "--output", help="write JSON results here (default: stdout)")
+    args = parser.parse_args(argv)
+
+    results = []
+    with tempfile.TemporaryDirectory() as log_dir:
+        for n in [int(s) for s in args.sizes.split(",") if s.strip()]:
+            for result in bench_size(n, args.repeat, log_dir):
+                results.append(result)
+                print(f"{result['name']}[{n}]: p50 {result['p50_us']:.0f} us", file=sys.stderr)
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.time(),
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,405 @@
+"""
+End-to-end load test of the chat flow, for sizing workers.
+
+Against a running instance (start the stubs with benchmarks.stub_services
+and point the app at them, or use real upstreams):
+
+    python -m benchmarks.loadtest --url http://127.0.0.1:8000 --users 50 --duration 60
+
+Or let the load test start the stubs and the app itself; `{port}` in the
+command is replaced, and the app gets temporary databases:
+
+    python -m benchmarks.loadtest --app-cmd "gunicorn -w 4 -b 127.0.0.1:{port} wsgi:app" \\
+        --users 50 --duration 60 --gemini-latency-ms 800 --gemini-error-rate 0.02
+
+Each virtual user keeps its own cookies and repeats one session after the
+other: /auth/login, /chat/start, a location (GPS through /chat/location or,
+for `--pin-ratio` of sessions, a PIN code typed into /chat), then category,
+product and preference through /chat. `--stream-ratio` of sessions ask for a
+streamed recommendation and read the SSE explanation. A step that answers
+an unexpected status or chat stage ends its session and is counted as an
+error of that stage.
+
+Reports sessions/s, requests/s, p50/p95/p99 per stage (successful requests)
+and errors per stage and kind; "session" is the summed request time of
+completed sessions, think time excluded. Outcomes count how recommendations
+were answered: explained by the model (replies starting with the stub's
+STUB_REPLY), by the template fallback, or with no result. Unknown PIN codes
+and PIN code API failures both show as location_pin errors
+"stage_ASK_LOCATION_TEXT". Users sign up (or log in, if the
+account exists) before the clock starts; run the app with
+RATE_LIMIT_ENABLED=0, since login is limited per client address.
+"""
+import os
+import sys
+import json
+import time
+import random
+import signal
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+from typing import Dict, List, Optional, Tuple, Union
+
+import requests
+
+from benchmarks.stub_services import STUB_REPLY, add_stub_arguments, app_environment, start_stubs
+from benchmarks.synthetic_catalog import DEFAULT_FARMER, random_point
+
+PASSWORD = "loadtest-password"
+
+CATEGORIES = {
+    "seeds": ["wheat seeds", "rice seeds", "corn seeds"],
+    "fertilizers": ["urea", "dap", "npk fertilizer"],
+    "pesticides": ["neem oil", "chlorpyrifos", "imidacloprid"],
+}
+PREFERENCES = ["quality", "price", "distance", "quantity"]
+
+STAGES = ["login", "chat_start", "location_gps", "location_pin", "category", "product", "preference", "explanation"]
+
+
+class StepFailed(Exception):
+    """A step answered something other than what the flow expects; str() is the error kind."""
+
+
+# -------------------------------------------------
+# RESULTS
+# -------------------------------------------------
+class Results:
+    """Latencies and error counts, shared by the virtual users."""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, Dict[str, int]] = {}
+        self.outcomes: Dict[str, int] = {}
+        self.sessions = 0
+        self.failed_sessions = 0
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float, error: Optional[str] = None):
+        with self._lock:
+            self.requests += 1
+            if error is None:
+                self.latencies.setdefault(stage, []).append(seconds)
+            else:
+                kinds = self.errors.setdefault(stage, {})
+                kinds[error] = kinds.get(error, 0) + 1
+
+    def outcome(self, how: str):
+        with self._lock:
+            self.outcomes[how] = self.outcomes.get(how, 0) + 1
+
+    def finished(self, seconds: Optional[float]):
+        with self._lock:
+            if seconds is None:
+                self.failed_sessions += 1
+            else:
+                self.sessions += 1
+                self.latencies.setdefault("session", []).append(seconds)
+
+
+def percentile(samples: List[float], q: float) -> float:
+    return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+
+def stage_summary(stage: str, samples: List[float], errors: Dict[str, int]) -> Dict:
+    samples = sorted(samples)
+    summary = {"stage": stage, "ok": len(samples), "errors": sum(errors.values())}
+    if samples:
+        summary.update({
+            "p50_ms": percentile(samples, 0.50) * 1000,
+            "p95_ms": percentile(samples, 0.95) * 1000,
+            "p99_ms": percentile(samples, 0.99) * 1000,
+            "max_ms": samples[-1] * 1000,
+        })
+    return summary
+
+
+# -------------------------------------------------
+# VIRTUAL USER
+# -------------------------------------------------
+def explanation_source(reply: str) -> str:
+    return "model" if reply.startswith(STUB_REPLY) else "template"
+
+
+class VirtualUser:
+    def __init__(self, base_url: str, email: str, args: argparse.Namespace, results: Results, seed: int):
+        self.base_url = base_url.rstrip("/")
+        self.email = email
+        self.args = args
+        self.results = results
+        self.rng = random.Random(seed)
+        self.http = requests.Session()
+        self.elapsed = 0.0
+
+    def step(self, stage: str, method: str, path: str, expect_stage: Union[str, Tuple[str, ...]] = (), **kwargs):
+        started = time.perf_counter()
+        try:
+            res = self.http.request(method, self.base_url + path, timeout=self.args.timeout, **kwargs)
+            body = res.json()
+        except (requests.RequestException, ValueError) as e:
+            self.results.record(stage, time.perf_counter() - started, type(e).__name__)
+            raise StepFailed(type(e).__name__)
+        seconds = time.perf_counter() - started
+        if res.status_code != 200:
+            self.results.record(stage, seconds, f"http_{res.status_code}")
+            raise StepFailed(f"http_{res.status_code}")
+        expected = (expect_stage,) if isinstance(expect_stage, str) else expect_stage
+        if expected and body.get("stage") not in expected:
+            self.results.record(stage, seconds, f"stage_{body.get('stage')}")
+            raise StepFailed(f"stage_{body.get('stage')}")
+        self.results.record(stage, seconds)
+        self.elapsed += seconds
+        return body
+
+    def think(self):
+        if self.args.think_ms:
+            time.sleep(self.rng.uniform(0.5, 1.5) * self.args.think_ms / 1000)
+
+    def chat(self, stage: str, chat_stage: str, message: str, expect_stage, **extra):
+        self.think()
+        return self.step(stage, "POST", "/chat", expect_stage,
+                         json={"stage": chat_stage, "message": message, **extra})
+
+    def sign_up(self):
+        res = self.http.post(self.base_url + "/auth/signup", timeout=self.args.timeout,
+                             json={"name": "Load Test", "email": self.email, "password": PASSWORD})
+        if res.status_code not in (200, 409):
+            # 429: the app limits signups per address; run it with RATE_LIMIT_ENABLED=0.
+            raise RuntimeError(f"signup of {self.email} answered {res.status_code}")
+
+    def run_session(self, pincodes: List[str]):
+        rng = self.rng
+        self.elapsed = 0.0
+        self.step("login", "POST", "/auth/login", json={"email": self.email, "password": PASSWORD})
+        self.step("chat_start", "GET", "/chat/start", "ASK_LOCATION_PERMISSION")
+        self.think()
+        if rng.random() < self.args.pin_ratio:
+            self.step("location_pin", "POST", "/chat", "ASK_CATEGORY",
+                      json={"stage": "ASK_LOCATION_TEXT", "message": rng.choice(pincodes)})
+        else:
+            lat, lon = random_point(rng, DEFAULT_FARMER, self.args.spread_km)
+            self.step("location_gps", "POST", "/chat/location", "ASK_CATEGORY", json={"lat": lat, "lon": lon})
+
+        category = rng.choice(sorted(CATEGORIES))
+        self.chat("category", "ASK_CATEGORY", category, "ASK_PRODUCT")
+        self.chat("product", "ASK_PRODUCT", rng.choice(CATEGORIES[category]), "ASK_PREFERENCE")
+        stream = rng.random() < self.args.stream_ratio
+        # ASK_PRODUCT: nothing in the catalog matches (e.g. corn in list_material.json).
+        body = self.chat("preference", "ASK_PREFERENCE", rng.choice(PREFERENCES), ("DONE", "ASK_PRODUCT"),
+                         stream=stream)
+
+        if body["stage"] == "ASK_PRODUCT":
+            self.results.outcome("no_match")
+        elif not body.get("top_items"):
+            self.results.outcome("no_results")
+        elif not stream:
+            self.results.outcome(explanation_source(body.get("reply") or ""))
+        elif body.get("explanation_url"):
+            self.read_explanation(body["explanation_url"])
+
+    def read_explanation(self, url: str):
+        started = time.perf_counter()
+        try:
+            with self.http.get(self.base_url + url, stream=True, timeout=self.args.timeout) as res:
+                status = res.status_code
+                text = res.text
+        except requests.RequestException as e:
+            self.results.record("explanation", time.perf_counter() - started, type(e).__name__)
+            raise StepFailed(type(e).__name__)
+        seconds = time.perf_counter() - started
+        if status != 200:
+            self.results.record("explanation", seconds, f"http_{status}")
+            raise StepFailed(f"http_{status}")
+
+        # The last event is "done" (model answer, possibly cached) or "fallback" (template reply).
+        event, data = None, None
+        for line in text.splitlines():
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: "):
+                data = line[len("data: "):]
+        if event not in ("done", "fallback"):
+            self.results.record("explanation", seconds, f"event_{event}")
+            raise StepFailed(f"event_{event}")
+        self.results.record("explanation", seconds)
+        self.elapsed += seconds
+        reply = (json.loads(data).get("reply") or "") if data else ""
+        self.results.outcome("template" if event == "fallback" else explanation_source(reply))
+
+    def run(self, deadline: float, pincodes: List[str]):
+        while time.monotonic() < deadline:
+            try:
+                self.run_session(pincodes)
+            except StepFailed:
+                self.results.finished(None)
+            else:
+                self.results.finished(self.elapsed)
+
+
+# -------------------------------------------------
+# APP UNDER TEST
+# -------------------------------------------------
+def wait_until_up(url: str, process: subprocess.Popen, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"app exited with status {process.returncode}")
+        try:
+            requests.get(url + "/chat/start", timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError(f"app did not answer on {url} within {timeout:.0f}s")
+
+
+def start_app(command: str, port: int, env: Dict[str, str], data_dir: str) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "LOCAL_DB_PATH": os.path.join(data_dir, "kisansevak.sqlite3"),
+        "USERS_JSON_PATH": os.path.join(data_dir, "users.json"),
+        "ORDERS_JSON_PATH": os.path.join(data_dir, "orders.json"),
+        "PINCODE_CACHE_PATH": os.path.join(data_dir, "pincode_cache.sqlite3"),
+        **env,
+    }
+    return subprocess.Popen(command.format(port=port), shell=True, env=env, start_new_session=True)
+
+
+def stop_app(process: subprocess.Popen):
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        os.killpg(process.pid, signal.SIGKILL)
+        process.wait()
+    except ProcessLookupError:
+        pass
+
+
+# -------------------------------------------------
+# LOAD
+# -------------------------------------------------
+def run_load(url: str, args: argparse.Namespace) -> Tuple[Results, float]:
+    rng = random.Random(args.seed)
+    pincodes = [str(rng.randint(400001, 499999)) for _ in range(args.pincodes)]
+    run_id = f"{int(time.time())}-{os.getpid()}"
+    results = Results()
+    users = [
+        VirtualUser(url, f"loadtest-{run_id}-{n}@example.test", args, results, seed=args.seed + n)
+        for n in range(args.users)
+    ]
+    for user in users:
+        user.sign_up()
+
+    threads = []
+    started = time.monotonic()
+    deadline = started + args.ramp + args.duration
+    for n, user in enumerate(users):
+        thread = threading.Thread(target=user.run, args=(deadline, pincodes), daemon=True)
+        threads.append(thread)
+        thread.start()
+        if args.ramp and n + 1 < len(users):
+            time.sleep(args.ramp / len(users))
+    for thread in threads:
+        thread.join()
+    return results, time.monotonic() - started
+
+
+def report_table(report: Dict) -> str:
+    lines = [f"{'stage':<14}{'ok':>8}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"]
+    for row in report["stages"]:
+        cells = [f"{row.get(k, 0):>10.1f}" if k in row else f"{'-':>10}" for k in ("p50_ms", "p95_ms", "p99_ms")]
+        lines.append(f"{row['stage']:<14}{row['ok']:>8}{row['errors']:>8}" + "".join(cells))
+    totals = report["totals"]
+    lines.append(
+        f"{totals['sessions_per_s']:.1f} sessions/s, {totals['requests_per_s']:.1f} requests/s, "
+        f"{totals['failed_sessions']} failed sessions"
+    )
+    for stage, kinds in report["errors"].items():
+        lines.append(f"errors[{stage}]: " + ", ".join(f"{kind} x{count}" for kind, count in kinds.items()))
+    lines.append("outcomes: " + ", ".join(f"{k} x{v}" for k, v in sorted(report["outcomes"].items())))
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--url", help="base URL of a running instance")
+    target.add_argument("--app-cmd", help="start this command with stub upstreams ({port} is replaced)")
+    parser.add_argument("--port", type=int, default=8000, help="port for --app-cmd")
+    parser.add_argument("--users", type=int, default=20, help="concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of load after the ramp")
+    parser.add_argument("--ramp", type=float, default=0, help="seconds over which users start")
+    parser.add_argument("--think-ms", type=float, default=0, help="mean pause between chat steps")
+    parser.add_argument("--pin-ratio", type=float, default=0.3, help="share of sessions that type a PIN code")
+    parser.add_argument("--pincodes", type=int, default=2000, help="distinct PIN codes typed")
+    parser.add_argument("--stream-ratio", type=float, default=0.5, help="share of streamed recommendations")
+    parser.add_argument("--spread-km", type=float, default=30, help="GPS locations around the catalog centre")
+    parser.add_argument("--timeout", type=float, default=30, help="client timeout per request")
+    add_stub_arguments(parser)
+    parser.add_argument("-o", "--output", help="write JSON results here (default: stdout)")
+    args = parser.parse_args(argv)
+
+    stubs = None
+    with tempfile.TemporaryDirectory() as data_dir:
+        if args.app_cmd:
+            stubs = start_stubs(args)
+            url = f"http://127.0.0.1:{args.port}"
+            process = start_app(args.app_cmd, args.port, app_environment(*stubs), data_dir)
+            try:
+                wait_until_up(url, process)
+                results, wall = run_load(url, args)
+            finally:
+                stop_app(process)
+        else:
+            results, wall = run_load(args.url, args)
+
+    stages = [s for s in STAGES if s in results.latencies or s in results.errors] + ["session"]
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "timestamp": time.time(),
+            "target": args.app_cmd or args.url,
+            "users": args.users,
+            "duration_s": args.duration,
+            "ramp_s": args.ramp,
+            "think_ms": args.think_ms,
+            "pin_ratio": args.pin_ratio,
+            "stream_ratio": args.stream_ratio,
+        },
+        "totals": {
+            "wall_s": wall,
+            "sessions": results.sessions,
+            "failed_sessions": results.failed_sessions,
+            "requests": results.requests,
+            "sessions_per_s": results.sessions / wall,
+            "requests_per_s": results.requests / wall,
+        },
+        "stages": [stage_summary(s, results.latencies.get(s, []), results.errors.get(s, {})) for s in stages],
+        "errors": results.errors,
+        "outcomes": results.outcomes,
+    }
+    if stubs:
+        gemini, pincode = stubs
+        report["meta"]["stubs"] = {k: v for k, v in vars(args).items() if k.startswith(("gemini_", "pincode_"))}
+        report["upstream_calls"] = {"gemini": gemini.stats(), "pincode": pincode.stats()}
+        gemini.shutdown()
+        pincode.shutdown()
+
+    print(report_table(report), file=sys.stderr)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
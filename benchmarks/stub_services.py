@@ -0,0 +1,299 @@
+"""
+Local stand-ins for Gemini and api.postalpincode.in, for load tests.
+
+Run from the repository root:
+
+    python -m benchmarks.stub_services --gemini-latency-ms 800 --gemini-error-rate 0.02
+
+and start the app against them (the command prints these settings):
+
+    GOOGLE_API_KEY=stub GEMINI_MODEL_ID=gemini-stub \\
+    GEMINI_API_ENDPOINT=http://127.0.0.1:8701 PINCODE_API_URL=http://127.0.0.1:8702 \\
+    RATE_LIMIT_ENABLED=0 gunicorn -w 4 wsgi:app
+
+The Gemini stub answers the REST generateContent and streamGenerateContent
+calls google-generativeai makes; a streamed answer arrives in chunks spread
+over the latency. Its text starts with STUB_REPLY, so a client can tell a
+model answer from the template fallback. The PIN code stub answers any
+6-digit PIN with coordinates derived from it, within `spread_km` of the
+synthetic catalog's centre; a `not_found_rate` share of PINs is unknown.
+
+Every call waits latency ± jitter; an `error_rate` share fails at once
+with a 5xx, like an overloaded upstream. GET /stats on either stub returns
+its call and error counts.
+"""
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+from benchmarks.synthetic_catalog import DEFAULT_FARMER, random_point
+
+STUB_REPLY = "[stub-gemini]"
+
+GEMINI_PATH = re.compile(r"/v1beta/models/([^/:]+):(generateContent|streamGenerateContent)")
+PINCODE_PATH = re.compile(r"/pincode/([^/?]+)")
+
+
+# -------------------------------------------------
+# BEHAVIOUR
+# -------------------------------------------------
+class Behaviour:
+    """Latency, jitter and error rate of one stub."""
+
+    def __init__(self, latency_ms: float = 0, jitter_ms: float = 0, error_rate: float = 0, seed: Optional[int] = None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def delay(self) -> float:
+        """Seconds the next call takes."""
+        with self._lock:
+            jitter = self._rng.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0
+        return max(0.0, self.latency_ms + jitter) / 1000
+
+    def fails(self) -> bool:
+        if not self.error_rate:
+            return False
+        with self._lock:
+            return self._rng.random() < self.error_rate
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+    def __init__(self, address: Tuple[str, int], handler, behaviour: Behaviour, **options):
+        super().__init__(address, handler)
+        self.behaviour = behaviour
+        self.options = options
+        self.calls = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, failed: bool):
+        with self._lock:
+            self.calls += 1
+            self.errors += failed
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"calls": self.calls, "errors": self.errors}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, as the app's requests sessions expect
+
+    def send_json(self, status: int, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_stats(self) -> bool:
+        if self.path != "/stats":
+            return False
+        self.send_json(200, self.server.stats())
+        return True
+
+    def log_message(self, format, *args):
+        pass
+
+
+# -------------------------------------------------
+# GEMINI
+# -------------------------------------------------
+def _candidate(text: str) -> Dict:
+    return {
+        "candidates": [{
+            "content": {"parts": [{"text": text}], "role": "model"},
+            "finishReason": "STOP",
+            "index": 0,
+        }],
+    }
+
+
+class GeminiHandler(_Handler):
+    def do_GET(self):
+        if not self.send_stats():
+            self.send_json(404, {"error": {"code": 404, "message": "not found", "status": "NOT_FOUND"}})
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        match = GEMINI_PATH.match(self.path)
+        if not match:
+            self.send_json(404, {"error": {"code": 404, "message": "not found", "status": "NOT_FOUND"}})
+            return
+
+        behaviour = self.server.behaviour
+        failed = behaviour.fails()
+        self.server.count(failed)
+        if failed:
+            self.send_json(503, {"error": {"code": 503, "message": "The model is overloaded.", "status": "UNAVAILABLE"}})
+            return
+
+        model, method = match.groups()
+        parts = [f"{STUB_REPLY} ", f"{model} suggests ", "the first option: ", "best overall score nearby."]
+        if method == "generateContent":
+            time.sleep(behaviour.delay())
+            self.send_json(200, _candidate("".join(parts)))
+            return
+
+        # A JSON array sent element by element, as the REST transport expects.
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        pause = behaviour.delay() / len(parts)
+        for n, text in enumerate(parts):
+            time.sleep(pause)
+            self._chunk(("[" if n == 0 else ",") + json.dumps(_candidate(text)))
+        self._chunk("]")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _chunk(self, text: str):
+        data = text.encode("utf-8")
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+
+# -------------------------------------------------
+# PIN CODES
+# -------------------------------------------------
+def pincode_coords(pincode: str, center: Tuple[float, float], spread_km: float) -> Tuple[float, float]:
+    """Stable coordinates for a PIN code."""
+    return random_point(random.Random(int(pincode)), center, spread_km)
+
+
+class PincodeHandler(_Handler):
+    def do_GET(self):
+        if self.send_stats():
+            return
+        match = PINCODE_PATH.match(self.path)
+        if not match:
+            self.send_json(404, {"error": "not found"})
+            return
+
+        behaviour = self.server.behaviour
+        failed = behaviour.fails()
+        self.server.count(failed)
+        if failed:
+            self.send_json(500, {"error": "stub: upstream error"})
+            return
+
+        time.sleep(behaviour.delay())
+        pincode = match.group(1)
+        options = self.server.options
+        if not re.fullmatch(r"\d{6}", pincode) or int(pincode) % 1000 < options["not_found_rate"] * 1000:
+            self.send_json(200, [{"Message": "No records found", "Status": "Error", "PostOffice": None}])
+            return
+        lat, lon = pincode_coords(pincode, options["center"], options["spread_km"])
+        self.send_json(200, [{
+            "Message": "Number of pincode(s) found:1",
+            "Status": "Success",
+            "PostOffice": [{"Name": f"Stub {pincode}", "Pincode": pincode,
+                            "Latitude": f"{lat:.6f}", "Longitude": f"{lon:.6f}"}],
+        }])
+
+
+# -------------------------------------------------
+# SERVERS
+# -------------------------------------------------
+def _serve(handler, behaviour: Behaviour, host: str, port: int, **options) -> StubServer:
+    server = StubServer((host, port), handler, behaviour, **options)
+    threading.Thread(target=server.serve_forever, name=handler.__name__, daemon=True).start()
+    return server
+
+
+def serve_gemini(behaviour: Behaviour, host: str = "127.0.0.1", port: int = 0) -> StubServer:
+    """Start the Gemini stub on a background thread; port 0 picks a free one."""
+    return _serve(GeminiHandler, behaviour, host, port)
+
+
+def serve_pincode(
+    behaviour: Behaviour,
+    host: str = "127.0.0.1",
+    port: int = 0,
+    center: Tuple[float, float] = DEFAULT_FARMER,
+    spread_km: float = 30,
+    not_found_rate: float = 0,
+) -> StubServer:
+    """Start the PIN code stub on a background thread; port 0 picks a free one."""
+    return _serve(PincodeHandler, behaviour, host, port,
+                  center=center, spread_km=spread_km, not_found_rate=not_found_rate)
+
+
+def add_stub_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--gemini-latency-ms", type=float, default=800)
+    parser.add_argument("--gemini-jitter-ms", type=float, default=200)
+    parser.add_argument("--gemini-error-rate", type=float, default=0.0)
+    parser.add_argument("--pincode-latency-ms", type=float, default=150)
+    parser.add_argument("--pincode-jitter-ms", type=float, default=50)
+    parser.add_argument("--pincode-error-rate", type=float, default=0.0)
+    parser.add_argument("--pincode-not-found-rate", type=float, default=0.05, help="share of PINs that are unknown")
+    parser.add_argument("--seed", type=int, default=1)
+
+
+def start_stubs(args: argparse.Namespace, host: str = "127.0.0.1",
+                gemini_port: int = 0, pincode_port: int = 0) -> Tuple[StubServer, StubServer]:
+    gemini = serve_gemini(
+        Behaviour(args.gemini_latency_ms, args.gemini_jitter_ms, args.gemini_error_rate, seed=args.seed),
+        host, gemini_port,
+    )
+    pincode = serve_pincode(
+        Behaviour(args.pincode_latency_ms, args.pincode_jitter_ms, args.pincode_error_rate, seed=args.seed + 1),
+        host, pincode_port, not_found_rate=args.pincode_not_found_rate,
+    )
+    return gemini, pincode
+
+
+def app_environment(gemini: StubServer, pincode: StubServer) -> Dict[str, str]:
+    """Settings that point the app at the stubs."""
+    return {
+        "GOOGLE_API_KEY": "stub",
+        "GEMINI_MODEL_ID": "gemini-stub",
+        "GEMINI_API_ENDPOINT": gemini.url,
+        "PINCODE_API_URL": pincode.url,
+        "RATE_LIMIT_ENABLED": "0",
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--gemini-port", type=int, default=8701)
+    parser.add_argument("--pincode-port", type=int, default=8702)
+    add_stub_arguments(parser)
+    args = parser.parse_args(argv)
+
+    gemini, pincode = start_stubs(args, args.host, args.gemini_port, args.pincode_port)
+    for name, value in app_environment(gemini, pincode).items():
+        print(f"export {name}={value}")
+    sys.stdout.flush()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        gemini.shutdown()
+        pincode.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
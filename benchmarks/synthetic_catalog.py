@@ -0,0 +1,103 @@
+import math
+import json
+import random
+import argparse
+from typing import Dict, List, Optional, Tuple
+
+# -------------------------------------------------
+# PRODUCT TEMPLATES (modelled on list_material.json)
+# -------------------------------------------------
+# name, item_id prefix, category label, price range, available_qty range, required_qty range
+PRODUCTS = {
+    "seeds": (
+        "SEED", "seed",
+        ["Rice MTU-1010", "Wheat HD-2967", "Cotton BT Hybrid", "Soybean JS-335", "Tomato Hybrid",
+         "Rice IR-64", "Wheat Lok-1", "Chilli Hybrid", "Corn Hybrid", "Okra Hybrid"],
+        (180, 1200), (80, 700), (5, 25),
+    ),
+    "fertilizers": (
+        "FERT", "fertilizer",
+        ["Urea", "DAP", "NPK 19:19:19", "Organic Compost", "Vermicompost", "NPK 12:32:16"],
+        (6, 45), (900, 3200), (40, 100),
+    ),
+    "pesticides": (
+        "PEST", "pesticide",
+        ["Insecticide (Imidacloprid)", "Fungicide (Mancozeb)", "Herbicide (Glyphosate)",
+         "Insecticide (Chlorpyrifos)", "Insecticide (Neem-based)", "Fungicide (Generic)"],
+        (300, 1500), (90, 200), (2, 6),
+    ),
+}
+
+DEFAULT_FARMER = (19.1070, 72.8400)
+KM_PER_DEG_LAT = 111.32
+
+
+def random_point(rng: random.Random, center: Tuple[float, float], spread_km: float) -> Tuple[float, float]:
+    """Uniform point in a disc of spread_km around center (equirectangular)."""
+    r = spread_km * math.sqrt(rng.random())
+    theta = rng.uniform(0, 2 * math.pi)
+    dlat = (r * math.cos(theta)) / KM_PER_DEG_LAT
+    dlon = (r * math.sin(theta)) / (KM_PER_DEG_LAT * math.cos(math.radians(center[0])))
+    return round(center[0] + dlat, 6), round(center[1] + dlon, 6)
+
+
+def generate_items(
+    n: int,
+    category: str = "seeds",
+    farmer: Tuple[float, float] = DEFAULT_FARMER,
+    spread_km: float = 40,
+    seed: Optional[int] = 0,
+) -> List[Dict]:
+    """n synthetic listings for one category, sellers spread around farmer."""
+    rng = random.Random(seed)
+    prefix, label, names, price_range, avail_range, req_range = PRODUCTS[category]
+    sellers = max(1, n // 4)
+
+    items = []
+    for i in range(n):
+        seller = rng.randrange(sellers)
+        lat, lon = random_point(rng, farmer, spread_km)
+        reviews = 0 if rng.random() < 0.15 else rng.randint(1, 400)
+        price = rng.uniform(*price_range)
+        items.append({
+            "item_id": f"{prefix}{i:07d}",
+            "category": label,
+            "name": rng.choice(names),
+            "seller_id": f"SELLER_{seller}",
+            "seller_name": f"Seller {seller}",
+            "product_quality": round(rng.uniform(0.3, 0.95), 2),
+            "reliability": round(rng.uniform(0.3, 0.95), 2),
+            "avg_rating": round(rng.uniform(3.0, 5.0), 1) if reviews else 0,
+            "review_count": reviews,
+            "available_qty": rng.randint(*avail_range),
+            "required_qty": rng.randint(*req_range),
+            "seller_lat": lat,
+            "seller_lon": lon,
+            "price": round(price, 1) if price < 100 else int(price),
+        })
+    return items
+
+
+def generate_catalog(n_per_category: int, **kwargs) -> Dict[str, List[Dict]]:
+    return {
+        category: generate_items(n_per_category, category, **kwargs)
+        for category in PRODUCTS
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic list_material.json-style catalog.")
+    parser.add_argument("n", type=int, help="listings per category")
+    parser.add_argument("-o", "--output", default="synthetic_catalog.json")
+    parser.add_argument("--lat", type=float, default=DEFAULT_FARMER[0])
+    parser.add_argument("--lon", type=float, default=DEFAULT_FARMER[1])
+    parser.add_argument("--spread-km", type=float, default=40)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    catalog = generate_catalog(
+        args.n, farmer=(args.lat, args.lon), spread_km=args.spread_km, seed=args.seed
+    )
+    with open(args.output, "w") as f:
+        json.dump(catalog, f)
+    print(f"Wrote {args.n} listings per category to {args.output}")
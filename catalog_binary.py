@@ -0,0 +1,349 @@
+import os
+import sys
+import json
+import mmap
+import struct
+import hashlib
+import argparse
+import tempfile
+from collections.abc import Mapping as MappingABC, Sequence as SequenceABC
+from typing import Dict, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+from QQDP_scoring import compute_quality
+from spatial_index import GridIndex
+
+# File layout (little-endian):
+#   MAGIC | uint64 header length | JSON header | arrays, each 64-byte aligned
+# The header lists categories as row ranges, the field schema and where
+# every array lives. Numeric fields are float64 columns; string fields are
+# a uint64 offsets array (rows + 1) into a UTF-8 blob.
+MAGIC = b"KSCAT\x00\x01\x00"
+FORMAT_VERSION = 1
+ALIGN = 64
+MAX_EXACT_INT = 2 ** 53
+
+_PREFIX = struct.Struct("<8sQ")
+
+
+def is_binary_catalog(path: str) -> bool:
+    try:
+        with open(path, "rb") as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+# -------------------------------------------------
+# COMPILER (JSON -> BINARY)
+# -------------------------------------------------
+def _field_kind(name: str, values: List) -> str:
+    present = [v for v in values if v is not None]
+    if all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in present):
+        if any(isinstance(v, int) and abs(v) > MAX_EXACT_INT for v in present):
+            raise ValueError(f"field {name!r}: integer too large for float64")
+        return "f8"
+    if all(isinstance(v, str) for v in present):
+        return "str"
+    raise ValueError(f"field {name!r}: values must be all numbers or all strings")
+
+
+def compile_catalog(data: Mapping[str, Sequence[Mapping]], out_path: str, source_digest: str = ""):
+    """
+    Write `data` ({category: [item, ...]}) as a binary columnar catalog.
+
+    The file is written next to out_path and renamed over it, so workers
+    that still map the previous version keep reading consistent pages.
+    """
+    import numpy as np
+
+    categories = []
+    rows: List[Mapping] = []
+    for category, items in data.items():
+        categories.append([category, len(rows), len(rows) + len(items)])
+        rows.extend(items)
+
+    names: List[str] = []
+    for item in rows:
+        for name in item:
+            if name not in names:
+                names.append(name)
+
+    arrays: List[Tuple[str, bytes]] = []
+    fields = []
+    for name in names:
+        values = [item.get(name) for item in rows]
+        kind = _field_kind(name, values)
+        field = {"name": name, "kind": kind, "int": False, "present": False}
+
+        if any(v is None for v in values):
+            field["present"] = True
+            arrays.append((f"{name}:present", np.array([v is not None for v in values], dtype=np.uint8).tobytes()))
+
+        if kind == "f8":
+            arrays.append((name, np.array([float("nan") if v is None else v for v in values], dtype="<f8").tobytes()))
+            if any(isinstance(v, int) for v in values):
+                field["int"] = True
+                arrays.append((f"{name}:int", np.array([isinstance(v, int) for v in values], dtype=np.uint8).tobytes()))
+        else:
+            encoded = [(v or "").encode("utf-8") for v in values]
+            offsets = np.zeros(len(rows) + 1, dtype="<u8")
+            np.cumsum([len(b) for b in encoded], out=offsets[1:])
+            arrays.append((f"{name}:offsets", offsets.tobytes()))
+            arrays.append((f"{name}:data", b"".join(encoded)))
+        fields.append(field)
+
+    # Item quality never changes per request; store it for the NumPy engine.
+    quality = [
+        compute_quality(item) if all(k in item for k in ("review_count", "avg_rating", "product_quality", "reliability"))
+        else float("nan")
+        for item in rows
+    ]
+    arrays.append(("quality", np.array(quality, dtype="<f8").tobytes()))
+
+    header = {
+        "version": FORMAT_VERSION,
+        "byteorder": "little",
+        "source_digest": source_digest,
+        "rows": len(rows),
+        "categories": categories,
+        "fields": fields,
+        "arrays": {},
+    }
+    # Offsets depend on the header size, which depends on the offsets:
+    # reserve room by sizing the header with placeholder offsets first.
+    for name, blob in arrays:
+        header["arrays"][name] = [0, len(blob)]
+    reserve = len(json.dumps(header).encode("utf-8")) + 32 * len(arrays) + 64
+
+    position = _align(_PREFIX.size + reserve)
+    for name, blob in arrays:
+        header["arrays"][name] = [position, len(blob)]
+        position = _align(position + len(blob))
+    header_bytes = json.dumps(header).encode("utf-8").ljust(reserve)
+
+    directory = os.path.dirname(os.path.abspath(out_path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".kscat-", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(_PREFIX.pack(MAGIC, len(header_bytes)))
+            f.write(header_bytes)
+            for name, blob in arrays:
+                f.seek(header["arrays"][name][0])
+                f.write(blob)
+            f.truncate(position)
+        os.replace(tmp_path, out_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return header
+
+
+def _align(offset: int) -> int:
+    return (offset + ALIGN - 1) // ALIGN * ALIGN
+
+
+def compile_json_file(json_path: str, out_path: str) -> Dict:
+    with open(json_path, "rb") as f:
+        raw = f.read()
+    return compile_catalog(json.loads(raw), out_path, hashlib.sha256(raw).hexdigest())
+
+
+# -------------------------------------------------
+# MEMORY-MAPPED READER
+# -------------------------------------------------
+class BinaryCatalog:
+    """
+    A compiled catalog mapped read-only into memory.
+
+    Nothing is parsed up front: workers mapping the same file share its
+    pages through the OS page cache, and rows are decoded only when read.
+    Works without NumPy (memoryview columns); numpy_column() returns
+    zero-copy NumPy views when it is installed.
+    """
+
+    def __init__(self, path: str, source_path: Optional[str] = None):
+        """
+        ValueError if the file is truncated or corrupt, or, given the JSON
+        it was compiled from (source_path), if that file has changed since.
+        """
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self._mmap) < _PREFIX.size:
+            raise ValueError(f"{path}: not a compiled catalog")
+        magic, header_len = _PREFIX.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path}: not a compiled catalog")
+        if _PREFIX.size + header_len > len(self._mmap):
+            raise ValueError(f"{path}: truncated header")
+        header_bytes = self._mmap[_PREFIX.size:_PREFIX.size + header_len]
+        header = json.loads(header_bytes)
+        if header.get("version") != FORMAT_VERSION or header.get("byteorder") != sys.byteorder:
+            raise ValueError(f"{path}: unsupported catalog version or byte order")
+        for name, (offset, length) in header["arrays"].items():
+            if offset + length > len(self._mmap):
+                raise ValueError(f"{path}: truncated array {name!r}")
+
+        self.digest = hashlib.sha256(header_bytes).hexdigest()
+        self.source_digest = header.get("source_digest", "")
+        if source_path is not None:
+            with open(source_path, "rb") as f:
+                if hashlib.sha256(f.read()).hexdigest() != self.source_digest:
+                    raise ValueError(f"{path}: stale, {source_path} changed since it was compiled")
+        self.size = header["rows"]
+        self.categories: Dict[str, range] = {
+            name: range(start, stop) for name, start, stop in header["categories"]
+        }
+        self.fields = {field["name"]: field for field in header["fields"]}
+        self.field_names = tuple(self.fields)
+        self._arrays = header["arrays"]
+        self._buffer = memoryview(self._mmap)
+        self._views: Dict[str, memoryview] = {}
+
+    def _view(self, name: str, fmt: str) -> memoryview:
+        view = self._views.get(name)
+        if view is None:
+            offset, length = self._arrays[name]
+            view = self._buffer[offset:offset + length].cast(fmt)
+            self._views[name] = view
+        return view
+
+    def value(self, field: str, row: int):
+        """One cell, with the type it had in the JSON source (KeyError if absent)."""
+        spec = self.fields[field]
+        if spec["present"] and not self._view(f"{field}:present", "B")[row]:
+            raise KeyError(field)
+        if spec["kind"] == "str":
+            offsets = self._view(f"{field}:offsets", "Q")
+            return bytes(self._view(f"{field}:data", "B")[offsets[row]:offsets[row + 1]]).decode("utf-8")
+        value = self._view(field, "d")[row]
+        if spec["int"] and self._view(f"{field}:int", "B")[row]:
+            return int(value)
+        return value
+
+    def has(self, field: str, row: int) -> bool:
+        spec = self.fields.get(field)
+        if spec is None:
+            return False
+        return not spec["present"] or bool(self._view(f"{field}:present", "B")[row])
+
+    def float_column(self, field: str, rows: Sequence[int]) -> Sequence[float]:
+        """float64 column over rows: a memoryview slice for a contiguous range."""
+        view = self._view(field, "d")
+        if isinstance(rows, range) and rows.step == 1:
+            return view[rows.start:rows.stop]
+        return [view[row] for row in rows]
+
+    def items(self, category: str) -> "ItemSequence":
+        return ItemSequence(self, self.categories.get(category, range(0)))
+
+    def numpy_column(self, name: str, rows: Optional[Sequence[int]] = None):
+        """float64 column as a NumPy view of the mapping (a copy for scattered rows)."""
+        import numpy as np
+
+        offset, length = self._arrays[name]
+        column = np.frombuffer(self._mmap, dtype="<f8", count=length // 8, offset=offset)
+        if rows is None:
+            return column
+        if isinstance(rows, range) and rows.step == 1:
+            return column[rows.start:rows.stop]
+        return column[np.asarray(rows, dtype=np.intp)]
+
+    def label_column(self, field: str, rows: Sequence[int]) -> "LabelColumn":
+        return LabelColumn(self, field, rows)
+
+
+class ItemView(MappingABC):
+    """Read-only mapping over one row; behaves like the original JSON item."""
+
+    __slots__ = ("_catalog", "_row")
+
+    def __init__(self, catalog: BinaryCatalog, row: int):
+        self._catalog = catalog
+        self._row = row
+
+    def __getitem__(self, key):
+        if key not in self._catalog.fields:
+            raise KeyError(key)
+        return self._catalog.value(key, self._row)
+
+    def __iter__(self) -> Iterator[str]:
+        return (name for name in self._catalog.field_names if self._catalog.has(name, self._row))
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+
+class ItemSequence(SequenceABC):
+    """Rows of a BinaryCatalog as a sequence of ItemView, in catalog order."""
+
+    __slots__ = ("catalog", "rows")
+
+    def __init__(self, catalog: BinaryCatalog, rows: Sequence[int]):
+        self.catalog = catalog
+        self.rows = rows
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return ItemSequence(self.catalog, self.rows[index])
+        return ItemView(self.catalog, self.rows[index])
+
+    def grid_index(self) -> GridIndex:
+        return GridIndex.from_coords(
+            self.catalog.float_column("seller_lat", self.rows),
+            self.catalog.float_column("seller_lon", self.rows),
+        )
+
+    def subset(self, positions: Sequence[int]) -> "ItemSequence":
+        return ItemSequence(self.catalog, [self.rows[pos] for pos in positions])
+
+
+class LabelColumn(SequenceABC):
+    """One field over a set of rows, decoded on access (for ColumnarCatalog labels)."""
+
+    __slots__ = ("catalog", "field", "rows")
+
+    def __init__(self, catalog: BinaryCatalog, field: str, rows: Sequence[int]):
+        self.catalog = catalog
+        self.field = field
+        self.rows = rows
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return LabelColumn(self.catalog, self.field, self.rows[index])
+        return self.catalog.value(self.field, self.rows[index])
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compile or inspect a binary columnar catalog.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="compile a JSON catalog")
+    build.add_argument("source", help="list_material.json")
+    build.add_argument("output", help="e.g. list_material.kscat")
+    info = sub.add_parser("info", help="print a compiled catalog's header")
+    info.add_argument("path")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        header = compile_json_file(args.source, args.output)
+        print(f"Compiled {header['rows']} items in {len(header['categories'])} categories into {args.output}")
+    else:
+        catalog = BinaryCatalog(args.path)
+        print(json.dumps({
+            "rows": catalog.size,
+            "categories": {name: len(rows) for name, rows in catalog.categories.items()},
+            "fields": list(catalog.fields.values()),
+            "source_digest": catalog.source_digest,
+        }, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,454 @@
+"""
+Streaming ingestion of seller listings from CSV or JSONL (optionally .gz).
+
+    python -m catalog_ingest district.csv sellers.jsonl -o ingested/ --base list_material.json
+
+Rows are checked against the fields qqdp_score needs (the same rules as
+catalog updates) and staged in SQLite keyed by item_id, so memory stays
+flat however large the input. A later row with an item_id already seen
+replaces the earlier listing and keeps its position. The output directory
+gets:
+
+    catalog.json                   list_material.json format: CATALOG_PATH, or
+                                   python -m catalog_binary build
+    <category>/part-NNNNN.jsonl    --shard-size listings each, in catalog order
+    listings.sqlite3               index: item_id -> category/shard/line, and a
+                                   per-category seller grid (CELL_DEG cells)
+    rejects.jsonl                  invalid rows with source, line and reason
+    manifest.json                  counts, shard digests and throughput
+
+--changelog also logs the ingested listings as upserts to a running app's
+CATALOG_CHANGELOG_PATH, so workers pick them up without a restart. --base
+is loaded whole (it is the catalog the app already holds in memory).
+"""
+import os
+import io
+import re
+import csv
+import sys
+import gzip
+import json
+import math
+import time
+import sqlite3
+import hashlib
+import argparse
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from catalog_updates import NUMBER_FIELDS, ChangeLog, validate_change, validate_item
+from product_flow import PRODUCT_FLOW
+
+# Same cells as spatial_index.GridIndex.
+CELL_DEG = 0.25
+BATCH_ROWS = 5000
+INT_RE = re.compile(r"[+-]?\d+")
+
+
+# -------------------------------------------------
+# READERS
+# -------------------------------------------------
+def _open_text(path: str) -> io.TextIOBase:
+    if path == "-":
+        return io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8-sig", newline="")
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8-sig", newline="")
+    return open(path, "r", encoding="utf-8-sig", newline="")
+
+
+def input_format(path: str, forced: Optional[str] = None) -> str:
+    if forced:
+        return forced
+    name = path[:-3] if path.endswith(".gz") else path
+    if name.endswith(".csv"):
+        return "csv"
+    if name.endswith((".jsonl", ".ndjson")):
+        return "jsonl"
+    raise ValueError(f"{path}: cannot tell CSV from JSONL, pass --format")
+
+
+def _csv_number(field: str, value: str):
+    if INT_RE.fullmatch(value):
+        return int(value)
+    try:
+        number = float(value)
+    except ValueError:
+        raise ValueError(f"item.{field} must be a number") from None
+    if not math.isfinite(number):
+        raise ValueError(f"item.{field} must be a number")
+    return number
+
+
+def csv_item(row: Dict[Optional[str], str]) -> Dict:
+    """CSV cells -> listing: number fields parsed, empty cells dropped."""
+    item = {}
+    for field, value in row.items():
+        if field is None:
+            raise ValueError("more cells than header columns")
+        value = (value or "").strip()
+        if value:
+            item[field] = _csv_number(field, value) if field in NUMBER_FIELDS else value
+    return item
+
+
+def read_rows(path: str, fmt: str) -> Iterator[Tuple[int, object]]:
+    """(line, raw row) pairs; raw is a CSV dict or a JSONL line, parsed later."""
+    with _open_text(path) as f:
+        if fmt == "csv":
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, row
+        else:
+            for line, text in enumerate(f, 1):
+                if text.strip():
+                    yield line, text
+
+
+def parse_row(fmt: str, raw) -> Dict:
+    if fmt == "csv":
+        return csv_item(raw)
+    try:
+        item = json.loads(raw)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"invalid JSON: {e.msg}") from None
+    return item
+
+
+def category_key(item: Dict, known: Set[str], forced: Optional[str] = None) -> str:
+    """Catalog category of a listing: --category, else its "category" label ("seed" -> "seeds")."""
+    if forced:
+        return forced
+    label = item["category"]
+    for key in (label, f"{label}s"):
+        if key in known:
+            return key
+    raise ValueError(f"unknown category {label!r}")
+
+
+# -------------------------------------------------
+# PROGRESS
+# -------------------------------------------------
+class Progress:
+    """Rows/s to stderr at most every `every` seconds (0 disables)."""
+
+    def __init__(self, every: float = 2.0, stream=sys.stderr):
+        self.every = every
+        self.stream = stream
+        self.started = time.perf_counter()
+        self._next = self.started + every
+
+    def rate(self, rows: int) -> float:
+        elapsed = time.perf_counter() - self.started
+        return rows / elapsed if elapsed > 0 else 0.0
+
+    def update(self, stage: str, rows: int, rejected: int = 0, force: bool = False):
+        now = time.perf_counter()
+        if not self.every or (now < self._next and not force):
+            return
+        self._next = now + self.every
+        print(
+            f"{stage}: {rows} rows, {self.rate(rows):.0f} rows/s, {rejected} rejected",
+            file=self.stream, flush=True,
+        )
+
+
+# -------------------------------------------------
+# STAGING (SQLITE, DEDUPE BY ITEM_ID)
+# -------------------------------------------------
+class Staging:
+    """
+    Listings keyed by item_id on disk. seq is the first-seen position;
+    replacing a listing keeps it. origin is 0 for --base rows, 1 for input.
+    """
+
+    def __init__(self, path: str):
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+        self.path = path
+        self.conn = sqlite3.connect(path, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=OFF")
+        self.conn.execute("PRAGMA cache_size=-16000")
+        self.conn.execute(
+            "CREATE TABLE listings ("
+            " item_id TEXT PRIMARY KEY,"
+            " category TEXT NOT NULL,"
+            " seq INTEGER NOT NULL,"
+            " origin INTEGER NOT NULL,"
+            " cell_row INTEGER NOT NULL,"
+            " cell_col INTEGER NOT NULL,"
+            " shard INTEGER,"
+            " line INTEGER,"
+            " item TEXT NOT NULL)"
+        )
+        self.seq = 0
+        self._batch: List[Tuple] = []
+
+    def add(self, category: str, item: Dict, origin: int):
+        self.seq += 1
+        self._batch.append((
+            item["item_id"], category, self.seq, origin,
+            math.floor(item["seller_lat"] / CELL_DEG), math.floor(item["seller_lon"] / CELL_DEG),
+            json.dumps(item, ensure_ascii=False),
+        ))
+        if len(self._batch) >= BATCH_ROWS:
+            self.flush()
+
+    def flush(self):
+        if not self._batch:
+            return
+        self.conn.execute("BEGIN")
+        self.conn.executemany(
+            "INSERT INTO listings (item_id, category, seq, origin, cell_row, cell_col, item)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)"
+            " ON CONFLICT(item_id) DO UPDATE SET"
+            " category = excluded.category, origin = excluded.origin,"
+            " cell_row = excluded.cell_row, cell_col = excluded.cell_col, item = excluded.item",
+            self._batch,
+        )
+        self.conn.execute("COMMIT")
+        self._batch = []
+
+    def finish(self) -> int:
+        """Flush, build the indexes and return the number of distinct listings."""
+        self.flush()
+        self.conn.execute("CREATE INDEX listings_order ON listings (category, seq)")
+        self.conn.execute("CREATE INDEX listings_cells ON listings (category, cell_row, cell_col)")
+        return self.conn.execute("SELECT COUNT(*) FROM listings").fetchone()[0]
+
+    def categories(self) -> List[str]:
+        rows = self.conn.execute("SELECT category FROM listings GROUP BY category ORDER BY MIN(seq)")
+        return [row[0] for row in rows]
+
+    def items(self, category: str, origin: Optional[int] = None) -> Iterator[Tuple[str, str]]:
+        """(item_id, item JSON) of a category in catalog order, streamed."""
+        sql = "SELECT item_id, item FROM listings WHERE category = ?"
+        params: list = [category]
+        if origin is not None:
+            sql += " AND origin = ?"
+            params.append(origin)
+        # A separate connection, so shard positions can be written meanwhile.
+        reader = sqlite3.connect(self.path)
+        try:
+            cursor = reader.execute(sql + " ORDER BY seq", params)
+            while True:
+                rows = cursor.fetchmany(BATCH_ROWS)
+                if not rows:
+                    return
+                yield from rows
+        finally:
+            reader.close()
+
+    def set_positions(self, positions: List[Tuple[int, int, str]]):
+        self.conn.execute("BEGIN")
+        self.conn.executemany("UPDATE listings SET shard = ?, line = ? WHERE item_id = ?", positions)
+        self.conn.execute("COMMIT")
+
+    def close(self):
+        self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        self.conn.close()
+
+
+# -------------------------------------------------
+# INGEST
+# -------------------------------------------------
+def stage_inputs(
+    staging: Staging,
+    inputs: List[str],
+    rejects,
+    base: Optional[str] = None,
+    fmt: Optional[str] = None,
+    category: Optional[str] = None,
+    progress: Optional[Progress] = None
+) -> Dict:
+    """Validate and stage --base (origin 0) then every input (origin 1)."""
+    known = set(PRODUCT_FLOW)
+    sources = []
+    rows = rejected = 0
+
+    def reject(source: str, line: int, error: str, raw):
+        nonlocal rejected
+        rejected += 1
+        rejects.write(json.dumps({"source": source, "line": line, "error": error, "row": raw}, ensure_ascii=False) + "\n")
+
+    if base:
+        with open(base, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        known |= set(data)
+        counts = {"path": base, "rows": 0, "rejected": 0}
+        for key, items in data.items():
+            for n, item in enumerate(items):
+                try:
+                    staging.add(key, validate_item(item), origin=0)
+                    counts["rows"] += 1
+                except ValueError as e:
+                    counts["rejected"] += 1
+                    reject(base, n, f"{key}[{n}]: {e}", item)
+        rows += counts["rows"]
+        sources.append(counts)
+        del data
+
+    for path in inputs:
+        path_fmt = input_format(path, fmt)
+        counts = {"path": path, "rows": 0, "rejected": 0}
+        for line, raw in read_rows(path, path_fmt):
+            try:
+                item = validate_item(parse_row(path_fmt, raw))
+                staging.add(category_key(item, known, category), item, origin=1)
+                counts["rows"] += 1
+                rows += 1
+            except ValueError as e:
+                counts["rejected"] += 1
+                reject(path, line, str(e), raw if path_fmt == "csv" else raw.rstrip("\n"))
+            if progress:
+                progress.update("staged", rows, rejected)
+        sources.append(counts)
+    return {"sources": sources, "rows": rows, "rejected": rejected}
+
+
+def write_outputs(staging: Staging, out_dir: str, shard_size: int, progress: Optional[Progress] = None) -> Dict:
+    """Stream the staged listings into catalog.json and per-category shards."""
+    categories = {}
+    written = 0
+    catalog_path = os.path.join(out_dir, "catalog.json")
+    with open(catalog_path + ".tmp", "w", encoding="utf-8") as catalog:
+        catalog.write("{")
+        for n_category, category in enumerate(staging.categories()):
+            catalog.write(("," if n_category else "") + f"\n{json.dumps(category)}: [")
+            shard_dir = os.path.join(out_dir, category)
+            os.makedirs(shard_dir, exist_ok=True)
+            shards: List[Dict] = []
+            shard = digest = None
+            positions: List[Tuple[int, int, str]] = []
+            count = 0
+
+            for item_id, item_json in staging.items(category):
+                shard_no, line = divmod(count, shard_size)
+                if line == 0:
+                    if shard:
+                        shard.close()
+                        shards[-1]["sha256"] = digest.hexdigest()
+                    name = f"part-{shard_no:05d}.jsonl"
+                    shard = open(os.path.join(shard_dir, name), "w", encoding="utf-8")
+                    digest = hashlib.sha256()
+                    shards.append({"path": f"{category}/{name}", "rows": 0})
+                data = item_json + "\n"
+                shard.write(data)
+                digest.update(data.encode("utf-8"))
+                shards[-1]["rows"] += 1
+                catalog.write(("," if count else "") + "\n  " + item_json)
+                positions.append((shard_no, line, item_id))
+                if len(positions) >= BATCH_ROWS:
+                    staging.set_positions(positions)
+                    positions = []
+                count += 1
+                written += 1
+                if progress:
+                    progress.update("written", written)
+
+            if shard:
+                shard.close()
+                shards[-1]["sha256"] = digest.hexdigest()
+            staging.set_positions(positions)
+            catalog.write("\n]")
+            categories[category] = {"rows": count, "shards": shards}
+        catalog.write("\n}\n")
+    os.replace(catalog_path + ".tmp", catalog_path)
+    return categories
+
+
+def log_upserts(staging: Staging, changelog: ChangeLog, categories: List[str]) -> int:
+    """Append the input listings (not --base) to a ChangeLog as upserts, in batches."""
+    logged = 0
+    batch: List[Dict] = []
+    for category in categories:
+        for _, item_json in staging.items(category, origin=1):
+            batch.append(validate_change({"op": "upsert", "category": category, "item": json.loads(item_json)}))
+            if len(batch) >= BATCH_ROWS:
+                changelog.append(batch)
+                logged += len(batch)
+                batch = []
+    if batch:
+        changelog.append(batch)
+        logged += len(batch)
+    return logged
+
+
+def ingest(
+    inputs: List[str],
+    out_dir: str,
+    base: Optional[str] = None,
+    fmt: Optional[str] = None,
+    category: Optional[str] = None,
+    shard_size: int = 50000,
+    changelog: Optional[str] = None,
+    progress_every: float = 2.0
+) -> Dict:
+    """Run the whole pipeline; returns the manifest (also written to out_dir)."""
+    os.makedirs(out_dir, exist_ok=True)
+    progress = Progress(progress_every)
+    staging = Staging(os.path.join(out_dir, "listings.sqlite3"))
+    try:
+        with open(os.path.join(out_dir, "rejects.jsonl"), "w", encoding="utf-8") as rejects:
+            staged = stage_inputs(staging, inputs, rejects, base, fmt, category, progress)
+        listings = staging.finish()
+        progress.update("staged", staged["rows"], staged["rejected"], force=True)
+        categories = write_outputs(staging, out_dir, shard_size, progress)
+        logged = log_upserts(staging, ChangeLog(changelog), list(categories)) if changelog else 0
+    finally:
+        staging.close()
+
+    seconds = time.perf_counter() - progress.started
+    manifest = {
+        "version": 1,
+        "created_at": time.time(),
+        "sources": staged["sources"],
+        "rows": staged["rows"],
+        "rejected": staged["rejected"],
+        "listings": listings,
+        "duplicates": staged["rows"] - listings,
+        "changes_logged": logged,
+        "cell_deg": CELL_DEG,
+        "shard_size": shard_size,
+        "categories": categories,
+        "seconds": seconds,
+        "rows_per_s": staged["rows"] / seconds if seconds > 0 else 0.0,
+    }
+    with open(os.path.join(out_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+        f.write("\n")
+    return manifest
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inputs", nargs="+", help="CSV / JSONL files (.gz ok), - for stdin")
+    parser.add_argument("-o", "--output", required=True, help="output directory")
+    parser.add_argument("--base", help="existing list_material.json to merge into")
+    parser.add_argument("--format", choices=("csv", "jsonl"), help="input format (default: from file name)")
+    parser.add_argument("--category", help="catalog category for every row (default: from each row's label)")
+    parser.add_argument("--shard-size", type=int, default=50000, help="listings per shard file")
+    parser.add_argument("--changelog", help="also log the listings as upserts to this CATALOG_CHANGELOG_PATH")
+    parser.add_argument("--progress-every", type=float, default=2.0, help="seconds between progress lines (0: off)")
+    args = parser.parse_args(argv)
+    if args.shard_size < 1:
+        parser.error("--shard-size must be positive")
+
+    try:
+        manifest = ingest(
+            args.inputs, args.output, base=args.base, fmt=args.format, category=args.category,
+            shard_size=args.shard_size, changelog=args.changelog, progress_every=args.progress_every,
+        )
+    except (OSError, ValueError) as e:
+        print(f"catalog_ingest: {e}", file=sys.stderr)
+        return 2
+    print(
+        f"Ingested {manifest['listings']} listings ({manifest['duplicates']} duplicates, "
+        f"{manifest['rejected']} rejected) in {manifest['seconds']:.1f} s "
+        f"({manifest['rows_per_s']:.0f} rows/s) into {args.output}"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
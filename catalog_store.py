@@ -0,0 +1,251 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from types import MappingProxyType
+from typing import Dict, FrozenSet, Mapping, Optional, Sequence, Tuple
+
+from catalog_binary import BinaryCatalog, ItemSequence, is_binary_catalog
+from product_search import ProductIndex, mentions_agri_term
+from spatial_index import GridIndex
+
+logger = logging.getLogger(__name__)
+
+# (category, None) for a whole category, else (category, canonical query).
+SelectionKey = Tuple[str, Optional[Tuple[FrozenSet[str], ...]]]
+
+# -------------------------------------------------
+# CATALOG SNAPSHOT (IMMUTABLE)
+# -------------------------------------------------
+class CatalogSnapshot:
+    """
+    One parsed version of the catalog.
+
+    Items are exposed as read-only mappings inside tuples, so a request
+    can rank them without ever mutating state shared with other requests.
+    A seller GridIndex and a product search index are built per category
+    at load time; product selections (and their indexes or NumPy columns)
+    are built on first use and memoised.
+
+    With a compiled catalog (`binary`), items are views into the shared
+    memory map and every index is built on first use, so boot parses nothing.
+    """
+
+    # Free-text queries are user input: bound how many selections are kept.
+    MAX_SELECTIONS = 1024
+
+    # catalog_updates.LiveCatalog changes in place; snapshots never do.
+    live = False
+
+    def __init__(
+        self,
+        data: Optional[Dict],
+        digest: str,
+        mtime: float,
+        version: int,
+        binary: Optional[BinaryCatalog] = None
+    ):
+        self.digest = digest
+        self.mtime = mtime
+        self.version = version
+        self.binary = binary
+        self._columns: Dict[SelectionKey, object] = {}
+
+        if binary is not None:
+            self.categories: Dict[str, Sequence[Mapping]] = {
+                category: binary.items(category) for category in binary.categories
+            }
+            self._selections: Dict[SelectionKey, Tuple] = {}
+            self._search: Dict[str, ProductIndex] = {}
+            return
+
+        self.categories = {
+            category: tuple(MappingProxyType(dict(item)) for item in items)
+            for category, items in data.items()
+        }
+        self._selections = {
+            (category, None): (items, GridIndex(items))
+            for category, items in self.categories.items()
+        }
+        self._search = {
+            category: ProductIndex(items) for category, items in self.categories.items()
+        }
+
+    def get(self, category: str) -> Sequence[Mapping]:
+        return self.categories.get(category, ())
+
+    def count(self, category: str, query: Optional[str] = None) -> int:
+        """Number of items select(category, query) returns."""
+        return len(self.select(category, query)[0]) if category in self.categories else 0
+
+    def search_index(self, category: str) -> ProductIndex:
+        index = self._search.get(category)
+        if index is None:
+            index = ProductIndex(self.get(category))
+            self._search[category] = index
+        return index
+
+    def search(self, category: str, query: str) -> Sequence[Mapping]:
+        """Items of `category` matching a free-text product query."""
+        return self.select(category, query)[0]
+
+    def mentions_product(self, text: str) -> bool:
+        """True if text contains agri vocabulary or any catalog product term."""
+        return mentions_agri_term(text, tuple(self.search_index(c) for c in self.categories))
+
+    def selection_key(self, category: str, query: Optional[str]) -> SelectionKey:
+        if query is None:
+            return (category, None)
+        return (category, self.search_index(category).query_key(query))
+
+    def select(
+        self, category: str, query: Optional[str] = None
+    ) -> Tuple[Sequence[Mapping], GridIndex]:
+        """Items of `category` matching product `query` (all if None), plus their GridIndex."""
+        key = self.selection_key(category, query)
+        selection = self._selections.get(key)
+        if selection is None:
+            category_items = self.get(category)
+            if query is None:
+                items = category_items
+            else:
+                positions = self.search_index(category).search_key(key[1])
+                if isinstance(category_items, ItemSequence):
+                    items = category_items.subset(positions)
+                else:
+                    items = tuple(category_items[pos] for pos in positions)
+            index = items.grid_index() if isinstance(items, ItemSequence) else GridIndex(items)
+            selection = (items, index)
+            # Idempotent: a concurrent duplicate build just overwrites itself.
+            if len(self._selections) < self.MAX_SELECTIONS:
+                self._selections[key] = selection
+        return selection
+
+    def columns(self, category: str, query: Optional[str] = None):
+        """ColumnarCatalog (NumPy engine) for the same selection as select()."""
+        key = self.selection_key(category, query)
+        columnar = self._columns.get(key)
+        if columnar is None:
+            # Imported lazily so the pure-Python engine never needs NumPy.
+            from QQDP_numpy import ColumnarCatalog
+
+            items = self.select(category, query)[0]
+            if isinstance(items, ItemSequence):
+                columnar = ColumnarCatalog.from_binary(items.catalog, items.rows)
+            else:
+                columnar = ColumnarCatalog.from_items(items)
+            if len(self._columns) < self.MAX_SELECTIONS:
+                self._columns[key] = columnar
+        return columnar
+
+
+# -------------------------------------------------
+# CATALOG STORE (PER WORKER, HOT RELOAD)
+# -------------------------------------------------
+class CatalogStore:
+    """
+    Loads the catalog once per worker and swaps in a new snapshot when the
+    file changes on disk.
+
+    The file is stat()ed on every snapshot() call; it is only re-read when
+    its mtime or size moved, and only re-parsed when the content hash differs.
+    A compiled catalog (catalog_binary) is memory-mapped instead of parsed;
+    its header hash stands in for the content hash.
+
+    A file that fails to load (half-written, bad JSON) is logged and the
+    previous snapshot kept; it is tried again once its mtime or size moves.
+    With source_path, the JSON a compiled catalog was built from, a compiled
+    file that no longer matches it counts as failing to load.
+    """
+
+    def __init__(self, path: str, source_path: Optional[str] = None):
+        self.path = path
+        self.source_path = source_path
+        self.reload_count = 0
+        self.last_load_seconds = 0.0
+        self.last_loaded_at: Optional[float] = None
+        self.reload_failures = 0
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._stat_key: Optional[Tuple] = None
+        self._failed_key: Optional[Tuple] = None
+        self._lock = threading.Lock()
+
+    def snapshot(self) -> CatalogSnapshot:
+        """Return the current snapshot, reloading first if the file changed."""
+        try:
+            st = os.stat(self.path)
+            stat_key = (st.st_mtime, st.st_size)
+            if self.source_path:
+                source = os.stat(self.source_path)
+                stat_key += (source.st_mtime, source.st_size)
+        except OSError:
+            if self._snapshot is None:
+                raise
+            logger.exception("Catalog stat failed, serving cached snapshot")
+            return self._snapshot
+
+        if self._snapshot is not None and stat_key in (self._stat_key, self._failed_key):
+            return self._snapshot
+
+        with self._lock:
+            # Another thread may have reloaded while we waited for the lock.
+            if self._snapshot is None or stat_key not in (self._stat_key, self._failed_key):
+                try:
+                    self._reload(stat_key)
+                except Exception:
+                    if self._snapshot is None:
+                        raise
+                    self._failed_key = stat_key
+                    self.reload_failures += 1
+                    logger.exception(
+                        "Catalog reload failed, serving cached version %d", self._snapshot.version
+                    )
+        return self._snapshot
+
+    def _reload(self, stat_key: Tuple):
+        started = time.perf_counter()
+        binary = data = None
+        if is_binary_catalog(self.path):
+            binary = BinaryCatalog(self.path, self.source_path)
+            digest = binary.digest
+        else:
+            with open(self.path, "rb") as f:
+                raw = f.read()
+            digest = hashlib.sha256(raw).hexdigest()
+
+        if self._snapshot is not None and digest == self._snapshot.digest:
+            # Touched but unchanged: keep the parsed snapshot.
+            self._stat_key = stat_key
+            return
+
+        version = self._snapshot.version + 1 if self._snapshot else 1
+        if binary is None:
+            data = json.loads(raw)
+        snapshot = CatalogSnapshot(data, digest, stat_key[0], version, binary)
+
+        # Single reference assignment: readers see either the old or new snapshot.
+        self._snapshot = snapshot
+        self._stat_key = stat_key
+        self.reload_count += 1
+        self.last_load_seconds = time.perf_counter() - started
+        self.last_loaded_at = time.time()
+        logger.info(
+            "Catalog loaded (version %d, %.1f ms)",
+            version, self.last_load_seconds * 1000,
+        )
+
+    def stats(self) -> Dict:
+        snapshot = self._snapshot
+        return {
+            "path": self.path,
+            "format": ("binary" if snapshot.binary else "json") if snapshot else None,
+            "version": snapshot.version if snapshot else None,
+            "digest": snapshot.digest if snapshot else None,
+            "reload_count": self.reload_count,
+            "reload_failures": self.reload_failures,
+            "last_load_seconds": self.last_load_seconds,
+            "last_loaded_at": self.last_loaded_at,
+            "items": sum(len(v) for v in snapshot.categories.values()) if snapshot else 0,
+        }
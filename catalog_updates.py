@@ -0,0 +1,781 @@
+import json
+import math
+import time
+import heapq
+import bisect
+import sqlite3
+import logging
+import threading
+from types import MappingProxyType
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Set, Tuple
+
+from catalog_store import CatalogSnapshot, CatalogStore
+from product_search import ProductIndex, mentions_agri_term, tokenize
+from spatial_index import GridIndex
+from QQDP_scoring import MAX_DISTANCE_KM, compute_quality, haversine_km, score_from_components
+
+logger = logging.getLogger(__name__)
+
+TEXT_FIELDS = ("item_id", "category", "name", "seller_name")
+NUMBER_FIELDS = (
+    "product_quality", "reliability", "avg_rating", "review_count",
+    "available_qty", "required_qty", "seller_lat", "seller_lon", "price",
+)
+PATCH_FIELDS = ("price", "available_qty")
+# Fields the search and spatial indexes are built from.
+INDEXED_FIELDS = ("name", "seller_lat", "seller_lon")
+
+# Removed positions are rebuilt away once they outnumber live items.
+COMPACT_MIN_DEAD = 64
+
+
+# -------------------------------------------------
+# CHANGE VALIDATION
+# -------------------------------------------------
+def _number(value, field: str, low: float = -math.inf, high: float = math.inf) -> float:
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not low <= value <= high:
+        if high != math.inf:
+            raise ValueError(f"{field} must be a number between {low} and {high}")
+        if low != -math.inf:
+            raise ValueError(f"{field} must be a number >= {low}")
+        raise ValueError(f"{field} must be a number")
+    return value
+
+
+def validate_item(item) -> Dict:
+    if not isinstance(item, dict):
+        raise ValueError("item must be an object")
+    for field in TEXT_FIELDS:
+        if not isinstance(item.get(field), str) or not item[field]:
+            raise ValueError(f"item.{field} must be a non-empty string")
+    for field in NUMBER_FIELDS:
+        _number(item.get(field), f"item.{field}")
+    _number(item["seller_lat"], "item.seller_lat", -90, 90)
+    _number(item["seller_lon"], "item.seller_lon", -180, 180)
+    _number(item["price"], "item.price", 0)
+    _number(item["available_qty"], "item.available_qty", 0)
+    _number(item["review_count"], "item.review_count", 0)
+    if item["required_qty"] <= 0:
+        raise ValueError("item.required_qty must be positive")
+    return dict(item)
+
+
+def validate_change(change) -> Dict:
+    """
+    Normalised copy of one catalog change, or ValueError:
+
+        {"op": "upsert", "category": "seeds", "item": {...full listing...}}
+        {"op": "delete", "category": "seeds", "item_id": "SEED01"}
+        {"op": "patch",  "category": "seeds", "item_id": "SEED01", "price": 360, "available_qty": 420}
+    """
+    if not isinstance(change, dict):
+        raise ValueError("change must be an object")
+    op, category = change.get("op"), change.get("category")
+    if op not in ("upsert", "delete", "patch"):
+        raise ValueError("op must be upsert, delete or patch")
+    if not isinstance(category, str) or not category:
+        raise ValueError("category must be a non-empty string")
+
+    if op == "upsert":
+        item = validate_item(change.get("item"))
+        return {"op": op, "category": category, "item_id": item["item_id"], "item": item}
+
+    item_id = change.get("item_id")
+    if not isinstance(item_id, str) or not item_id:
+        raise ValueError("item_id must be a non-empty string")
+    clean = {"op": op, "category": category, "item_id": item_id}
+    if op == "patch":
+        fields = [f for f in PATCH_FIELDS if f in change]
+        if not fields:
+            raise ValueError(f"patch needs one of {', '.join(PATCH_FIELDS)}")
+        for field in fields:
+            clean[field] = _number(change[field], field, 0)
+    return clean
+
+
+# -------------------------------------------------
+# CHANGE LOG (SQLITE, SHARED BY WORKERS)
+# -------------------------------------------------
+class ChangeLog:
+    """
+    Append-only, numbered catalog changes in SQLite.
+
+    Every worker applies the log in seq order on top of the catalog file,
+    so all workers converge on the same catalog without rewriting the file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS catalog_changes ("
+            " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " at REAL NOT NULL,"
+            " change TEXT NOT NULL)"
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def append(self, changes: Sequence[Mapping]) -> int:
+        """Log validated changes in one transaction; returns the last seq."""
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            seq = 0
+            for change in changes:
+                seq = conn.execute(
+                    "INSERT INTO catalog_changes (at, change) VALUES (?, ?)",
+                    (now, json.dumps(change)),
+                ).lastrowid
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return seq
+
+    def since(self, seq: int, limit: Optional[int] = None) -> List[Dict]:
+        """Changes after seq, oldest first, each with its "seq" and "at"."""
+        rows = self._conn().execute(
+            "SELECT seq, at, change FROM catalog_changes WHERE seq > ? ORDER BY seq LIMIT ?",
+            (seq, -1 if limit is None else limit),
+        ).fetchall()
+        return [{**json.loads(change), "seq": row_seq, "at": at} for row_seq, at, change in rows]
+
+    def last_seq(self) -> int:
+        row = self._conn().execute("SELECT MAX(seq) FROM catalog_changes").fetchone()
+        return row[0] or 0
+
+
+# -------------------------------------------------
+# PRICE RANGE (LAZY-DELETION HEAPS)
+# -------------------------------------------------
+class PriceRange:
+    """
+    Min and max price over a changing set of positions.
+
+    A min-heap and a max-heap of (price, position) entries; an entry is
+    stale once current(position) no longer returns its price, and stale
+    tops are popped when bounds() is read. Changes cost O(log n) amortised:
+    the heaps are rebuilt from valid entries when stale ones dominate.
+    """
+
+    def __init__(self, current: Callable[[int], Optional[float]]):
+        self._current = current
+        self._low: List[Tuple[float, int]] = []
+        self._high: List[Tuple[float, int]] = []
+        self.size = 0
+        self._lock = threading.Lock()
+
+    def add(self, pos: int, price: float):
+        with self._lock:
+            self.size += 1
+            self._push(pos, price)
+
+    def update(self, pos: int, price: float):
+        with self._lock:
+            self._push(pos, price)
+
+    def discard(self, pos: int):
+        # The entries go stale by themselves once the position is removed.
+        with self._lock:
+            self.size -= 1
+
+    def _push(self, pos: int, price: float):
+        heapq.heappush(self._low, (price, pos))
+        heapq.heappush(self._high, (-price, pos))
+        if len(self._low) > 2 * self.size + 16:
+            valid = {(p, n) for p, n in self._low if self._current(n) == p}
+            self._low = list(valid)
+            self._high = [(-p, n) for p, n in valid]
+            heapq.heapify(self._low)
+            heapq.heapify(self._high)
+
+    def bounds(self) -> Optional[Tuple[float, float]]:
+        """(min, max) price, or None when empty."""
+        with self._lock:
+            low, high = self._low, self._high
+            while low and self._current(low[0][1]) != low[0][0]:
+                heapq.heappop(low)
+            while high and self._current(high[0][1]) != -high[0][0]:
+                heapq.heappop(high)
+            if not low:
+                return None
+            return low[0][0], -high[0][0]
+
+
+# -------------------------------------------------
+# LIVE CATEGORY (INCREMENTAL INDEXES)
+# -------------------------------------------------
+def _in_selection(key: Tuple, tokens) -> bool:
+    # Same rule as ProductIndex.search_key: every word group must match.
+    return bool(key) and all(tokens & terms for terms in key)
+
+
+def _same_place(old: Mapping, new: Mapping) -> bool:
+    return all(old[field] == new[field] for field in INDEXED_FIELDS)
+
+
+class LiveCategory:
+    """
+    One category of a LiveCatalog with its derived state kept up to date:
+    seller GridIndex, product search index, compute_quality per item and
+    price ranges for the whole category and for memoised product selections.
+
+    Positions only grow. A listing keeps its position until it is deleted,
+    also when an upsert changes its name or seller location (it is
+    re-indexed in place), just as catalog_ingest keeps a duplicate's first
+    position. Removed positions stay as None until the category is rebuilt.
+    """
+
+    def __init__(self, items: Iterable[Mapping]):
+        self.slots: List[Optional[Tuple[Mapping, float]]] = []
+        self.positions: Dict[str, int] = {}
+        self.dead = 0
+        self.grid = GridIndex([])
+        self.search = ProductIndex([])
+        self.prices = PriceRange(self.price_at)
+        self._selection_prices: Dict[Tuple, PriceRange] = {}
+        for item in items:
+            self.append(item)
+
+    def __len__(self) -> int:
+        return len(self.slots) - self.dead
+
+    def price_at(self, pos: int) -> Optional[float]:
+        slot = self.slots[pos]
+        return slot[0]["price"] if slot is not None else None
+
+    def live_positions(self, key: Optional[Tuple] = None) -> List[int]:
+        """Positions of live items, all or those of a product selection key."""
+        positions = range(len(self.slots)) if key is None else self.search.search_key(key)
+        return [pos for pos in positions if self.slots[pos] is not None]
+
+    def items(self, key: Optional[Tuple] = None) -> Tuple[Mapping, ...]:
+        return tuple(self.slots[pos][0] for pos in self.live_positions(key))
+
+    def selection(self, key: Optional[Tuple] = None) -> Tuple[Tuple[int, ...], Tuple[Mapping, ...]]:
+        """(positions, items) of live items, all or those of a selection key."""
+        positions = tuple(self.live_positions(key))
+        return positions, tuple(self.slots[pos][0] for pos in positions)
+
+    def selection_prices(self, key: Tuple) -> PriceRange:
+        """
+        PriceRange of a product selection: built once, then kept up to date
+        by every change (a change also pays one token check per memoised
+        selection). Call with the catalog's lock held.
+        """
+        prices = self._selection_prices.get(key)
+        if prices is None:
+            prices = PriceRange(self.price_at)
+            for pos in self.live_positions(key):
+                prices.add(pos, self.slots[pos][0]["price"])
+            if len(self._selection_prices) < CatalogSnapshot.MAX_SELECTIONS:
+                self._selection_prices[key] = prices
+        return prices
+
+    def _selections_of(self, item: Mapping) -> List[PriceRange]:
+        if not self._selection_prices:
+            return []
+        tokens = set(tokenize(item.get("name", "")))
+        return [p for key, p in self._selection_prices.items() if _in_selection(key, tokens)]
+
+    def append(self, item: Mapping):
+        item = MappingProxyType(dict(item))
+        pos = self.grid.add(item["seller_lat"], item["seller_lon"])
+        self.slots.append((item, compute_quality(item)))
+        self.positions[item["item_id"]] = pos
+        self.search.add(pos, item)
+        for prices in [self.prices, *self._selections_of(item)]:
+            prices.add(pos, item["price"])
+
+    def remove(self, item_id: str):
+        pos = self.positions.pop(item_id)
+        item = self.slots[pos][0]
+        self.slots[pos] = None
+        self.grid.remove(pos)
+        self.dead += 1
+        for prices in [self.prices, *self._selections_of(item)]:
+            prices.discard(pos)
+
+    def upsert(self, item: Mapping):
+        pos = self.positions.get(item["item_id"])
+        if pos is None:
+            self.append(item)
+            return
+        old = self.slots[pos][0]
+        item = MappingProxyType(dict(item))
+        if not _same_place(old, item):
+            self._reindex(pos, old, item)
+        self._replace(pos, item)
+
+    def patch(self, item_id: str, fields: Mapping):
+        pos = self.positions[item_id]
+        self._replace(pos, MappingProxyType({**self.slots[pos][0], **fields}))
+
+    def _reindex(self, pos: int, old: Mapping, item: Mapping):
+        if (old["seller_lat"], old["seller_lon"]) != (item["seller_lat"], item["seller_lon"]):
+            self.grid.move(pos, item["seller_lat"], item["seller_lon"])
+        if old["name"] != item["name"]:
+            self.search.rename(pos, old["name"], item["name"])
+            # Selections the listing joins or leaves get a fresh PriceRange on next use.
+            old_tokens, new_tokens = set(tokenize(old["name"])), set(tokenize(item["name"]))
+            for key in [
+                key for key in self._selection_prices
+                if _in_selection(key, old_tokens) != _in_selection(key, new_tokens)
+            ]:
+                del self._selection_prices[key]
+
+    def _replace(self, pos: int, item: Mapping):
+        self.slots[pos] = (item, compute_quality(item))
+        for prices in [self.prices, *self._selections_of(item)]:
+            prices.update(pos, item["price"])
+
+
+# -------------------------------------------------
+# READ/WRITE LOCK
+# -------------------------------------------------
+class _ReadWriteLock:
+    """Shared readers or one writer; a waiting writer holds off new readers."""
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writing = False
+        self._writers_waiting = 0
+
+    @contextmanager
+    def reading(self):
+        # Not reentrant: a writer waiting between two nested reads deadlocks.
+        with self._cond:
+            while self._writing or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def writing(self):
+        with self._cond:
+            self._writers_waiting += 1
+            while self._writing or self._readers:
+                self._cond.wait()
+            self._writers_waiting -= 1
+            self._writing = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writing = False
+                self._cond.notify_all()
+
+
+# -------------------------------------------------
+# LIVE CATALOG (SNAPSHOT UPDATED IN PLACE)
+# -------------------------------------------------
+class _Touched:
+    """What one batch did to a category, to carry its memoised selections over."""
+
+    def __init__(self):
+        # Positions whose listing changed in place (same name and location).
+        self.replaced: Set[int] = set()
+        # Name tokens of listings added, removed or re-indexed.
+        self.moved: List[Set[str]] = []
+        # New or compacted category: every position changed.
+        self.rebuilt = False
+
+    def rows(self, key: Optional[Tuple], positions: Sequence[int]) -> Optional[List[Tuple[int, int]]]:
+        """(row, position) pairs of a memoised selection to patch, or None if its members changed."""
+        if self.rebuilt or (self.moved and (key is None or any(_in_selection(key, t) for t in self.moved))):
+            return None
+        if len(self.replaced) >= len(positions):
+            return [(row, pos) for row, pos in enumerate(positions) if pos in self.replaced]
+        rows = []
+        for pos in sorted(self.replaced):
+            row = bisect.bisect_left(positions, pos)
+            if row < len(positions) and positions[row] == pos:
+                rows.append((row, pos))
+        return rows
+
+
+def _with_rows(values: Tuple, rows: Sequence[int], items: Sequence[Mapping]) -> Tuple:
+    values = list(values)
+    for row, item in zip(rows, items):
+        values[row] = item
+    return tuple(values)
+
+
+class LiveCatalog(CatalogSnapshot):
+    """
+    A CatalogSnapshot that applies seller changes in place.
+
+    A change costs O(log n) per category: the GridIndex and product index
+    are appended to, quality is computed for the changed listing only, and
+    price min/max come from heaps (PriceRange), also for each memoised
+    product selection. rank_topk() ranks straight from these structures.
+
+    A batch is applied under the write side of a lock whose read side
+    every reader holds, so readers see the catalog before or after a whole
+    batch, never part of one. Memoised item tuples, selections and NumPy
+    columns (get(), select(), columns()) are carried over to the next
+    version: listings changed in place are patched into copies, and only
+    selections that gained or lost listings are rebuilt on next use.
+    version changes with every applied batch; digest also changes once
+    any change was applied, so tiles built from the file are not used.
+    """
+
+    live = True
+
+    def __init__(self, base: CatalogSnapshot, version: int):
+        self.base_digest = base.digest
+        self.digest = base.digest
+        self.mtime = base.mtime
+        self.version = version
+        self.binary = None
+        self.seq = 0
+        self._categories = {
+            category: LiveCategory(items) for category, items in base.categories.items()
+        }
+        self._rw = _ReadWriteLock()
+        # Guards the selection PriceRanges that readers memoise.
+        self._lock = threading.Lock()
+        # Memos map a selection key to (positions, ...). Readers may fill the
+        # dict they grabbed after a batch replaced it; that entry is just lost.
+        self._items: Dict[Tuple, Tuple] = {}
+        self._selections: Dict[Tuple, Tuple] = {}
+        self._columns: Dict[Tuple, Tuple] = {}
+
+    @property
+    def categories(self) -> Dict[str, Sequence[Mapping]]:
+        with self._rw.reading():
+            return {category: self._get(category) for category in self._categories}
+
+    def size(self) -> int:
+        with self._rw.reading():
+            return sum(len(live) for live in self._categories.values())
+
+    def get(self, category: str) -> Sequence[Mapping]:
+        with self._rw.reading():
+            return self._get(category)
+
+    def _get(self, category: str) -> Sequence[Mapping]:
+        key = (category, None)
+        entry = self._items.get(key)
+        if entry is None:
+            live = self._categories.get(category)
+            entry = self._items[key] = live.selection() if live is not None else ((), ())
+        return entry[1]
+
+    def count(self, category: str, query: Optional[str] = None) -> int:
+        with self._rw.reading():
+            live = self._categories.get(category)
+            if live is None:
+                return 0
+            if query is None:
+                return len(live)
+            return len(live.live_positions(self._selection_key(category, query)[1]))
+
+    def search_index(self, category: str) -> ProductIndex:
+        live = self._categories.get(category)
+        return live.search if live is not None else ProductIndex(())
+
+    def mentions_product(self, text: str) -> bool:
+        with self._rw.reading():
+            return mentions_agri_term(text, tuple(live.search for live in self._categories.values()))
+
+    def selection_key(self, category: str, query: Optional[str]) -> Tuple:
+        with self._rw.reading():
+            return self._selection_key(category, query)
+
+    def _selection_key(self, category: str, query: Optional[str]) -> Tuple:
+        return CatalogSnapshot.selection_key(self, category, query)
+
+    def _selection(self, key: Tuple) -> Tuple:
+        """(positions, items, GridIndex) of a selection key, memoised."""
+        with self._rw.reading():
+            memo = self._selections
+            selection = memo.get(key)
+            if selection is not None:
+                return selection
+            live = self._categories.get(key[0])
+            positions, items = live.selection(key[1]) if live is not None else ((), ())
+        selection = (positions, items, GridIndex(items))
+        if len(memo) < self.MAX_SELECTIONS:
+            memo[key] = selection
+        return selection
+
+    def select(self, category: str, query: Optional[str] = None) -> Tuple[Sequence[Mapping], GridIndex]:
+        _, items, grid = self._selection(self.selection_key(category, query))
+        return items, grid
+
+    def columns(self, category: str, query: Optional[str] = None):
+        memo = self._columns
+        key = self.selection_key(category, query)
+        entry = memo.get(key)
+        if entry is None:
+            from QQDP_numpy import ColumnarCatalog
+
+            positions, items, _ = self._selection(key)
+            entry = (positions, ColumnarCatalog.from_items(items))
+            if len(memo) < self.MAX_SELECTIONS:
+                memo[key] = entry
+        return entry[1]
+
+    def rank_topk(
+        self,
+        category: str,
+        query: Optional[str],
+        preference: Dict[str, str],
+        farmer: Tuple[float, float],
+        k: int
+    ) -> List[Dict]:
+        """
+        rank_items_topk(*select(category, query), ...) without building the
+        selection: spatial query on the live GridIndex, cached quality and
+        the selection's PriceRange. Results are identical.
+        """
+        with self._rw.reading():
+            return self._rank_topk(category, query, preference, farmer, k)
+
+    def _rank_topk(
+        self,
+        category: str,
+        query: Optional[str],
+        preference: Dict[str, str],
+        farmer: Tuple[float, float],
+        k: int
+    ) -> List[Dict]:
+        live = self._categories.get(category)
+        if live is None or k <= 0:
+            return []
+        members = None
+        prices = live.prices
+        if query is not None:
+            key = self._selection_key(category, query)[1]
+            members = set(live.search.search_key(key))
+            with self._lock:
+                prices = live.selection_prices(key)
+        bounds = prices.bounds()
+        if bounds is None:
+            return []
+        price_min, price_max = bounds
+
+        scored = []
+        for pos in live.grid.query(farmer[0], farmer[1], MAX_DISTANCE_KM):
+            slot = live.slots[pos]
+            if slot is None or (members is not None and pos not in members):
+                continue
+            item, quality = slot
+            distance_km = haversine_km(farmer[0], farmer[1], item["seller_lat"], item["seller_lon"])
+            quantity = min(item["available_qty"] / item["required_qty"], 1)
+            price_score = 1 if price_max == price_min else (
+                (price_max - item["price"]) / (price_max - price_min)
+            )
+            result = score_from_components(item, distance_km, quality, quantity, price_score, preference)
+            if result:
+                scored.append(result)
+        return heapq.nlargest(k, scored, key=lambda x: x["final_score"])
+
+    def check(self, changes: Sequence[Mapping]):
+        """ValueError if a patch or delete names a listing that will not exist."""
+        exists: Dict[Tuple[str, str], bool] = {}
+        with self._rw.reading():
+            for n, change in enumerate(changes):
+                key = (change["category"], change["item_id"])
+                if change["op"] == "upsert":
+                    exists[key] = True
+                    continue
+                if key not in exists:
+                    live = self._categories.get(key[0])
+                    exists[key] = live is not None and key[1] in live.positions
+                if not exists[key]:
+                    raise ValueError(f"changes[{n}]: no item {key[1]!r} in {key[0]!r}")
+                if change["op"] == "delete":
+                    exists[key] = False
+
+    def apply(self, changes: Iterable[Mapping], version: int) -> Tuple[int, int]:
+        """Apply logged changes in seq order, as one batch; returns (applied, skipped)."""
+        applied = skipped = 0
+        touched: Dict[str, _Touched] = {}
+        with self._rw.writing():
+            for change in changes:
+                if self._apply_one(change, touched):
+                    applied += 1
+                else:
+                    skipped += 1
+                    logger.warning(
+                        "Catalog change %s skipped: no item %r in %r",
+                        change.get("seq"), change["item_id"], change["category"],
+                    )
+                self.seq = change.get("seq", self.seq)
+            self.version = version
+            self.digest = f"{self.base_digest}+{self.seq}" if self.seq else self.base_digest
+            self._items = self._carry(self._items, touched, lambda entry, rows, items: (
+                entry[0], _with_rows(entry[1], rows, items),
+            ))
+            self._selections = self._carry(self._selections, touched, lambda entry, rows, items: (
+                entry[0], _with_rows(entry[1], rows, items), entry[2],
+            ))
+            self._columns = self._carry(self._columns, touched, lambda entry, rows, items: (
+                entry[0], entry[1].replace_rows(rows, items),
+            ))
+        return applied, skipped
+
+    def _carry(self, memo: Dict, touched: Dict[str, _Touched], patch) -> Dict:
+        # The changed rows keep their places: same positions, same locations.
+        carried = {}
+        for key, entry in list(memo.items()):
+            effect = touched.get(key[0])
+            if effect is not None:
+                rows = effect.rows(key[1], entry[0])
+                if rows is None:
+                    continue
+                if rows:
+                    live = self._categories[key[0]]
+                    entry = patch(entry, [row for row, _ in rows], [live.slots[pos][0] for _, pos in rows])
+            carried[key] = entry
+        return carried
+
+    def _apply_one(self, change: Mapping, touched: Dict[str, _Touched]) -> bool:
+        category, op, item_id = change["category"], change["op"], change["item_id"]
+        live = self._categories.get(category)
+        if op != "upsert" and (live is None or item_id not in live.positions):
+            return False
+        effect = touched.setdefault(category, _Touched())
+        if live is None:
+            live = self._categories[category] = LiveCategory(())
+            effect.rebuilt = True
+
+        pos = live.positions.get(item_id)
+        old = live.slots[pos][0] if pos is not None else None
+        if op == "upsert":
+            live.upsert(change["item"])
+        elif op == "patch":
+            live.patch(item_id, {f: change[f] for f in PATCH_FIELDS if f in change})
+        else:
+            live.remove(item_id)
+        new_pos = live.positions.get(item_id)
+        new = live.slots[new_pos][0] if new_pos is not None else None
+        if old is not None and new is not None and _same_place(old, new):
+            effect.replaced.add(pos)
+        else:
+            effect.moved.extend(set(tokenize(item["name"])) for item in (old, new) if item is not None)
+
+        if live.dead > max(COMPACT_MIN_DEAD, len(live)):
+            # Amortised O(1) per removal.
+            self._categories[category] = LiveCategory(live.items())
+            effect.rebuilt = True
+        return True
+
+
+# -------------------------------------------------
+# LIVE CATALOG STORE
+# -------------------------------------------------
+class LiveCatalogStore(CatalogStore):
+    """
+    CatalogStore serving a LiveCatalog: the catalog file plus the ChangeLog.
+
+    apply() logs a batch and applies it in this worker at once; other
+    workers pick it up from the log within poll_seconds. When the file
+    changes on disk it is loaded as before and the whole log is replayed
+    on top of it.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        changelog: ChangeLog,
+        poll_seconds: float = 1.0,
+        source_path: Optional[str] = None
+    ):
+        super().__init__(path, source_path)
+        self.changelog = changelog
+        self.poll_seconds = poll_seconds
+        self.changes_applied = 0
+        self.changes_skipped = 0
+        self._live: Optional[LiveCatalog] = None
+        self._live_base: Optional[CatalogSnapshot] = None
+        self._live_versions = 0
+        self._next_poll = 0.0
+        self._live_lock = threading.Lock()
+
+    def snapshot(self) -> LiveCatalog:
+        base = super().snapshot()
+        live = self._live
+        if live is not None and self._live_base is base and time.monotonic() < self._next_poll:
+            return live
+        with self._live_lock:
+            if self._live is None or self._live_base is not base:
+                self._rebuild(base)
+            else:
+                self._catch_up()
+            return self._live
+
+    def _rebuild(self, base: CatalogSnapshot):
+        started = time.perf_counter()
+        self._live_versions += 1
+        self._live = LiveCatalog(base, self._live_versions)
+        self._live_base = base
+        self._catch_up()
+        logger.info(
+            "Live catalog built (seq %d, %.1f ms)",
+            self._live.seq, (time.perf_counter() - started) * 1000,
+        )
+
+    def _catch_up(self):
+        changes = self.changelog.since(self._live.seq)
+        if changes:
+            self._live_versions += 1
+            applied, skipped = self._live.apply(changes, self._live_versions)
+            self.changes_applied += applied
+            self.changes_skipped += skipped
+        self._next_poll = time.monotonic() + self.poll_seconds
+
+    def apply(self, changes: Sequence) -> Dict:
+        """
+        Validate, log and apply a batch of changes, all or none.
+        Raises ValueError naming the first bad change.
+        """
+        valid = []
+        for n, change in enumerate(changes):
+            try:
+                valid.append(validate_change(change))
+            except ValueError as e:
+                raise ValueError(f"changes[{n}]: {e}") from None
+
+        self.snapshot()
+        with self._live_lock:
+            # Up to date with other workers, so existence checks see their changes.
+            self._catch_up()
+            self._live.check(valid)
+            seq = self.changelog.append(valid)
+            self._catch_up()
+            return {"seq": seq, "version": self._live.version}
+
+    def stats(self) -> Dict:
+        stats = super().stats()
+        live = self._live
+        if live is not None:
+            stats.update({
+                "version": live.version,
+                "digest": live.digest,
+                "items": live.size(),
+                "seq": live.seq,
+            })
+        stats["changes_applied"] = self.changes_applied
+        stats["changes_skipped"] = self.changes_skipped
+        return stats
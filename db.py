@@ -0,0 +1,500 @@
+import os
+import sys
+import json
+import time
+import base64
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, List, Mapping, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: a single dev server, no other processes to lock out.
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+BASE_PATH = os.path.dirname(os.path.abspath(__file__))
+USERS_JSON_PATH = os.path.join(BASE_PATH, "users.json")
+ORDERS_JSON_PATH = os.path.join(BASE_PATH, "orders.json")
+LOCAL_DB_PATH = os.path.join(BASE_PATH, "kisansevak.sqlite3")
+
+# Postgres unique_violation, as PostgREST reports it.
+UNIQUE_VIOLATION = "23505"
+
+Page = Tuple[List[Dict], Optional[str]]
+
+
+def encode_cursor(position, row_id) -> str:
+    raw = json.dumps([position, row_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple:
+    """(position, row_id) of the last order on a page; ValueError if malformed."""
+    try:
+        position, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except Exception as e:
+        raise ValueError("invalid cursor") from e
+    if not isinstance(row_id, int) or not isinstance(position, (int, float, str)):
+        raise ValueError("invalid cursor")
+    return position, row_id
+
+
+def _order_timestamp(order: Mapping) -> float:
+    try:
+        return datetime.fromisoformat(str(order.get("order_date"))).timestamp()
+    except (TypeError, ValueError):
+        return 0.0
+
+
+# -------------------------------------------------
+# JSON FILES (LOCAL FALLBACK)
+# -------------------------------------------------
+class _JsonFile:
+    """
+    A JSON object on disk, cached in memory and re-read only when the file
+    changes (another worker wrote it). Writes replace the file atomically,
+    holding an flock on a side file so workers never lose each other's.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._data: Dict = {}
+        self._stat_key = None
+        self._lock = threading.Lock()
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    def _fresh(self, reread: bool = False) -> Dict:
+        # Caller holds the lock.
+        stat_key = self._stat()
+        if reread or stat_key != self._stat_key:
+            if stat_key is None:
+                self._data = {}
+            else:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self._data = json.load(f)
+            self._stat_key = stat_key
+        return self._data
+
+    def read(self) -> Dict:
+        """The current contents; callers must not modify it."""
+        with self._lock:
+            return self._fresh()
+
+    def update(self, change) -> bool:
+        """Apply change(data) -> bool to a fresh copy and save it if it returns True."""
+        with self._lock, open(self.path + ".lock", "a") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            # Re-read under the flock: file timestamps are too coarse to
+            # tell two quick writes of the same size apart.
+            data = dict(self._fresh(reread=True))
+            if not change(data):
+                return False
+            tmp = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=2)
+            os.replace(tmp, self.path)
+            self._data, self._stat_key = data, self._stat()
+            return True
+
+
+class JsonBackend:
+    """
+    Users and orders in two JSON files ({email: user}, {email: [orders]}).
+    Every write rewrites a whole file; SqliteBackend is the default.
+    """
+
+    def __init__(self, users_path: str = USERS_JSON_PATH, orders_path: str = ORDERS_JSON_PATH):
+        self.users = _JsonFile(users_path)
+        self.orders = _JsonFile(orders_path)
+
+    def load_users(self) -> Dict[str, Dict]:
+        return dict(self.users.read())
+
+    def get_user(self, email: str) -> Optional[Dict]:
+        return self.users.read().get(email)
+
+    def user_exists(self, email: str) -> bool:
+        return email in self.users.read()
+
+    def save_user(self, email: str, data: Dict):
+        def change(users):
+            users[email] = data
+            return True
+        self.users.update(change)
+
+    def create_user(self, email: str, data: Dict) -> bool:
+        def change(users):
+            if email in users:
+                return False
+            users[email] = data
+            return True
+        return self.users.update(change)
+
+    def update_password_hash(self, email: str, password_hash: str) -> bool:
+        def change(users):
+            if email not in users:
+                return False
+            users[email] = {**users[email], "password_hash": password_hash}
+            return True
+        return self.users.update(change)
+
+    def load_orders(self) -> Dict[str, List[Dict]]:
+        return dict(self.orders.read())
+
+    def save_order(self, email: str, order: Dict):
+        def change(orders):
+            orders[email] = list(orders.get(email, [])) + [order]
+            return True
+        self.orders.update(change)
+
+    def list_orders(self, email: str, cursor: Optional[str] = None, limit: int = 10) -> Page:
+        # Orders are appended, so a list index is a stable id; undated
+        # orders sort by it alone.
+        keyed = sorted(
+            ((_order_timestamp(order), n, order) for n, order in enumerate(self.orders.read().get(email, []))),
+            key=lambda entry: entry[:2],
+            reverse=True,
+        )
+        if cursor:
+            after = tuple(decode_cursor(cursor))
+            keyed = [entry for entry in keyed if entry[:2] < after]
+        page = keyed[:limit]
+        next_cursor = encode_cursor(*page[-1][:2]) if len(keyed) > limit else None
+        return [order for _, _, order in page], next_cursor
+
+
+# -------------------------------------------------
+# SQLITE (LOCAL DEFAULT, WAL)
+# -------------------------------------------------
+class SqliteBackend:
+    """
+    Users and orders in one SQLite file in WAL mode, shared by the workers
+    of a host. Users are keyed by email, so a signup is one indexed insert
+    and concurrent signups for an address cannot both succeed; orders are
+    indexed on (email, created_ts desc, id desc) for keyset pages.
+    """
+
+    def __init__(self, path: str = LOCAL_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS users ("
+            " email TEXT PRIMARY KEY,"
+            " name TEXT NOT NULL,"
+            " password_hash TEXT NOT NULL,"
+            " created_at REAL NOT NULL)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS orders ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " email TEXT NOT NULL,"
+            " created_ts REAL NOT NULL,"
+            " data TEXT NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS orders_page ON orders (email, created_ts DESC, id DESC)")
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite3 connections are per thread; gunicorn threads each get one.
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def load_users(self) -> Dict[str, Dict]:
+        rows = self._conn().execute("SELECT email, name, password_hash FROM users").fetchall()
+        return {email: {"name": name, "password_hash": password_hash} for email, name, password_hash in rows}
+
+    def get_user(self, email: str) -> Optional[Dict]:
+        row = self._conn().execute(
+            "SELECT name, password_hash FROM users WHERE email = ?", (email,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {"name": row[0], "password_hash": row[1]}
+
+    def user_exists(self, email: str) -> bool:
+        return self._conn().execute("SELECT 1 FROM users WHERE email = ?", (email,)).fetchone() is not None
+
+    def save_user(self, email: str, data: Dict):
+        self._conn().execute(
+            "INSERT INTO users (email, name, password_hash, created_at) VALUES (?, ?, ?, ?)"
+            " ON CONFLICT(email) DO UPDATE SET name = excluded.name, password_hash = excluded.password_hash",
+            (email, data["name"], data["password_hash"], time.time()),
+        )
+
+    def create_user(self, email: str, data: Dict) -> bool:
+        try:
+            self._conn().execute(
+                "INSERT INTO users (email, name, password_hash, created_at) VALUES (?, ?, ?, ?)",
+                (email, data["name"], data["password_hash"], time.time()),
+            )
+        except sqlite3.IntegrityError:
+            return False
+        return True
+
+    def update_password_hash(self, email: str, password_hash: str) -> bool:
+        cursor = self._conn().execute(
+            "UPDATE users SET password_hash = ? WHERE email = ?", (password_hash, email)
+        )
+        return cursor.rowcount > 0
+
+    def load_orders(self) -> Dict[str, List[Dict]]:
+        orders: Dict[str, List[Dict]] = {}
+        for email, data in self._conn().execute("SELECT email, data FROM orders ORDER BY id"):
+            orders.setdefault(email, []).append(json.loads(data))
+        return orders
+
+    def save_order(self, email: str, order: Dict):
+        self._conn().execute(
+            "INSERT INTO orders (email, created_ts, data) VALUES (?, ?, ?)",
+            (email, _order_timestamp(order), json.dumps(order)),
+        )
+
+    def list_orders(self, email: str, cursor: Optional[str] = None, limit: int = 10) -> Page:
+        # Same order and cursors as JsonBackend: (order_date, insertion) descending.
+        sql, params = "SELECT id, created_ts, data FROM orders WHERE email = ?", [email]
+        if cursor:
+            created_ts, row_id = decode_cursor(cursor)
+            if not isinstance(created_ts, (int, float)):
+                raise ValueError("invalid cursor")
+            sql += " AND (created_ts < ? OR (created_ts = ? AND id < ?))"
+            params += [created_ts, created_ts, row_id]
+        rows = self._conn().execute(
+            sql + " ORDER BY created_ts DESC, id DESC LIMIT ?", params + [limit + 1]
+        ).fetchall()
+        page = rows[:limit]
+        next_cursor = encode_cursor(page[-1][1], page[-1][0]) if len(rows) > limit else None
+        return [json.loads(data) for _, _, data in page], next_cursor
+
+    def migrate_from_json(
+        self, users_path: str = USERS_JSON_PATH, orders_path: str = ORDERS_JSON_PATH, force: bool = False
+    ) -> Tuple[int, int]:
+        """
+        One-shot import of the legacy users.json and orders.json; existing
+        users win. Runs once per database; force imports users.json again
+        (orders only ever once). Returns the users and orders inserted.
+        """
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Checked inside the write transaction: workers booting together import once.
+            marker = conn.execute("SELECT value FROM meta WHERE key = 'json_migrated'").fetchone()
+            if marker and not force:
+                conn.execute("ROLLBACK")
+                return 0, 0
+            users = _read_json(users_path)
+            orders = _read_json(orders_path) if not marker else {}
+            now = time.time()
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO users (email, name, password_hash, created_at) VALUES (?, ?, ?, ?)",
+                (
+                    (email.strip().lower(), user.get("name", "Farmer"), user.get("password_hash", ""), now)
+                    for email, user in users.items()
+                ),
+            )
+            inserted_users = conn.total_changes - before
+            # In list order, so ids keep each user's insertion order.
+            order_rows = [
+                (email, _order_timestamp(order), json.dumps(order))
+                for email, user_orders in orders.items() for order in user_orders
+            ]
+            conn.executemany("INSERT INTO orders (email, created_ts, data) VALUES (?, ?, ?)", order_rows)
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('json_migrated', ?)", (str(now),)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if inserted_users or order_rows:
+            logger.info("Migrated %d users and %d orders into %s", inserted_users, len(order_rows), self.path)
+        return inserted_users, len(order_rows)
+
+
+def _read_json(path: str) -> Dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+# -------------------------------------------------
+# SUPABASE
+# -------------------------------------------------
+class SupabaseBackend:
+    """
+    Users and orders in Supabase tables:
+    users (email primary key, name, password_hash) and
+    orders (id identity, email, created_at default now(), order fields).
+    Keyed calls fetch one row through the email index.
+    """
+
+    def __init__(self, url: str, key: str):
+        from supabase import create_client
+
+        self.client = create_client(url, key)
+
+    def load_users(self) -> Dict[str, Dict]:
+        rows = self.client.table("users").select("email,name,password_hash").execute().data
+        return {row["email"]: {"name": row["name"], "password_hash": row["password_hash"]} for row in rows}
+
+    def get_user(self, email: str) -> Optional[Dict]:
+        rows = (
+            self.client.table("users").select("name,password_hash")
+            .eq("email", email).limit(1).execute().data
+        )
+        return rows[0] if rows else None
+
+    def user_exists(self, email: str) -> bool:
+        rows = self.client.table("users").select("email").eq("email", email).limit(1).execute().data
+        return bool(rows)
+
+    def save_user(self, email: str, data: Dict):
+        self.client.table("users").upsert({"email": email, **data}).execute()
+
+    def create_user(self, email: str, data: Dict) -> bool:
+        try:
+            self.client.table("users").insert({"email": email, **data}).execute()
+        except Exception as e:
+            # The email primary key settles concurrent signups.
+            if getattr(e, "code", None) == UNIQUE_VIOLATION:
+                return False
+            raise
+        return True
+
+    def update_password_hash(self, email: str, password_hash: str) -> bool:
+        rows = (
+            self.client.table("users").update({"password_hash": password_hash})
+            .eq("email", email).execute().data
+        )
+        return bool(rows)
+
+    def load_orders(self) -> Dict[str, List[Dict]]:
+        orders: Dict[str, List[Dict]] = {}
+        for row in self.client.table("orders").select("*").execute().data:
+            orders.setdefault(row["email"], []).append(row)
+        return orders
+
+    def save_order(self, email: str, order: Dict):
+        self.client.table("orders").insert({"email": email, **order}).execute()
+
+    def list_orders(self, email: str, cursor: Optional[str] = None, limit: int = 10) -> Page:
+        # Keyset page over (email, created_at desc, id desc); an index on
+        # those columns makes it one range scan of this user's rows.
+        query = self.client.table("orders").select("*").eq("email", email)
+        if cursor:
+            created_at, row_id = decode_cursor(cursor)
+            # Quoted: timestamps contain PostgREST separators (":", ".", "+").
+            query = query.or_(
+                f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt.{int(row_id)})'
+            )
+        rows = (
+            query.order("created_at", desc=True).order("id", desc=True)
+            .limit(limit + 1).execute().data
+        )
+        page = rows[:limit]
+        next_cursor = encode_cursor(page[-1]["created_at"], page[-1]["id"]) if len(rows) > limit else None
+        return page, next_cursor
+
+
+# -------------------------------------------------
+# MODULE API
+# -------------------------------------------------
+_backend = None
+
+
+def init_db(backend=None):
+    """
+    Select storage: the given backend, Supabase when SUPABASE_URL and
+    SUPABASE_KEY are set, local SQLite otherwise (importing users.json and
+    orders.json on first use). Returns the previous one.
+    """
+    global _backend
+    previous = _backend
+    if backend is None:
+        url, key = os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY")
+        if url and key:
+            backend = SupabaseBackend(url, key)
+        else:
+            backend = SqliteBackend(os.getenv("LOCAL_DB_PATH", LOCAL_DB_PATH))
+            backend.migrate_from_json(
+                os.getenv("USERS_JSON_PATH", USERS_JSON_PATH),
+                os.getenv("ORDERS_JSON_PATH", ORDERS_JSON_PATH),
+            )
+            logger.info("Supabase not configured, storing data in %s", backend.path)
+    _backend = backend
+    return previous
+
+
+def _db():
+    if _backend is None:
+        init_db()
+    return _backend
+
+
+def load_users() -> Dict[str, Dict]:
+    return _db().load_users()
+
+
+def get_user(email: str) -> Optional[Dict]:
+    """{name, password_hash} for one user, or None."""
+    return _db().get_user(email)
+
+
+def user_exists(email: str) -> bool:
+    return _db().user_exists(email)
+
+
+def save_user(email: str, data: Dict):
+    _db().save_user(email, data)
+
+
+def create_user(email: str, data: Dict) -> bool:
+    """Insert a new user. Returns False if the email is already taken."""
+    return _db().create_user(email, data)
+
+
+def update_password_hash(email: str, password_hash: str) -> bool:
+    return _db().update_password_hash(email, password_hash)
+
+
+def load_orders() -> Dict[str, List[Dict]]:
+    return _db().load_orders()
+
+
+def save_order(email: str, order: Dict):
+    _db().save_order(email, order)
+
+
+def list_orders(email: str, cursor: Optional[str] = None, limit: int = 10) -> Page:
+    """
+    One page of a user's orders, newest first, and the cursor of the next
+    page (None on the last). Raises ValueError for a malformed cursor.
+    """
+    return _db().list_orders(email, cursor, limit)
+
+
+if __name__ == "__main__":
+    # python db.py [users.json] [orders.json]: re-run the import by hand.
+    store = SqliteBackend(os.getenv("LOCAL_DB_PATH", LOCAL_DB_PATH))
+    users_path = sys.argv[1] if len(sys.argv) > 1 else os.getenv("USERS_JSON_PATH", USERS_JSON_PATH)
+    orders_path = sys.argv[2] if len(sys.argv) > 2 else os.getenv("ORDERS_JSON_PATH", ORDERS_JSON_PATH)
+    users, orders = store.migrate_from_json(users_path, orders_path, force=True)
+    print(f"Migrated {users} users and {orders} orders into {store.path}")
@@ -0,0 +1,195 @@
+import json
+import time
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+# -------------------------------------------------
+# IN-FLIGHT CALL (SINGLE-FLIGHT)
+# -------------------------------------------------
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value: Optional[str] = None
+        self.error: Optional[BaseException] = None
+        self._callbacks: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    def add_done_callback(self, fn: Callable[[], None]):
+        """Run fn() once the call is done (at once if it already is)."""
+        with self._lock:
+            if not self.done.is_set():
+                self._callbacks.append(fn)
+                return
+        fn()
+
+    def set_done(self):
+        with self._lock:
+            self.done.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for fn in callbacks:
+            fn()
+
+    def result(self) -> Optional[str]:
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+# -------------------------------------------------
+# EXPLANATION CACHE (LRU + TTL)
+# -------------------------------------------------
+class ExplanationCache:
+    """
+    Caches generated explanations by a hash of the prompt inputs.
+
+    Entries expire after ttl_seconds and the least recently used entry is
+    evicted beyond max_entries. Concurrent misses for the same key are
+    coalesced: one caller (the leader) produces the value, the others wait
+    for it, for at most their own deadline.
+
+    get_or_compute() does all of this for a plain function; join(),
+    finish() and wait() are the same steps for a leader that produces the
+    value some other way, such as a streamed response.
+    """
+
+    def __init__(self, max_entries: int = 512, ttl_seconds: float = 3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.wait_timeouts = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._inflight: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(*parts) -> str:
+        raw = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get_or_compute(
+        self, key: str, compute: Callable[[], Optional[str]], timeout: Optional[float] = None
+    ) -> Optional[str]:
+        """
+        Return the cached value for key, or run compute() once for all
+        concurrent callers. None results and exceptions are not cached;
+        an exception is re-raised in every coalesced caller. A coalesced
+        caller gives up after timeout seconds and gets None; the leader's
+        value is still cached when it arrives.
+        """
+        value, call, leader = self.join(key)
+        if call is None:
+            return value
+        if not leader:
+            return self.wait(call, timeout)
+
+        try:
+            value = compute()
+        except BaseException as e:
+            self.finish(key, call, error=e)
+            raise
+        self.finish(key, call, value)
+        return value
+
+    def join(self, key: str) -> Tuple[Optional[str], Optional[_Call], bool]:
+        """
+        (value, None, False) on a cache hit. On a miss, (None, call, leader):
+        the leader must call finish(key, call, ...) exactly once; the others
+        wait(call, timeout).
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value, None, False
+                del self._entries[key]
+
+            call = self._inflight.get(key)
+            if call is not None:
+                self.coalesced += 1
+                return None, call, False
+            call = self._inflight[key] = _Call()
+            self.misses += 1
+            return None, call, True
+
+    def finish(
+        self, key: str, call: _Call, value: Optional[str] = None, error: Optional[BaseException] = None
+    ):
+        """Publish the leader's result (cached unless None or an error) and wake the waiters."""
+        call.value, call.error = value, error
+        with self._lock:
+            if self._inflight.get(key) is call:
+                del self._inflight[key]
+            if error is None and value is not None:
+                self._store(key, value)
+        call.set_done()
+
+    def wait(self, call: _Call, timeout: Optional[float] = None) -> Optional[str]:
+        """The leader's value, or None if it is not ready within timeout seconds."""
+        if not call.done.wait(timeout):
+            with self._lock:
+                self.wait_timeouts += 1
+            return None
+        return call.result()
+
+    async def wait_async(self, call: _Call, timeout: Optional[float] = None) -> Optional[str]:
+        """wait() for the event loop: holds no thread while the leader works."""
+        loop = asyncio.get_running_loop()
+        done = loop.create_future()
+
+        def wake():
+            try:
+                loop.call_soon_threadsafe(lambda: done.done() or done.set_result(None))
+            except RuntimeError:  # loop already closed
+                pass
+
+        call.add_done_callback(wake)
+        try:
+            await asyncio.wait_for(done, timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self.wait_timeouts += 1
+            return None
+        return call.result()
+
+    def peek(self, key: str) -> Optional[str]:
+        """Fresh cached value for key, or None. Counts as a hit when found."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= time.monotonic():
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: str, value: str):
+        """Store a value produced outside get_or_compute (e.g. a finished stream)."""
+        with self._lock:
+            self._store(key, value)
+
+    def _store(self, key: str, value: str):
+        self._entries[key] = (value, time.monotonic() + self.ttl_seconds)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "wait_timeouts": self.wait_timeouts,
+                "inflight": len(self._inflight),
+            }
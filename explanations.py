@@ -0,0 +1,283 @@
+import json
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+FALLBACK_REPLY = (
+    "Based on your preference, the top option ranks highest "
+    "due to better balance of quality, availability, distance, and price."
+)
+
+# The only item fields the explanation talks about.
+PROMPT_FIELDS = ("name", "seller", "price", "distance_km", "quality")
+
+
+# -------------------------------------------------
+# PROMPT
+# -------------------------------------------------
+def prompt_items(top_items: List[Dict]) -> List[Dict]:
+    return [{field: item[field] for field in PROMPT_FIELDS if field in item} for item in top_items]
+
+
+def build_prompt(top_items: List[Dict], preference: str, selected_product: Optional[str]) -> str:
+    options = json.dumps(prompt_items(top_items), ensure_ascii=False, separators=(",", ":"))
+    return f"""Explain to a farmer why option 1 is the best choice. Do not reorder, rescore or invent data; skip anything missing.
+Agriculture only, else reply exactly: "I can only assist with agriculture-related topics."
+Preference: {preference}. Product: {selected_product or "not specified"}.
+Options, best first (quality 0-1, distance km): {options}
+Simple words, max 140 words, never mention AI, models or scoring. Reply in exactly this format:
+🌾 Best Recommendation for You
+
+Product: <name>
+Seller: <seller>
+
+Why this is the best choice:
+• <reason from data>
+• <reason from data>
+• <reason from data>
+
+✅ Pros:
+• <pro>
+• <pro>
+
+⚠️ Cons:
+• <one con>
+
+🔍 Comparison:
+Compared to <option 2 name>, this option <one sentence>."""
+
+
+# -------------------------------------------------
+# TEMPLATE FALLBACK
+# -------------------------------------------------
+def template_reply(top_items: List[Dict], preference: str) -> str:
+    """
+    The prompt's format filled in from the two top items alone; shown when
+    Gemini is unavailable, fails or misses its deadline.
+    """
+    if not top_items:
+        return FALLBACK_REPLY
+    best = top_items[0]
+    second = top_items[1] if len(top_items) > 1 else None
+
+    lines = [
+        "🌾 Best Recommendation for You",
+        "",
+        f"Product: {best['name']}",
+        f"Seller: {best['seller']}",
+        "",
+        "Why this is the best choice:",
+        f"• Best overall match for your {preference} preference",
+        f"• Quality rating {best['quality']:.2f} out of 1",
+        f"• Seller is {best['distance_km']:g} km away, price {best['price']:g}",
+    ]
+    if second is None:
+        return "\n".join(lines)
+
+    better, worse = [], []
+    for is_better, pro, con, diff in (
+        (best["quality"] >= second["quality"], "Higher quality", "Lower quality",
+         f"{best['quality']:.2f} vs {second['quality']:.2f}"),
+        (best["price"] <= second["price"], "Lower price", "Higher price",
+         f"{best['price']:g} vs {second['price']:g}"),
+        (best["distance_km"] <= second["distance_km"], "Closer seller", "Farther away",
+         f"{best['distance_km']:g} km vs {second['distance_km']:g} km"),
+    ):
+        if is_better:
+            better.append(f"• {pro} ({diff})")
+        else:
+            worse.append(f"• {con} than the next option ({diff})")
+
+    lines += ["", "✅ Pros:", *better[:2]]
+    if len(better) < 2:
+        lines.append("• Best balance of quality, availability, distance and price")
+    lines += ["", "⚠️ Cons:", worse[0] if worse else "• Check current stock with the seller before ordering"]
+    lines += [
+        "",
+        "🔍 Comparison:",
+        f"Compared to {second['name']} from {second['seller']}, this option ranks higher "
+        f"for your {preference} preference.",
+    ]
+    return "\n".join(lines)
+
+
+# -------------------------------------------------
+# DEADLINE
+# -------------------------------------------------
+# Inline explanations run here so the request can stop waiting at its
+# deadline; a call that finishes late still fills the explanation cache.
+_deadline_pool = ThreadPoolExecutor(max_workers=32, thread_name_prefix="gemini")
+
+
+def call_with_deadline(compute: Callable[[], Optional[str]], timeout: float) -> Optional[str]:
+    """
+    compute() if it finishes within timeout seconds, else None. A call still
+    queued at the deadline is cancelled; a running one is left to its own
+    request timeout. Exceptions from compute() propagate.
+    """
+    future = _deadline_pool.submit(compute)
+    try:
+        return future.result(timeout=timeout)
+    except FutureTimeout:
+        future.cancel()
+        logger.warning("Gemini explanation missed its %.1fs deadline", timeout)
+        return None
+
+
+# -------------------------------------------------
+# SERVER-SENT EVENTS
+# -------------------------------------------------
+def sse_event(event: str, data: Dict) -> str:
+    payload = json.dumps(data, ensure_ascii=False)
+    return f"event: {event}\ndata: {payload}\n\n"
+
+
+def stream_explanation(
+    model,
+    prompt: str,
+    fallback: str = FALLBACK_REPLY,
+    cache=None,
+    cache_key: Optional[str] = None,
+    timeout: Optional[float] = None
+) -> Iterator[str]:
+    """
+    Yield SSE frames for a Gemini explanation as it is generated.
+
+    Frames: `chunk` ({"text": ...}) per streamed piece, then `done`
+    ({"reply": full text}). If the model is missing or the stream fails
+    (even part-way), a single `fallback` ({"reply": fallback}) ends the
+    stream instead. `model` only needs generate_content(prompt, stream=True,
+    request_options=...) returning an iterable of objects with a `.text`, so
+    tests can pass a plain fake. timeout bounds the whole Gemini stream.
+
+    With a cache, concurrent streams for the same key are coalesced: one
+    calls Gemini, the others wait (up to timeout) and send its full text
+    as a single `done`.
+    """
+    if model is None:
+        yield sse_event("fallback", {"reply": fallback})
+        return
+
+    call = None
+    if cache is not None and cache_key is not None:
+        cached, call, leader = cache.join(cache_key)
+        if call is None:
+            yield sse_event("done", {"reply": cached})
+            return
+        if not leader:
+            yield _follower_frame(lambda: cache.wait(call, timeout), fallback)
+            return
+
+    reply = None
+    try:
+        parts = []
+        try:
+            request_options = {"timeout": timeout} if timeout else {}
+            for chunk in model.generate_content(prompt, stream=True, request_options=request_options):
+                text = chunk.text
+                if text:
+                    parts.append(text)
+                    yield sse_event("chunk", {"text": text})
+        except Exception as e:
+            logger.exception("Gemini streaming error: %s", e)
+            yield sse_event("fallback", {"reply": fallback})
+            return
+
+        reply = "".join(parts).strip() or None
+        if call is not None:
+            cache.finish(cache_key, call, reply)
+            call = None
+        yield sse_event("done", {"reply": reply}) if reply else sse_event("fallback", {"reply": fallback})
+    finally:
+        # Failed, or the client went away mid-stream: release the waiters.
+        if call is not None:
+            cache.finish(cache_key, call, None)
+
+
+def _follower_frame(wait: Callable[[], Optional[str]], fallback: str) -> str:
+    try:
+        reply = wait()
+    except Exception:
+        reply = None  # the leader's failure was logged where it happened
+    if reply:
+        return sse_event("done", {"reply": reply})
+    return sse_event("fallback", {"reply": fallback})
+
+
+async def astream_explanation(
+    model,
+    prompt: str,
+    fallback: str = FALLBACK_REPLY,
+    cache=None,
+    cache_key: Optional[str] = None,
+    timeout: Optional[float] = None
+) -> AsyncIterator[str]:
+    """
+    stream_explanation for the ASGI server: the Gemini stream is awaited
+    (generate_content_async), so the event loop keeps serving other
+    requests while the model is generating. Same frames, fallbacks and
+    coalescing (followers await the leader without a thread); timeout is a
+    deadline for the whole stream.
+    """
+    if model is None:
+        yield sse_event("fallback", {"reply": fallback})
+        return
+
+    call = None
+    if cache is not None and cache_key is not None:
+        cached, call, leader = cache.join(cache_key)
+        if call is None:
+            yield sse_event("done", {"reply": cached})
+            return
+        if not leader:
+            try:
+                reply = await cache.wait_async(call, timeout)
+            except Exception:
+                reply = None
+            yield _follower_frame(lambda: reply, fallback)
+            return
+
+    reply = None
+    try:
+        parts = []
+        try:
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + timeout if timeout else None
+
+            def remaining() -> Optional[float]:
+                return None if deadline is None else max(0.0, deadline - loop.time())
+
+            request_options = {"timeout": timeout} if timeout else {}
+            response = await asyncio.wait_for(
+                model.generate_content_async(prompt, stream=True, request_options=request_options), remaining()
+            )
+            chunks = response.__aiter__()
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), remaining())
+                except StopAsyncIteration:
+                    break
+                text = chunk.text
+                if text:
+                    parts.append(text)
+                    yield sse_event("chunk", {"text": text})
+        except TimeoutError:
+            logger.warning("Gemini explanation stream missed its %.1fs deadline", timeout)
+            yield sse_event("fallback", {"reply": fallback})
+            return
+        except Exception as e:
+            logger.exception("Gemini streaming error: %s", e)
+            yield sse_event("fallback", {"reply": fallback})
+            return
+
+        reply = "".join(parts).strip() or None
+        if call is not None:
+            cache.finish(cache_key, call, reply)
+            call = None
+        yield sse_event("done", {"reply": reply}) if reply else sse_event("fallback", {"reply": fallback})
+    finally:
+        if call is not None:
+            cache.finish(cache_key, call, None)
@@ -0,0 +1,288 @@
+import os
+import re
+import csv
+import sys
+import io
+import gzip
+import heapq
+import bisect
+import difflib
+import argparse
+import statistics
+import threading
+from array import array
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+BASE_PATH = os.path.dirname(os.path.abspath(__file__))
+GAZETTEER_PATH = os.path.join(BASE_PATH, "gazetteer.tsv.gz")
+ALIASES_PATH = os.path.join(BASE_PATH, "gazetteer_aliases.tsv")
+
+Coords = Tuple[float, float]
+
+# Names shorter than this only resolve exactly, never by prefix or
+# spelling ("pu" is not Pune, "ok" is not Wok).
+MIN_PREFIX_LEN = 4
+FUZZY_CUTOFF = 0.9
+# Chat replies that are also (prefixes of) village names; a farmer who
+# types one is answering, not naming a place.
+CHAT_REPLIES = frozenset({
+    "hello", "hi", "hey", "yes", "yeah", "no", "nope", "ok", "okay", "sure",
+    "thanks", "thank you", "please", "good", "fine", "great", "done", "help", "bye",
+})
+# Share of a query's trigrams a name must contain to be a fuzzy candidate,
+# and how many of the most similar candidates difflib then scores.
+MIN_TRIGRAM_SHARE = 0.4
+MAX_FUZZY_CANDIDATES = 20
+
+
+def normalize_name(text: str) -> str:
+    text = re.sub(r"[^a-z0-9 ]+", " ", (text or "").lower())
+    return " ".join(text.split())
+
+
+def trigrams(name: str) -> Set[str]:
+    padded = f" {name} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _open_text(path: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+
+def _open_output(path: str):
+    if path.endswith(".gz"):
+        # mtime=0 keeps rebuilds of the same directory byte-identical.
+        return io.TextIOWrapper(gzip.GzipFile(path, "wb", mtime=0), encoding="utf-8")
+    return open(path, "w", encoding="utf-8")
+
+
+def read_entries(path: str) -> Iterable[Tuple[str, Coords]]:
+    """(key, (lat, lon)) for each line of a gazetteer file."""
+    with _open_text(path) as f:
+        for line in f:
+            if not line.strip() or line.startswith("#"):
+                continue
+            key, lat, lon = line.rstrip("\n").split("\t")
+            yield key, (float(lat), float(lon))
+
+
+# -------------------------------------------------
+# GAZETTEER (PIN + PLACE NAMES)
+# -------------------------------------------------
+class Gazetteer:
+    """
+    Offline PIN code and place-name lookup.
+
+    File format (gazetteer.tsv.gz, plain or gzipped): one `key<TAB>lat<TAB>lon`
+    per line, where a 6-digit key is a PIN code and anything else is a place
+    name. Lines starting with '#' are comments.
+
+    PINs are a dict lookup; names are kept sorted with their coordinates
+    in parallel arrays, so exact names and prefixes are a bisect. Misspellings
+    go through a trigram index: only names sharing enough of the query's
+    trigrams are scored with difflib, so a fuzzy lookup touches a few
+    candidates rather than every name with the same initial.
+    """
+
+    def __init__(self, pins: Dict[str, Coords], places: Dict[str, Coords]):
+        self.pins = pins
+        self._names: List[str] = sorted(places)
+        self._lats = array("d", (places[name][0] for name in self._names))
+        self._lons = array("d", (places[name][1] for name in self._names))
+        postings: Dict[str, List[int]] = defaultdict(list)
+        for n, name in enumerate(self._names):
+            for gram in trigrams(name):
+                postings[gram].append(n)
+        # Ascending name ids per trigram, 4 bytes each.
+        self._postings: Dict[str, array] = {gram: array("I", ids) for gram, ids in postings.items()}
+
+    @classmethod
+    def load(cls, path: str = GAZETTEER_PATH) -> "Gazetteer":
+        pins, places = {}, {}
+        for key, coords in read_entries(path):
+            if re.fullmatch(r"\d{6}", key):
+                pins[key] = coords
+            else:
+                places[normalize_name(key)] = coords
+        return cls(pins, places)
+
+    def lookup_pin(self, pincode: str) -> Optional[Coords]:
+        return self.pins.get(pincode.strip())
+
+    def _coords(self, n: int) -> Coords:
+        return self._lats[n], self._lons[n]
+
+    def lookup_name(self, text: str) -> Optional[Coords]:
+        """
+        Exact name, then unambiguous-enough prefix, then closest spelling.
+        None for chat replies and, unless exact, for names under MIN_PREFIX_LEN.
+        """
+        name = normalize_name(text)
+        if not name or name in CHAT_REPLIES:
+            return None
+
+        lo = bisect.bisect_left(self._names, name)
+        if lo < len(self._names) and self._names[lo] == name:
+            return self._coords(lo)
+        if len(name) < MIN_PREFIX_LEN:
+            return None
+
+        hi = bisect.bisect_left(self._names, name + "\uffff")
+        if lo < hi:
+            # Shortest completion is the most likely intended place.
+            return self._coords(min(range(lo, hi), key=lambda n: (len(self._names[n]), self._names[n])))
+
+        match = self._closest(name)
+        return self._coords(bisect.bisect_left(self._names, match)) if match else None
+
+    def _closest(self, name: str) -> Optional[str]:
+        grams = trigrams(name)
+        need = max(1, round(len(grams) * MIN_TRIGRAM_SHARE))
+        postings = sorted((self._postings.get(g, ()) for g in grams), key=len)
+        # A name sharing `need` of the query's grams shares at least one of
+        # its len(grams) - need + 1 rarest ones, so only those seed the count;
+        # the common grams are checked against the seeded candidates alone.
+        seeds = len(grams) - need + 1
+        shared: Counter = Counter()
+        for ids in postings[:seeds]:
+            shared.update(ids)
+        if not shared:
+            return None
+        for ids in postings[seeds:]:
+            for n in shared:
+                i = bisect.bisect_left(ids, n)
+                if i < len(ids) and ids[i] == n:
+                    shared[n] += 1
+
+        # Dice similarity on trigrams; a name has about len(name) of them.
+        def dice(n: int) -> float:
+            return shared[n] / (len(grams) + len(self._names[n]))
+
+        ids = [n for n, count in shared.items() if count >= need]
+        candidates = [self._names[n] for n in heapq.nlargest(MAX_FUZZY_CANDIDATES, ids, key=dice)]
+        match = difflib.get_close_matches(name, candidates, n=1, cutoff=FUZZY_CUTOFF)
+        return match[0] if match else None
+
+
+class LazyGazetteer:
+    """A Gazetteer loaded on the first lookup, so importing the app stays fast."""
+
+    def __init__(self, path: str = GAZETTEER_PATH):
+        self.path = path
+        self._gazetteer: Optional[Gazetteer] = None
+        self._lock = threading.Lock()
+
+    def get(self) -> Gazetteer:
+        gazetteer = self._gazetteer
+        if gazetteer is None:
+            with self._lock:
+                if self._gazetteer is None:
+                    self._gazetteer = Gazetteer.load(self.path)
+                gazetteer = self._gazetteer
+        return gazetteer
+
+    def lookup_pin(self, pincode: str) -> Optional[Coords]:
+        return self.get().lookup_pin(pincode)
+
+    def lookup_name(self, text: str) -> Optional[Coords]:
+        return self.get().lookup_name(text)
+
+
+# -------------------------------------------------
+# BUILD FROM THE ALL-INDIA PINCODE DIRECTORY
+# -------------------------------------------------
+OFFICE_SUFFIX = re.compile(r"\s+(b\.?o|s\.?o|h\.?o|g\.?p\.?o)\.?$", re.IGNORECASE)
+# The directory has rows with swapped or mistyped coordinates; anything
+# outside India's bounding box is dropped.
+INDIA_BOUNDS = ((6.0, 37.5), (68.0, 97.5))
+
+
+def _median(points: List[Coords]) -> Coords:
+    # Per-axis median: one mistyped office does not drag the PIN away.
+    return statistics.median(p[0] for p in points), statistics.median(p[1] for p in points)
+
+
+def build(csv_path: str, out_path: str = GAZETTEER_PATH, aliases_path: Optional[str] = ALIASES_PATH) -> Tuple[int, int]:
+    """
+    Compile the public pincode directory CSV (officename, pincode,
+    district, latitude, longitude columns; any case) into gazetteer.tsv.gz.
+
+    A PIN sits at the median of its offices. An office name used in several
+    districts resolves to the district with the most such offices, and is
+    also written as "<name> <district>" for the others. Entries from the
+    aliases file (city names, renamed places) are added last and win.
+    """
+    (lat_min, lat_max), (lon_min, lon_max) = INDIA_BOUNDS
+    pins: Dict[str, List[Coords]] = defaultdict(list)
+    offices: Dict[str, Dict[str, List[Coords]]] = defaultdict(lambda: defaultdict(list))
+    districts: Dict[str, List[Coords]] = defaultdict(list)
+
+    with open(csv_path, "r", encoding="utf-8-sig", newline="") as f:
+        reader = csv.DictReader(f)
+        for row in reader:
+            row = {(k or "").strip().lower(): (v or "").strip() for k, v in row.items()}
+            try:
+                point = (float(row.get("latitude", "")), float(row.get("longitude", "")))
+            except ValueError:
+                continue
+            if not (lat_min <= point[0] <= lat_max and lon_min <= point[1] <= lon_max):
+                continue
+
+            pincode = row.get("pincode", "")
+            if re.fullmatch(r"\d{6}", pincode):
+                pins[pincode].append(point)
+            district = normalize_name(row.get("district", row.get("districtname", "")))
+            if district:
+                districts[district].append(point)
+            office = normalize_name(OFFICE_SUFFIX.sub("", row.get("officename", "")))
+            if office:
+                offices[office][district].append(point)
+
+    places: Dict[str, Coords] = {name: _median(points) for name, points in districts.items()}
+    for office, by_district in offices.items():
+        ranked = sorted(by_district.items(), key=lambda item: (-len(item[1]), item[0]))
+        places.setdefault(office, _median(ranked[0][1]))
+        if len(ranked) > 1:
+            for district, points in ranked:
+                if district:
+                    places.setdefault(f"{office} {district}", _median(points))
+    entries = {pin: _median(points) for pin, points in pins.items()}
+    entries.update(places)
+    if aliases_path:
+        entries.update(read_entries(aliases_path))
+
+    n_pins = sum(1 for key in entries if re.fullmatch(r"\d{6}", key))
+    with _open_output(out_path) as out:
+        out.write("# key\tlat\tlon (generated by gazetteer.py build)\n")
+        for key in sorted(entries):
+            lat, lon = entries[key]
+            out.write(f"{key}\t{lat:.4f}\t{lon:.4f}\n")
+    return n_pins, len(entries) - n_pins
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or query the offline gazetteer.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build_cmd = sub.add_parser("build", help="compile a pincode directory CSV")
+    build_cmd.add_argument("csv_path")
+    build_cmd.add_argument("-o", "--output", default=GAZETTEER_PATH)
+    build_cmd.add_argument("--aliases", default=ALIASES_PATH, help="extra key/lat/lon file merged last ('' for none)")
+
+    query_cmd = sub.add_parser("lookup", help="resolve a PIN code or place name")
+    query_cmd.add_argument("text")
+    query_cmd.add_argument("--path", default=GAZETTEER_PATH)
+
+    args = parser.parse_args()
+    if args.command == "build":
+        n_pins, n_places = build(args.csv_path, args.output, args.aliases or None)
+        print(f"Wrote {n_pins} PIN codes and {n_places} place names to {args.output}")
+    else:
+        gaz = Gazetteer.load(args.path)
+        text = args.text.strip()
+        result = gaz.lookup_pin(text) if re.fullmatch(r"\d{6}", text) else gaz.lookup_name(text)
+        print(result)
+        sys.exit(0 if result else 1)
@@ -0,0 +1,185 @@
+import time
+import bisect
+import threading
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from flask import g, has_app_context, request
+
+# Latency buckets in seconds (Prometheus convention), 1 ms .. 10 s.
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(key: LabelKey, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in key]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+# -------------------------------------------------
+# METRIC TYPES
+# -------------------------------------------------
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_labels(key)} {value}"
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        # Per label set: [count per bucket..., +Inf count, sum]
+        self._values: Dict[LabelKey, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0] * (len(self.buckets) + 2)
+            row[slot] += 1
+            row[-1] += value
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            items = [(key, list(row)) for key, row in self._values.items()]
+        for key, row in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, row):
+                cumulative += count
+                le = 'le="%s"' % bound
+                yield f"{self.name}_bucket{_labels(key, le)} {cumulative}"
+            cumulative += row[len(self.buckets)]
+            le = 'le="+Inf"'
+            yield f"{self.name}_bucket{_labels(key, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(key)} {row[-1]}"
+            yield f"{self.name}_count{_labels(key)} {cumulative}"
+
+
+# -------------------------------------------------
+# STAGE TIMER
+# -------------------------------------------------
+class _NoopStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP_STAGE = _NoopStage()
+
+
+class _Stage:
+    __slots__ = ("owner", "name", "started")
+
+    def __init__(self, owner: "Instrumentation", name: str):
+        self.owner = owner
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.started
+        self.owner.stage_seconds.observe(elapsed, stage=self.name)
+        timings = g.get("_stage_timings") if has_app_context() else None
+        if timings is not None:
+            timings.append((self.name, elapsed))
+        return False
+
+
+# -------------------------------------------------
+# INSTRUMENTATION (FLASK)
+# -------------------------------------------------
+class Instrumentation:
+    """
+    Per-stage latency for hot paths, exported two ways:
+    a Server-Timing header on each response and Prometheus text at /metrics.
+
+    When disabled, stage() returns a shared no-op context manager and no
+    request hooks are installed.
+    """
+
+    def __init__(self, enabled: bool = False, prefix: str = "kisansevak"):
+        self.enabled = enabled
+        self.prefix = prefix
+        self.stage_seconds = Histogram(f"{prefix}_stage_seconds", "Time spent per request stage.")
+        self.request_seconds = Histogram(f"{prefix}_request_seconds", "Request latency by endpoint.")
+        self.requests_total = Counter(f"{prefix}_requests_total", "Requests by endpoint and status.")
+        self._collectors: List[Callable[[], Iterable[str]]] = []
+
+    def stage(self, name: str):
+        if not self.enabled:
+            return _NOOP_STAGE
+        return _Stage(self, name)
+
+    def add_collector(self, collector: Callable[[], Iterable[str]]):
+        """Register a callable yielding extra exposition lines at scrape time."""
+        self._collectors.append(collector)
+
+    def init_app(self, app):
+        if not self.enabled:
+            return
+
+        @app.before_request
+        def _start_timer():
+            g._request_started = time.perf_counter()
+            g._stage_timings = []
+
+        @app.after_request
+        def _finish_timer(response):
+            started = g.get("_request_started")
+            if started is None:
+                return response
+            elapsed = time.perf_counter() - started
+            self.observe_request(request.endpoint or "unknown", response.status_code, elapsed)
+
+            timings = g.get("_stage_timings") or []
+            entries = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in timings]
+            entries.append(f"total;dur={elapsed * 1000:.2f}")
+            response.headers["Server-Timing"] = ", ".join(entries)
+            return response
+
+    def observe_request(self, endpoint: str, status: int, seconds: float):
+        """Record one request; also for responses served outside Flask (asgi.py)."""
+        if not self.enabled:
+            return
+        self.request_seconds.observe(seconds, endpoint=endpoint)
+        self.requests_total.inc(endpoint=endpoint, status=str(status))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in (self.stage_seconds, self.request_seconds, self.requests_total):
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            lines.extend(collector())
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,137 @@
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Optional, Tuple
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+DEFAULT_METHOD = "scrypt:32768:8:1"
+
+
+class HasherBusy(Exception):
+    """More hashing work is queued than max_pending allows; retry later."""
+
+
+def _method_of(password_hash: str) -> str:
+    return password_hash.split("$", 1)[0]
+
+
+# Run in the pool processes: keep them top-level and import-light.
+def _hash(password: str, method: str) -> str:
+    return generate_password_hash(password, method=method)
+
+
+def _verify(password_hash: str, password: str, method: str, current: str) -> Tuple[bool, Optional[str]]:
+    if not check_password_hash(password_hash, password):
+        return False, None
+    if _method_of(password_hash) == current:
+        return True, None
+    return True, generate_password_hash(password, method=method)
+
+
+# -------------------------------------------------
+# PASSWORD HASHER (BOUNDED PROCESS POOL)
+# -------------------------------------------------
+class PasswordHasher:
+    """
+    Password hashing and checking off the request threads.
+
+    Work runs in `workers` spawned processes, so at most that many scrypt
+    computations (and their memory) run at once per app worker. At most
+    `max_pending` calls may wait or run; beyond that HasherBusy is raised
+    straight away instead of queueing the request. workers=0 hashes inline.
+    If a pool process dies, the pool is replaced and the call retried once.
+
+    verify() also returns a fresh hash when the stored one was made with
+    other parameters than `method`, so changing PASSWORD_HASH_METHOD
+    upgrades users as they log in.
+    """
+
+    def __init__(self, method: str = DEFAULT_METHOD, workers: int = 2, max_pending: int = 32):
+        self.method = method
+        self.workers = workers
+        self.max_pending = max_pending
+        # "scrypt" and "pbkdf2:sha256" get their default parameters filled in.
+        self.current = _method_of(generate_password_hash("", method=method))
+        self.pending = 0
+        self.rejected = 0
+        self.rehashed = 0
+        self.pool_restarts = 0
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _pool(self) -> ProcessPoolExecutor:
+        # Created on first use, i.e. after gunicorn has forked its workers;
+        # spawned, not forked, because the app process runs threads.
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._executor
+
+    def _discard(self, executor: ProcessPoolExecutor):
+        # A pool whose process died (OOM kill, crash) rejects all further
+        # work; drop it so the next _pool() call spawns a fresh one. Several
+        # threads may see the same broken pool, only the first replaces it.
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+                self.pool_restarts += 1
+        executor.shutdown(wait=False)
+
+    def _submit(self, fn, *args):
+        for attempt in range(2):
+            executor = self._pool()
+            try:
+                return executor.submit(fn, *args).result()
+            except BrokenProcessPool:
+                self._discard(executor)
+                if attempt:
+                    raise
+
+    def _run(self, fn, *args):
+        if not self.workers:
+            return fn(*args)
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise HasherBusy(f"{self.pending} password hashes pending")
+            self.pending += 1
+        try:
+            return self._submit(fn, *args)
+        finally:
+            with self._lock:
+                self.pending -= 1
+
+    def hash(self, password: str) -> str:
+        return self._run(_hash, password, self.method)
+
+    def verify(self, password_hash: str, password: str) -> Tuple[bool, Optional[str]]:
+        """(valid, new_hash); new_hash is set when the stored hash should be replaced."""
+        if not password_hash:
+            return False, None
+        valid, new_hash = self._run(_verify, password_hash, password, self.method, self.current)
+        if new_hash:
+            with self._lock:
+                self.rehashed += 1
+        return valid, new_hash
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "method": self.current,
+                "workers": self.workers,
+                "pending": self.pending,
+                "max_pending": self.max_pending,
+                "rejected": self.rejected,
+                "rehashed": self.rehashed,
+                "pool_restarts": self.pool_restarts,
+            }
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
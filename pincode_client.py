@@ -0,0 +1,186 @@
+import time
+import sqlite3
+import logging
+import threading
+from typing import Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+Coords = Tuple[float, float]
+
+
+# -------------------------------------------------
+# CIRCUIT BREAKER
+# -------------------------------------------------
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and rejects calls
+    for `reset_timeout` seconds. After that one trial call is let through
+    (half-open); its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial_in_flight or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+
+# -------------------------------------------------
+# PERSISTENT LOOKUP CACHE (SQLITE)
+# -------------------------------------------------
+class PincodeCache:
+    """PIN → coords cache with TTL; a NULL row is a cached 'not found'."""
+
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pincode_cache ("
+            " pincode TEXT PRIMARY KEY, lat REAL, lon REAL, expires_at REAL NOT NULL)"
+        )
+        self._lock = threading.Lock()
+
+    def get(self, pincode: str) -> Tuple[bool, Optional[Coords]]:
+        """(found, coords). found=True with coords=None is a negative entry."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT lat, lon, expires_at FROM pincode_cache WHERE pincode = ?",
+                (pincode,),
+            ).fetchone()
+        if row is None or row[2] <= time.time():
+            return False, None
+        if row[0] is None:
+            return True, None
+        return True, (row[0], row[1])
+
+    def put(self, pincode: str, coords: Optional[Coords], ttl: float):
+        lat, lon = coords if coords else (None, None)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pincode_cache (pincode, lat, lon, expires_at)"
+                " VALUES (?, ?, ?, ?)",
+                (pincode, lat, lon, time.time() + ttl),
+            )
+
+
+# -------------------------------------------------
+# PINCODE CLIENT
+# -------------------------------------------------
+class PincodeClient:
+    """
+    PIN code geocoder over api.postalpincode.in.
+
+    One pooled keep-alive session is shared by all requests; results (and
+    'not found' answers, for a shorter TTL) are cached in SQLite so they
+    survive restarts; transport errors trip a circuit breaker so an
+    upstream outage fails fast instead of holding workers for the timeout.
+    """
+
+    def __init__(
+        self,
+        base_url: str = "https://api.postalpincode.in",
+        cache_path: str = ":memory:",
+        ttl: float = 30 * 24 * 3600,
+        negative_ttl: float = 24 * 3600,
+        timeout: float = 5,
+        breaker: Optional[CircuitBreaker] = None,
+        pool_size: int = 10,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.timeout = timeout
+        self.breaker = breaker or CircuitBreaker()
+        self.cache = PincodeCache(cache_path)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def lookup(self, pincode: str) -> Optional[Coords]:
+        """Returns (lat, lon) or None if the PIN is unknown or lookup fails."""
+        try:
+            found, coords = self.cache.get(pincode)
+        except sqlite3.Error:
+            # A locked or broken cache only costs an API call.
+            logger.exception("PIN code cache read failed for %s", pincode)
+            found = False
+        if found:
+            return coords
+
+        if not self.breaker.allow():
+            logger.warning("PIN code API circuit open, skipping lookup for %s", pincode)
+            return None
+
+        try:
+            resp = self.session.get(f"{self.base_url}/pincode/{pincode}", timeout=self.timeout)
+            resp.raise_for_status()
+            # A malformed body (HTML error page, unexpected shape) is an
+            # upstream failure too: it counts for the breaker, isn't cached.
+            coords = _coords_from_response(resp.json())
+        except Exception:
+            self.breaker.record_failure()
+            logger.exception("PIN code geocoding failed for %s", pincode)
+            return None
+
+        self.breaker.record_success()
+        try:
+            self.cache.put(pincode, coords, self.ttl if coords else self.negative_ttl)
+        except sqlite3.Error:
+            logger.exception("PIN code cache write failed for %s", pincode)
+        return coords
+
+
+def _coords_from_response(data) -> Optional[Coords]:
+    """Coords from an API answer; raises if the answer has the wrong shape."""
+    if not data or data[0].get("Status") != "Success":
+        return None
+
+    # First post office with valid coords
+    for po in data[0].get("PostOffice") or []:
+        lat = po.get("Latitude")
+        lon = po.get("Longitude")
+        if lat and lon and lat != "NA" and lon != "NA":
+            try:
+                return float(lat), float(lon)
+            except ValueError:
+                continue
+    return None
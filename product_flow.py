@@ -0,0 +1,55 @@
+from typing import Iterator, Tuple
+
+# -------------------------------------------------
+# CHAT PRODUCT MENU
+# -------------------------------------------------
+# Category -> question, menu options and the search query each option maps to.
+PRODUCT_FLOW = {
+    "seeds": {
+        "question": "Which seed do you want?",
+        "options": ["Wheat Seeds", "Rice Seeds", "Corn Seeds"],
+        "filters": {
+            "wheat seeds": "wheat",
+            "rice seeds": "rice",
+            "corn seeds": "corn",
+        },
+    },
+    "fertilizers": {
+        "question": "Which fertilizer do you want?",
+        "options": ["Urea", "DAP", "NPK Fertilizer"],
+        "filters": {
+            "urea": "urea",
+            "dap": "dap",
+            "npk fertilizer": "npk",
+        },
+    },
+    "pesticides": {
+        "question": "Which pesticide do you want?",
+        "options": ["Neem Oil", "Chlorpyrifos", "Imidacloprid"],
+        "filters": {
+            "neem oil": "neem",
+            "chlorpyrifos": "chlorpyrifos",
+            "imidacloprid": "imidacloprid",
+        },
+    },
+}
+
+# The single priority a farmer picks in the chat.
+PREFERENCES = ("quality", "price", "distance", "quantity")
+
+
+def preference_levels(preference):
+    """Map the single chat preference onto the QQDP preference levels."""
+    return {
+        "quality": "high" if preference == "quality" else "average",
+        "price": "high" if preference == "price" else "average",
+        "distance": "high" if preference == "distance" else "average",
+        "quantity": "high" if preference == "quantity" else "average",
+    }
+
+
+def menu_products() -> Iterator[Tuple[str, str]]:
+    """(category, search query) for every menu option."""
+    for category, flow in PRODUCT_FLOW.items():
+        for query in flow["filters"].values():
+            yield category, query
@@ -0,0 +1,225 @@
+import re
+import bisect
+import unicodedata
+from collections import defaultdict
+from typing import Dict, FrozenSet, Iterable, List, Mapping, Optional, Sequence, Set, Tuple
+
+# Latin words, digit runs and Devanagari words (matras included).
+TOKEN_RE = re.compile(r"[a-z]+|\d+|[\u0900-\u097f]+")
+# Variety codes such as "HD-2967", "MTU 1010" or "IR64" also index as one token.
+CODE_RE = re.compile(r"([a-z]+)[\s-]?(\d+)")
+
+# -------------------------------------------------
+# VOCABULARY
+# -------------------------------------------------
+# Transliterated (and Devanagari) Hindi / Marathi names -> catalog token.
+SYNONYMS = {
+    "wheat": ["gehun", "gehu", "gehoon", "gahu", "gahoo", "गेहूं", "गेहूँ", "गहू"],
+    "rice": ["chawal", "chaval", "dhan", "dhaan", "paddy", "bhat", "tandul", "tandool",
+             "चावल", "धान", "तांदूळ", "भात"],
+    "corn": ["maize", "makka", "makki", "makai", "maka", "मक्का", "मका"],
+    "cotton": ["kapas", "kapus", "कपास", "कापूस"],
+    "soybean": ["soya", "soyabean", "सोयाबीन"],
+    "tomato": ["tamatar", "टमाटर", "टोमॅटो"],
+    "chilli": ["mirchi", "mirch", "chili", "मिर्च", "मिरची"],
+    "okra": ["bhindi", "bhendi", "भिंडी", "भेंडी"],
+    "urea": ["yuria", "yuriya", "यूरिया", "युरिया"],
+    "dap": ["diammonium", "डीएपी"],
+    "npk": ["एनपीके"],
+    "compost": ["khatmati", "कंपोस्ट"],
+    "neem": ["kadunimb", "kadulimb", "नीम", "कडुनिंब"],
+    "insecticide": ["keetnashak", "kitnashak", "kitaknashak", "कीटनाशक", "कीटकनाशक"],
+    "fungicide": ["fafundnashak", "फफूंदनाशक", "बुरशीनाशक"],
+    "herbicide": ["tannashak", "kharpatwarnashak", "तणनाशक", "खरपतवारनाशक"],
+}
+
+# Words that say "agriculture" but never narrow down a product.
+CATEGORY_WORDS = {
+    "seed", "seeds", "beej", "bij", "biyane", "biyana", "बीज", "बियाणे",
+    "fertilizer", "fertilizers", "fertiliser", "khad", "khaad", "khat", "खाद", "खत",
+    "pesticide", "pesticides", "dawa", "dawai", "aushadh", "दवा", "औषध",
+}
+
+CANONICAL = {variant: term for term, variants in SYNONYMS.items() for variant in variants}
+
+# Tokens shorter than this are matched exactly ("what" must not become "wheat").
+MIN_FUZZY_LENGTH = 5
+
+
+def normalize(text: str) -> str:
+    return unicodedata.normalize("NFC", text or "").lower()
+
+
+def tokenize(text: str) -> List[str]:
+    """Name/query tokens, with variety codes also joined ("hd-2967" -> "hd2967")."""
+    text = normalize(text)
+    tokens = TOKEN_RE.findall(text)
+    tokens += [letters + digits for letters, digits in CODE_RE.findall(text)]
+    return tokens
+
+
+def max_edits(token: str) -> int:
+    if len(token) < MIN_FUZZY_LENGTH or not token.isalpha():
+        return 0
+    return 1 if len(token) < 9 else 2
+
+
+def _deletes(token: str, edits: int) -> Set[str]:
+    out = {token}
+    frontier = {token}
+    for _ in range(edits):
+        frontier = {t[:i] + t[i + 1:] for t in frontier for i in range(len(t))}
+        out |= frontier
+    return out
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Optimal-string-alignment distance, or limit + 1 once it exceeds limit."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev2 = None
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if prev2 is not None and i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+        if min(cur) > limit:
+            return limit + 1
+        prev2, prev = prev, cur
+    return prev[-1]
+
+
+# -------------------------------------------------
+# INVERTED INDEX
+# -------------------------------------------------
+class ProductIndex:
+    """
+    Inverted index over item names: token -> item positions (catalog order).
+
+    A query token matches index tokens directly, through SYNONYMS, or, when
+    nothing matches exactly, within one or two edits (symmetric-delete
+    lookup, so no scan of the vocabulary). Recognised tokens are ANDed;
+    unknown and category words are ignored.
+    """
+
+    def __init__(self, items: Sequence[Mapping]):
+        postings: Dict[str, List[int]] = defaultdict(list)
+        for pos, item in enumerate(items):
+            for token in dict.fromkeys(tokenize(item.get("name", ""))):
+                postings[token].append(pos)
+        self.postings = dict(postings)
+        self.size = len(items)
+
+        # Synonyms of indexed tokens are searchable too.
+        self._terms: Set[str] = set()
+        self._deletes: Dict[str, Set[str]] = defaultdict(set)
+        self._add_terms(set(self.postings))
+
+    def _add_terms(self, tokens: Set[str]):
+        terms = tokens | {v for v, t in CANONICAL.items() if t in tokens}
+        for term in terms - self._terms:
+            for variant in _deletes(term, max_edits(term)):
+                self._deletes[variant].add(term)
+            self._terms.add(term)
+
+    def add(self, pos: int, item: Mapping):
+        """
+        Index one more item. pos must be above every indexed position, so
+        postings stay in catalog order. Removed items are not unindexed:
+        callers filter search results by liveness.
+        """
+        new_tokens = set()
+        for token in dict.fromkeys(tokenize(item.get("name", ""))):
+            if token not in self.postings:
+                new_tokens.add(token)
+            self.postings.setdefault(token, []).append(pos)
+        self.size = max(self.size, pos + 1)
+        if new_tokens:
+            self._add_terms(new_tokens)
+
+    def rename(self, pos: int, old_name: str, new_name: str):
+        """Re-index the item at pos under a new name; it keeps its position."""
+        old_tokens, new_tokens = set(tokenize(old_name)), set(tokenize(new_name))
+        for token in old_tokens - new_tokens:
+            postings = self.postings[token]
+            postings.remove(pos)
+            if not postings:
+                del self.postings[token]
+        unseen = set()
+        for token in new_tokens - old_tokens:
+            if token not in self.postings:
+                unseen.add(token)
+            bisect.insort(self.postings.setdefault(token, []), pos)
+        if unseen:
+            self._add_terms(unseen)
+
+    def resolve(self, token: str) -> FrozenSet[str]:
+        """Index tokens a query token stands for (empty if unknown)."""
+        if token in CATEGORY_WORDS:
+            return frozenset()
+        if token in self._terms:
+            return self._indexed({token})
+
+        edits = max_edits(token)
+        if not edits:
+            return frozenset()
+        candidates = set()
+        for variant in _deletes(token, edits):
+            candidates |= self._deletes.get(variant, set())
+        best = {}
+        for term in candidates:
+            distance = edit_distance(token, term, edits)
+            if distance <= edits:
+                best[term] = distance
+        if not best:
+            return frozenset()
+        closest = min(best.values())
+        return self._indexed({t for t, d in best.items() if d == closest})
+
+    def _indexed(self, terms: Set[str]) -> FrozenSet[str]:
+        # A synonym stands for its catalog token (and itself, if also indexed).
+        terms = terms | {CANONICAL[t] for t in terms if t in CANONICAL}
+        return frozenset(t for t in terms if t in self.postings)
+
+    def query_key(self, query: str) -> Tuple[FrozenSet[str], ...]:
+        """Canonical form of a query: one set of index tokens per recognised word."""
+        groups = []
+        for token in dict.fromkeys(tokenize(query)):
+            terms = self.resolve(token)
+            if terms and terms not in groups:
+                groups.append(terms)
+        return tuple(sorted(groups, key=sorted))
+
+    def search(self, query: str) -> List[int]:
+        """Positions of items matching every recognised word of query, in catalog order."""
+        return self.search_key(self.query_key(query))
+
+    def search_key(self, key: Tuple[FrozenSet[str], ...]) -> List[int]:
+        if not key:
+            return []
+        result: Optional[Set[int]] = None
+        for terms in key:
+            matches = set()
+            for term in terms:
+                matches.update(self.postings.get(term, ()))
+            result = matches if result is None else result & matches
+            if not result:
+                return []
+        return sorted(result)
+
+    def knows(self, token: str) -> bool:
+        return bool(self.resolve(token))
+
+
+def mentions_agri_term(text: str, indexes: Iterable[ProductIndex] = ()) -> bool:
+    """True if text names a category word, a known synonym or anything in the indexes."""
+    indexes = tuple(indexes)  # checked once per token; a generator would run dry
+    for token in tokenize(text):
+        if token in CATEGORY_WORDS or token in CANONICAL or token in SYNONYMS:
+            return True
+        if any(index.knows(token) for index in indexes):
+            return True
+    return False
@@ -0,0 +1,185 @@
+import sys
+import math
+import heapq
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from QQDP_scoring import (
+    MAX_DISTANCE_KM,
+    MIN_QUALITY,
+    MIN_QUANTITY_RATIO,
+    compute_quality,
+    haversine_km,
+    score_from_components,
+)
+
+# Float slack (km) on the cell radius; the exact per-request check decides.
+RADIUS_MARGIN_KM = 1e-3
+
+
+# -------------------------------------------------
+# CELL CANDIDATES
+# -------------------------------------------------
+class CellCandidates:
+    """
+    Items that can rank for any farmer inside one grid cell: within
+    MAX_DISTANCE_KM of some point of the cell and passing the quality and
+    quantity filters, in catalog order, with their farmer-independent
+    score components.
+    """
+
+    __slots__ = ("positions", "rows", "nbytes")
+
+    def __init__(self, positions: List[int], rows: List[Tuple]):
+        self.positions = positions
+        self.rows = rows
+        self.nbytes = (
+            sys.getsizeof(positions) + sys.getsizeof(rows) +
+            sum(sys.getsizeof(row) + 3 * 24 for row in rows)
+        )
+
+
+# -------------------------------------------------
+# RANKING CACHE (LRU, PER SNAPSHOT)
+# -------------------------------------------------
+class RankingCache:
+    """
+    Caches ranking candidates per (grid cell, product selection).
+
+    Farmers in the same cell share the candidate list, so a request skips
+    the spatial query, quality computation and price normalisation, and only
+    computes its own exact distances and final scores. The result is
+    identical to rank_items_topk for that farmer. Preference only weights
+    the final score, so one entry serves all four preferences.
+
+    Entries belong to one catalog snapshot; the cache empties itself when a
+    newer snapshot version is seen, and does not cache for older ones. Least recently used cells are evicted
+    beyond max_entries.
+    """
+
+    def __init__(self, max_entries: int = 4096, cell_deg: float = 0.01):
+        self.max_entries = max_entries
+        self.cell_deg = cell_deg
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.nbytes = 0
+        self._version: Optional[int] = None
+        self._entries: "OrderedDict[tuple, CellCandidates]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return math.floor(lat / self.cell_deg), math.floor(lon / self.cell_deg)
+
+    def candidates(self, snapshot, category: str, query: Optional[str], farmer: Tuple[float, float]) -> CellCandidates:
+        cell = self.cell(*farmer)
+        key = (snapshot.selection_key(category, query), cell)
+
+        with self._lock:
+            if self._version is not None and snapshot.version < self._version:
+                # A request still ranking an older snapshot: don't evict for it.
+                self.misses += 1
+                return cell_candidates(snapshot, category, query, cell, self.cell_deg)
+            if snapshot.version != self._version:
+                if self._entries:
+                    self.invalidations += 1
+                self._entries.clear()
+                self.nbytes = 0
+                self._version = snapshot.version
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        # Built outside the lock; a concurrent duplicate build is harmless.
+        entry = cell_candidates(snapshot, category, query, cell, self.cell_deg)
+        with self._lock:
+            if snapshot.version == self._version and key not in self._entries:
+                self._entries[key] = entry
+                self.nbytes += entry.nbytes
+                while len(self._entries) > self.max_entries:
+                    _, evicted = self._entries.popitem(last=False)
+                    self.nbytes -= evicted.nbytes
+                    self.evictions += 1
+        return entry
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "cell_deg": self.cell_deg,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "approx_bytes": self.nbytes,
+            }
+
+
+def cell_geometry(cell: Tuple[int, int], cell_deg: float) -> Tuple[Tuple[float, float], float]:
+    """Centre of a grid cell and the great-circle distance to its farthest corner."""
+    lat_lo, lon_lo = cell[0] * cell_deg, cell[1] * cell_deg
+    lat_hi, lon_hi = lat_lo + cell_deg, lon_lo + cell_deg
+    center = ((lat_lo + lat_hi) / 2, (lon_lo + lon_hi) / 2)
+    half_diagonal = max(
+        haversine_km(center[0], center[1], lat, lon)
+        for lat in (lat_lo, lat_hi) for lon in (lon_lo, lon_hi)
+    )
+    return center, half_diagonal
+
+
+def cell_candidates(snapshot, category: str, query: Optional[str], cell: Tuple[int, int], cell_deg: float) -> CellCandidates:
+    """Candidates (see CellCandidates) of a product selection for one cell."""
+    items, seller_index = snapshot.select(category, query)
+    if not items:
+        return CellCandidates([], [])
+
+    center, half_diagonal = cell_geometry(cell, cell_deg)
+    # Any farmer in the cell is within half_diagonal of the centre, so by
+    # the triangle inequality every seller they can reach is within
+    # MAX_DISTANCE_KM + half_diagonal of it.
+    radius = MAX_DISTANCE_KM + half_diagonal + RADIUS_MARGIN_KM
+
+    prices = [i["price"] for i in items]
+    price_min, price_max = min(prices), max(prices)
+
+    positions, rows = [], []
+    for pos in seller_index.query(center[0], center[1], radius):
+        item = items[pos]
+        if haversine_km(center[0], center[1], item["seller_lat"], item["seller_lon"]) > radius:
+            continue
+        quality = compute_quality(item)
+        quantity = min(item["available_qty"] / item["required_qty"], 1)
+        if quality < MIN_QUALITY or quantity < MIN_QUANTITY_RATIO:
+            continue
+        price_score = 1 if price_max == price_min else (
+            (price_max - item["price"]) / (price_max - price_min)
+        )
+        positions.append(pos)
+        rows.append((item, quality, quantity, price_score))
+    return CellCandidates(positions, rows)
+
+
+def rank_candidates(
+    entry: CellCandidates,
+    preference: Dict[str, str],
+    farmer: Tuple[float, float],
+    k: int
+) -> List[Dict]:
+    """rank_items_topk over a cell's candidates, with exact distances for this farmer."""
+    if k <= 0:
+        return []
+    scored = []
+    for item, quality, quantity, price_score in entry.rows:
+        distance_km = haversine_km(farmer[0], farmer[1], item["seller_lat"], item["seller_lon"])
+        result = score_from_components(item, distance_km, quality, quantity, price_score, preference)
+        if result:
+            scored.append(result)
+    return heapq.nlargest(k, scored, key=lambda x: x["final_score"])
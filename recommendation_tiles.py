@@ -0,0 +1,312 @@
+"""
+Precomputed recommendation tiles.
+
+Build offline from the catalog the app serves, then point RECOMMENDATION_TILES_PATH
+at the output:
+
+    python -m recommendation_tiles build list_material.json recommendation.tiles
+    python -m recommendation_tiles check recommendation.tiles list_material.json
+"""
+import sys
+import json
+import math
+import heapq
+import random
+import struct
+import argparse
+from array import array
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from QQDP_scoring import MAX_DISTANCE_KM, compute_weights, haversine_km, qqdp_score, rank_items_topk
+from product_flow import PREFERENCES, menu_products, preference_levels
+from ranking_cache import RADIUS_MARGIN_KM, cell_candidates, cell_geometry
+
+MAGIC = b"KSTILE\x00\x01"
+FORMAT_VERSION = 1
+KM_PER_DEG_LAT = 111.32
+
+# A seller is dropped from a tile only if its best possible score in the
+# cell is this far below the k-th best guaranteed score, which is more than
+# final_score's 3-decimal rounding can bridge.
+SCORE_MARGIN = 1e-3
+
+_PREFIX = struct.Struct("<8sQ")
+_RECORD = struct.Struct("<iiBBI")
+
+TileKey = Tuple[int, int, int, int]
+
+
+# -------------------------------------------------
+# PRUNING (PER CELL x PRODUCT x PREFERENCE)
+# -------------------------------------------------
+def prune_candidates(entry, center, half_diagonal: float, preference: Dict[str, str], k: int) -> List[int]:
+    """
+    Positions (catalog order) that can reach the top k for some farmer in
+    the cell.
+
+    Distance to a seller varies by at most half_diagonal across the cell,
+    which bounds each score from below and above. A seller whose upper
+    bound trails the k-th best lower bound (of sellers in range from the
+    whole cell) can never make the top k.
+    """
+    wQ, wQt, wD, wP = compute_weights(preference)
+    bounds = []
+    for pos, (item, quality, quantity, price_score) in zip(entry.positions, entry.rows):
+        d = haversine_km(center[0], center[1], item["seller_lat"], item["seller_lon"])
+        d_min = max(0.0, d - half_diagonal - RADIUS_MARGIN_KM)
+        d_max = d + half_diagonal + RADIUS_MARGIN_KM
+        if d_min > MAX_DISTANCE_KM:
+            continue
+        static = wQ * quality + wQt * quantity + wP * price_score
+        high = static + wD * max(0, 1 - d_min / MAX_DISTANCE_KM)
+        low = static + wD * max(0, 1 - d_max / MAX_DISTANCE_KM) if d_max <= MAX_DISTANCE_KM else None
+        bounds.append((pos, high, low))
+
+    guaranteed = [low for _, _, low in bounds if low is not None]
+    if len(guaranteed) < k:
+        return [pos for pos, _, _ in bounds]
+    kth_low = heapq.nlargest(k, guaranteed)[-1]
+    return [pos for pos, high, _ in bounds if high + SCORE_MARGIN >= kth_low]
+
+
+# -------------------------------------------------
+# BUILD
+# -------------------------------------------------
+def catalog_bbox(snapshot, margin_km: float = MAX_DISTANCE_KM) -> Tuple[float, float, float, float]:
+    """(lat_min, lon_min, lat_max, lon_max) around every seller, padded by margin_km."""
+    lats, lons = [], []
+    for items in snapshot.categories.values():
+        for item in items:
+            lats.append(item["seller_lat"])
+            lons.append(item["seller_lon"])
+    if not lats:
+        raise ValueError("catalog has no sellers")
+    dlat = margin_km / KM_PER_DEG_LAT
+    mid = math.radians((min(lats) + max(lats)) / 2)
+    dlon = margin_km / (KM_PER_DEG_LAT * max(math.cos(mid), 0.01))
+    return (
+        max(min(lats) - dlat, -90), max(min(lons) - dlon, -180),
+        min(max(lats) + dlat, 90), min(max(lons) + dlon, 180),
+    )
+
+
+def build_tiles(
+    snapshot,
+    out_path: str,
+    products: Optional[Sequence[Tuple[str, str]]] = None,
+    cell_deg: float = 0.05,
+    k: int = 6,
+    bbox: Optional[Tuple[float, float, float, float]] = None,
+    progress=None
+) -> Dict:
+    products = list(products or menu_products())
+    lat_min, lon_min, lat_max, lon_max = bbox or catalog_bbox(snapshot)
+    rows = range(math.floor(lat_min / cell_deg), math.floor(lat_max / cell_deg) + 1)
+    cols = range(math.floor(lon_min / cell_deg), math.floor(lon_max / cell_deg) + 1)
+
+    header_products = []
+    for category, query in products:
+        items = snapshot.select(category, query)[0]
+        prices = [item["price"] for item in items]
+        header_products.append([category, query, min(prices) if prices else 0, max(prices) if prices else 0])
+
+    levels = [preference_levels(p) for p in PREFERENCES]
+    records = []
+    for n, row in enumerate(rows):
+        for col in cols:
+            cell = (row, col)
+            center, half_diagonal = cell_geometry(cell, cell_deg)
+            for product, (category, query) in enumerate(products):
+                entry = cell_candidates(snapshot, category, query, cell, cell_deg)
+                if not entry.rows:
+                    continue
+                for pref, level in enumerate(levels):
+                    positions = prune_candidates(entry, center, half_diagonal, level, k)
+                    records.append((row, col, product, pref, positions))
+        if progress:
+            progress(n + 1, len(rows))
+
+    header = {
+        "version": FORMAT_VERSION,
+        "catalog_digest": snapshot.digest,
+        "cell_deg": cell_deg,
+        "k": k,
+        "bbox": [lat_min, lon_min, lat_max, lon_max],
+        "products": header_products,
+        "preferences": list(PREFERENCES),
+        "tiles": len(records),
+    }
+    header_bytes = json.dumps(header).encode("utf-8")
+    with open(out_path, "wb") as f:
+        f.write(_PREFIX.pack(MAGIC, len(header_bytes)))
+        f.write(header_bytes)
+        for row, col, product, pref, positions in records:
+            f.write(_RECORD.pack(row, col, product, pref, len(positions)))
+            f.write(array("I", positions).tobytes())
+    return header
+
+
+# -------------------------------------------------
+# LOOKUP
+# -------------------------------------------------
+class RecommendationTiles:
+    """
+    Tiles loaded into memory: (cell, product, preference) -> the few
+    candidate positions that can make the top k there.
+
+    rank() scores only those candidates, exactly, for the requesting farmer,
+    so the answer equals rank_items_topk. It returns None (caller ranks
+    live) when the tiles were built from another catalog version, the cell
+    or product was not tiled, or more than k items are asked for.
+    """
+
+    def __init__(self, header: Dict, tiles: Dict[TileKey, array]):
+        self.header = header
+        self.tiles = tiles
+        self.digest = header["catalog_digest"]
+        self.cell_deg = header["cell_deg"]
+        self.k = header["k"]
+        self.products = {
+            (category, query): (n, price_min, price_max)
+            for n, (category, query, price_min, price_max) in enumerate(header["products"])
+        }
+        self.preferences = {p: n for n, p in enumerate(header["preferences"])}
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+
+    @classmethod
+    def load(cls, path: str) -> "RecommendationTiles":
+        with open(path, "rb") as f:
+            raw = f.read()
+        magic, header_len = _PREFIX.unpack_from(raw, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path}: not a recommendation tiles file")
+        offset = _PREFIX.size
+        header = json.loads(raw[offset:offset + header_len])
+        if header.get("version") != FORMAT_VERSION:
+            raise ValueError(f"{path}: unsupported tiles version")
+        offset += header_len
+
+        tiles: Dict[TileKey, array] = {}
+        for _ in range(header["tiles"]):
+            row, col, product, pref, count = _RECORD.unpack_from(raw, offset)
+            offset += _RECORD.size
+            positions = array("I")
+            positions.frombytes(raw[offset:offset + 4 * count])
+            offset += 4 * count
+            tiles[(row, col, product, pref)] = positions
+        return cls(header, tiles)
+
+    def cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return math.floor(lat / self.cell_deg), math.floor(lon / self.cell_deg)
+
+    def rank(self, snapshot, category: str, query: str, preference: str, farmer: Tuple[float, float], k: int) -> Optional[List[Dict]]:
+        if snapshot.digest != self.digest:
+            self.stale += 1
+            return None
+        product = self.products.get((category, query))
+        pref = self.preferences.get(preference)
+        if product is None or pref is None or k > self.k:
+            self.misses += 1
+            return None
+        positions = self.tiles.get((*self.cell(*farmer), product[0], pref))
+        if positions is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        items = snapshot.select(category, query)[0]
+        levels = preference_levels(preference)
+        scored = []
+        for pos in positions:
+            result = qqdp_score(items[pos], product[1], product[2], levels, farmer)
+            if result:
+                scored.append(result)
+        return heapq.nlargest(k, scored, key=lambda x: x["final_score"])
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses + self.stale
+        return {
+            "tiles": len(self.tiles),
+            "k": self.k,
+            "cell_deg": self.cell_deg,
+            "fresh_for": self.digest,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+# -------------------------------------------------
+# CHECK (TILES vs LIVE RANKING)
+# -------------------------------------------------
+def check_tiles(tiles: RecommendationTiles, snapshot, samples: int = 1000, seed: int = 0) -> List[Dict]:
+    """Compare tile answers with live rank_items_topk at random farmer positions."""
+    if snapshot.digest != tiles.digest:
+        return [{"error": "tiles were built from a different catalog version"}]
+
+    rng = random.Random(seed)
+    keys = list(tiles.tiles)
+    products = {n: (category, query) for (category, query), (n, _, _) in tiles.products.items()}
+    preferences = {n: p for p, n in tiles.preferences.items()}
+    mismatches = []
+    for _ in range(min(samples, len(keys) * 50) if keys else 0):
+        row, col, product, pref = rng.choice(keys)
+        farmer = ((row + rng.random()) * tiles.cell_deg, (col + rng.random()) * tiles.cell_deg)
+        category, query = products[product]
+        items, seller_index = snapshot.select(category, query)
+        k = rng.randint(1, tiles.k)
+        live = rank_items_topk(items, preference_levels(preferences[pref]), k, farmer, seller_index)
+        tiled = tiles.rank(snapshot, category, query, preferences[pref], farmer, k)
+        if tiled != live:
+            mismatches.append({"farmer": farmer, "product": [category, query], "preference": preferences[pref], "k": k})
+    return mismatches
+
+
+def _load_snapshot(path: str):
+    from catalog_store import CatalogStore
+
+    return CatalogStore(path).snapshot()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="sweep the catalog area and write tiles")
+    build.add_argument("catalog", help="catalog served by the app (JSON or compiled)")
+    build.add_argument("output")
+    build.add_argument("--cell-deg", type=float, default=0.05, help="cell size in degrees (0.05 ~ 5 km)")
+    build.add_argument("--k", type=int, default=6, help="largest top-k answered from tiles")
+    build.add_argument("--bbox", help="lat_min,lon_min,lat_max,lon_max (default: whole catalog area)")
+
+    check = sub.add_parser("check", help="verify tiles against live ranking")
+    check.add_argument("tiles")
+    check.add_argument("catalog")
+    check.add_argument("--samples", type=int, default=2000)
+    check.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    snapshot = _load_snapshot(args.catalog)
+    if args.command == "build":
+        bbox = tuple(float(v) for v in args.bbox.split(",")) if args.bbox else None
+        header = build_tiles(
+            snapshot, args.output, cell_deg=args.cell_deg, k=args.k, bbox=bbox,
+            progress=lambda done, total: print(f"\rrows {done}/{total}", end="", file=sys.stderr),
+        )
+        print(file=sys.stderr)
+        print(f"Wrote {header['tiles']} tiles to {args.output}")
+        return 0
+
+    tiles = RecommendationTiles.load(args.tiles)
+    mismatches = check_tiles(tiles, snapshot, args.samples, args.seed)
+    for mismatch in mismatches[:20]:
+        print(f"MISMATCH {json.dumps(mismatch)}", file=sys.stderr)
+    print(f"{len(mismatches)} mismatches")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
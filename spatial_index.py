@@ -0,0 +1,144 @@
+import math
+import bisect
+from collections import defaultdict
+from typing import Dict, List, Mapping, Sequence, Tuple
+
+EARTH_RADIUS_KM = 6371
+
+# Slack (degrees) added around the bounding box so float rounding can never
+# drop a seller that the exact haversine check would keep (~1 cm).
+BOX_MARGIN_DEG = 1e-7
+
+
+# -------------------------------------------------
+# BOUNDING BOX FOR A RADIUS
+# -------------------------------------------------
+def bounding_box(
+    lat: float, lon: float, radius_km: float
+) -> Tuple[float, float, List[Tuple[float, float]]]:
+    """
+    Smallest lat/lon box containing every point within radius_km
+    (great-circle) of (lat, lon).
+
+    Returns (lat_min, lat_max, lon_ranges). lon_ranges has two entries when
+    the box crosses the antimeridian and covers all longitudes near a pole.
+    """
+    angular = radius_km / EARTH_RADIUS_KM
+    lat_r = math.radians(lat)
+    lat_min = math.degrees(lat_r - angular) - BOX_MARGIN_DEG
+    lat_max = math.degrees(lat_r + angular) + BOX_MARGIN_DEG
+
+    if lat_min <= -90 or lat_max >= 90 or angular >= math.pi / 2:
+        return max(lat_min, -90), min(lat_max, 90), [(-180.0, 180.0)]
+
+    dlon = math.degrees(math.asin(min(math.sin(angular) / math.cos(lat_r), 1.0)))
+    lon_min = lon - dlon - BOX_MARGIN_DEG
+    lon_max = lon + dlon + BOX_MARGIN_DEG
+
+    if lon_min < -180:
+        return lat_min, lat_max, [(lon_min + 360, 180.0), (-180.0, lon_max)]
+    if lon_max > 180:
+        return lat_min, lat_max, [(lon_min, 180.0), (-180.0, lon_max - 360)]
+    return lat_min, lat_max, [(lon_min, lon_max)]
+
+
+# -------------------------------------------------
+# GRID INDEX OVER SELLER POSITIONS
+# -------------------------------------------------
+class GridIndex:
+    """
+    Buckets items by (seller_lat, seller_lon) into fixed-size degree cells.
+
+    query() returns item positions (in input order) whose seller lies in the
+    bounding box of the search radius. It is a superset of the items within
+    the radius, so callers still apply the exact distance check.
+    """
+
+    def __init__(self, items: Sequence[Mapping], cell_deg: float = 0.25):
+        self._build(
+            [item["seller_lat"] for item in items],
+            [item["seller_lon"] for item in items],
+            cell_deg,
+        )
+
+    @classmethod
+    def from_coords(
+        cls, lats: Sequence[float], lons: Sequence[float], cell_deg: float = 0.25
+    ) -> "GridIndex":
+        """Index over coordinate columns (e.g. memory-mapped), without copying them."""
+        index = cls.__new__(cls)
+        index._build(lats, lons, cell_deg)
+        return index
+
+    def _build(self, lats: Sequence[float], lons: Sequence[float], cell_deg: float):
+        self.cell_deg = cell_deg
+        self.size = len(lats)
+        self._lats = lats
+        self._lons = lons
+
+        cells: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+        for pos, (lat, lon) in enumerate(zip(self._lats, self._lons)):
+            cells[self._cell(lat, lon)].append(pos)
+        self._cells = dict(cells)
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return math.floor(lat / self.cell_deg), math.floor(lon / self.cell_deg)
+
+    def add(self, lat: float, lon: float) -> int:
+        """Index one more seller (list-backed indexes only); returns its position."""
+        pos = self.size
+        self._lats.append(lat)
+        self._lons.append(lon)
+        self._cells.setdefault(self._cell(lat, lon), []).append(pos)
+        self.size += 1
+        return pos
+
+    def move(self, pos: int, lat: float, lon: float):
+        """Re-index pos at a new seller location (list-backed indexes only)."""
+        cell = self._cell(self._lats[pos], self._lons[pos])
+        bucket = self._cells[cell]
+        bucket.remove(pos)
+        if not bucket:
+            del self._cells[cell]
+        self._lats[pos] = lat
+        self._lons[pos] = lon
+        bisect.insort(self._cells.setdefault(self._cell(lat, lon), []), pos)
+
+    def remove(self, pos: int):
+        """Stop returning pos: a NaN latitude fails every box check."""
+        self._lats[pos] = math.nan
+
+    def query(self, lat: float, lon: float, radius_km: float) -> List[int]:
+        lat_min, lat_max, lon_ranges = bounding_box(lat, lon, radius_km)
+        row_lo = math.floor(lat_min / self.cell_deg)
+        row_hi = math.floor(lat_max / self.cell_deg)
+
+        found = []
+        for lon_lo, lon_hi in lon_ranges:
+            col_lo = math.floor(lon_lo / self.cell_deg)
+            col_hi = math.floor(lon_hi / self.cell_deg)
+
+            if (row_hi - row_lo + 1) * (col_hi - col_lo + 1) > len(self._cells):
+                # Huge radius: walking the occupied cells is cheaper.
+                # Snapshot the cells: add() may insert one concurrently.
+                cell_iter = (
+                    bucket for (row, col), bucket in list(self._cells.items())
+                    if row_lo <= row <= row_hi and col_lo <= col <= col_hi
+                )
+            else:
+                cell_iter = (
+                    self._cells.get((row, col), ())
+                    for row in range(row_lo, row_hi + 1)
+                    for col in range(col_lo, col_hi + 1)
+                )
+
+            for bucket in cell_iter:
+                for pos in bucket:
+                    if (
+                        lat_min <= self._lats[pos] <= lat_max and
+                        lon_lo <= self._lons[pos] <= lon_hi
+                    ):
+                        found.append(pos)
+
+        # Keep catalog order so ties rank exactly as in a full scan.
+        return sorted(set(found)) if len(lon_ranges) > 1 else sorted(found)
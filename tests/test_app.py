@@ -0,0 +1,169 @@
+import pytest
+
+app = pytest.importorskip("app")
+
+
+FARMER = {"lat": 19.1070, "lon": 72.8400}
+SELECTIONS = [
+    ("seeds", "rice seeds", "price"),
+    ("seeds", "gehun", "quality"),
+    ("fertilizers", "urea", "distance"),
+    ("pesticides", "neem oil", "quantity"),
+]
+
+
+@pytest.fixture
+def client():
+    return app.app.test_client()
+
+
+@pytest.fixture
+def farmer(client, monkeypatch):
+    """A logged-in client; template replies instead of Gemini, no rate limits."""
+    monkeypatch.setattr(app, "model", None)
+    monkeypatch.setattr(app.limiter, "enabled", False)
+    with client.session_transaction() as session:
+        session["user_email"] = "farmer@example.com"
+    return client
+
+
+def chat_flow(client, category, product, preference):
+    """The chat stage machine, start to finish; returns the last response."""
+    assert client.get("/chat/start").status_code == 200
+    assert client.post("/chat/location", json=FARMER).get_json()["stage"] == "ASK_CATEGORY"
+    assert client.post("/chat", json={"stage": "ASK_CATEGORY", "message": category}).get_json()["stage"] == "ASK_PRODUCT"
+    assert client.post("/chat", json={"stage": "ASK_PRODUCT", "message": product}).get_json()["stage"] == "ASK_PREFERENCE"
+    return client.post("/chat", json={"stage": "ASK_PREFERENCE", "message": preference})
+
+
+@pytest.mark.parametrize("path", ["/metrics", "/stats"])
+def test_ops_endpoints_hidden_without_token(client, monkeypatch, path):
+    monkeypatch.setattr(app, "METRICS_TOKEN", None)
+    monkeypatch.setattr(app.metrics, "enabled", True)
+    assert client.get(path).status_code == 404
+    assert client.get(path, headers={"Authorization": "Bearer "}).status_code == 404
+
+
+@pytest.mark.parametrize("path", ["/metrics", "/stats"])
+def test_ops_endpoints_need_the_token(client, monkeypatch, path):
+    monkeypatch.setattr(app, "METRICS_TOKEN", "s3cret")
+    monkeypatch.setattr(app.metrics, "enabled", True)
+    assert client.get(path).status_code == 401
+    assert client.get(path, headers={"Authorization": "Bearer wrong"}).status_code == 401
+    assert client.get(path, headers={"Authorization": "Bearer s3cret"}).status_code == 200
+
+
+def test_metrics_still_need_instrumentation(client, monkeypatch):
+    monkeypatch.setattr(app, "METRICS_TOKEN", "s3cret")
+    monkeypatch.setattr(app.metrics, "enabled", False)
+    assert client.get("/metrics", headers={"Authorization": "Bearer s3cret"}).status_code == 404
+    app.catalog.snapshot()
+    stats = client.get("/stats", headers={"Authorization": "Bearer s3cret"}).get_json()
+    assert stats["catalog"]["items"] > 0
+
+
+def batch_member(category, product, preference, **extra):
+    return {**FARMER, "category": category, "product": product, "preference": preference, **extra}
+
+
+def test_batch_matches_chat_rankings(farmer):
+    members = [batch_member(*selection, id=f"m{n}") for n, selection in enumerate(SELECTIONS)]
+    response = farmer.post("/api/rank/batch", json={"k": app.RESULTS_PAGE_SIZE, "requests": members})
+    assert response.status_code == 200
+    results = response.get_json()["results"]
+    assert [result["id"] for result in results] == ["m0", "m1", "m2", "m3"]
+    for selection, result in zip(SELECTIONS, results):
+        chat = chat_flow(farmer, *selection).get_json()
+        assert chat["stage"] == "DONE" and chat["ranked_items"]
+        assert result["ranked_items"] == chat["ranked_items"]
+
+
+@pytest.mark.parametrize("body, error", [
+    ({"requests": []}, "requests must be a non-empty list."),
+    ({"requests": {"lat": 19.1}}, "requests must be a non-empty list."),
+    ({"requests": [batch_member(*SELECTIONS[0])] * 3}, "At most 2 requests per batch."),
+    ({"k": 0, "requests": [batch_member(*SELECTIONS[0])]}, "k must be between 1 and 20."),
+    ({"k": True, "requests": [batch_member(*SELECTIONS[0])]}, "k must be between 1 and 20."),
+])
+def test_batch_rejects_bad_requests(farmer, monkeypatch, body, error):
+    monkeypatch.setattr(app, "BATCH_MAX_REQUESTS", 2)
+    response = farmer.post("/api/rank/batch", json=body)
+    assert response.status_code == 400
+    assert response.get_json()["error"] == error
+
+
+def test_batch_reports_invalid_members_individually(farmer):
+    no_location = {k: v for k, v in batch_member(*SELECTIONS[0]).items() if k not in ("lat", "lon")}
+    members = [
+        no_location,
+        batch_member("seeds", "", "price"),
+        batch_member(*SELECTIONS[2], id="ok"),
+        batch_member("tractors", "rice seeds", "price"),
+        "not an object",
+    ]
+    results = farmer.post("/api/rank/batch", json={"requests": members}).get_json()["results"]
+    assert results[0] == {"id": 0, "error": "Invalid location coordinates."}
+    assert results[1]["error"].startswith("product is required")
+    assert results[2]["id"] == "ok" and "error" not in results[2] and results[2]["ranked_items"]
+    assert results[3]["error"].startswith("category must be one of")
+    assert results[4] == {"id": 4, "error": "Each request must be an object."}
+
+
+def test_batch_needs_login(client):
+    response = client.post("/api/rank/batch", json={"requests": [batch_member(*SELECTIONS[0])]})
+    assert response.status_code == 401
+
+
+@pytest.mark.parametrize("category, product, preference", SELECTIONS)
+def test_recommend_matches_chat(farmer, category, product, preference):
+    chat = chat_flow(farmer, category, product, preference)
+    response = farmer.post("/api/recommend", json=batch_member(category, product, preference))
+    assert response.status_code == chat.status_code == 200
+    assert response.get_json() == chat.get_json()
+    assert response.get_json()["ranked_items"]
+
+
+def test_recommend_by_place_name_matches_chat(farmer):
+    farmer.get("/chat/start")
+    reply = farmer.post("/chat", json={"stage": "ASK_LOCATION_TEXT", "message": "pune"}).get_json()
+    assert reply["stage"] == "ASK_CATEGORY"
+    farmer.post("/chat", json={"stage": "ASK_CATEGORY", "message": "fertilizers"})
+    farmer.post("/chat", json={"stage": "ASK_PRODUCT", "message": "dap"})
+    chat = farmer.post("/chat", json={"stage": "ASK_PREFERENCE", "message": "price"}).get_json()
+
+    body = {"location": "Pune", "category": "fertilizers", "product": "dap", "preference": "price"}
+    assert farmer.post("/api/recommend", json=body).get_json() == chat
+
+
+def test_recommend_keeps_the_chat_session(farmer):
+    chat_flow(farmer, *SELECTIONS[0])
+    with farmer.session_transaction() as session:
+        before = dict(session)
+    farmer.post("/api/recommend", json={**batch_member(*SELECTIONS[2]), "lat": 18.52, "lon": 73.85})
+    with farmer.session_transaction() as session:
+        assert dict(session) == before
+
+
+@pytest.mark.parametrize("body, status, error", [
+    ({"category": "seeds", "product": "rice seeds", "preference": "price"}, 400, "Invalid location coordinates."),
+    ({**FARMER, "lat": 91, "category": "seeds", "product": "rice seeds", "preference": "price"}, 400,
+     "Coordinates out of range. Latitude must be -90 to 90, longitude -180 to 180."),
+    ({"location": "hello", "category": "seeds", "product": "rice seeds", "preference": "price"}, 404,
+     "Couldn't find that location. Please enter a 6-digit PIN code or a city name (e.g. Mumbai, Pune, Nagpur)."),
+    ({**FARMER, "product": "rice seeds", "preference": "price"}, 400,
+     "category must be one of: seeds, fertilizers, pesticides"),
+    ({**FARMER, "category": "seeds", "preference": "price"}, 400,
+     "product is required, e.g. one of: Wheat Seeds, Rice Seeds, Corn Seeds"),
+    ({**FARMER, "category": "seeds", "product": "rice seeds", "preference": "colour"}, 400,
+     "preference must be one of: quality, price, distance, quantity."),
+    ({**FARMER, "category": "seeds", "product": "rice seeds", "preference": "price", "limit": 21}, 400,
+     "limit must be between 1 and 20."),
+])
+def test_recommend_rejects_bad_requests(farmer, body, status, error):
+    response = farmer.post("/api/recommend", json=body)
+    assert response.status_code == status
+    assert response.get_json()["error"] == error
+
+
+def test_recommend_needs_login(client):
+    assert client.post("/api/recommend", json=batch_member(*SELECTIONS[0])).status_code == 401
@@ -0,0 +1,65 @@
+import json
+import asyncio
+
+import pytest
+
+asgi = pytest.importorskip("asgi")
+
+
+def call(app, method, path, chunks, headers=()):
+    messages = [{"type": "http.request", "body": chunk, "more_body": n < len(chunks) - 1}
+                for n, chunk in enumerate(chunks)]
+    sent = []
+
+    async def receive():
+        return messages.pop(0) if messages else {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": method, "path": path, "query_string": b"",
+             "headers": [(k.encode(), v.encode()) for k, v in headers]}
+    asyncio.run(app(scope, receive, send))
+    status = sent[0]["status"]
+    body = b"".join(m.get("body", b"") for m in sent[1:])
+    return status, body, len(messages)
+
+
+@pytest.fixture
+def app():
+    server = asgi.KisanSevakASGI(asgi.kisansevak.app, threads=2, max_body=1000)
+    yield server
+    server.executor.shutdown(wait=True)
+
+
+def test_declared_length_over_limit_is_rejected_unread(app):
+    status, body, unread = call(app, "POST", "/api/recommend", [b"x" * 600, b"x" * 600],
+                                headers=[("content-length", "1200"), ("content-type", "application/json")])
+    assert status == 413
+    assert json.loads(body) == {"error": "Request body too large."}
+    assert unread == 2
+
+
+def test_streamed_body_over_limit_is_rejected(app):
+    status, _, unread = call(app, "POST", "/api/recommend", [b"x" * 600, b"x" * 600, b"x" * 600])
+    assert status == 413
+    assert unread == 1
+
+
+def test_body_within_limit_reaches_flask(app):
+    payload = json.dumps({"email": "nobody@example.com", "password": "x"}).encode()
+    status, body, _ = call(app, "POST", "/auth/login", [payload],
+                           headers=[("content-length", str(len(payload))), ("content-type", "application/json")])
+    assert status == 401
+    assert b"Invalid email or password" in body
+
+
+
+def test_chunked_body_without_content_length_reaches_flask():
+    from werkzeug.wrappers import Request
+
+    payload = json.dumps({"email": "a@example.com"}).encode()
+    scope = {"type": "http", "method": "POST", "path": "/auth/login", "query_string": b"",
+             "headers": [(b"transfer-encoding", b"chunked"), (b"content-type", b"application/json")]}
+    request = Request(asgi.build_environ(scope, payload))
+    assert request.get_json() == {"email": "a@example.com"}
@@ -0,0 +1,107 @@
+import os
+import json
+import shutil
+import itertools
+
+import pytest
+
+from benchmarks.synthetic_catalog import DEFAULT_FARMER
+from catalog_binary import BinaryCatalog, compile_json_file
+from catalog_store import CatalogStore
+from QQDP_scoring import rank_items
+
+MATERIALS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "list_material.json")
+LEVELS = ("low", "average", "high")
+PREFERENCES = [
+    dict(zip(("quality", "quantity", "distance", "price"), levels))
+    for levels in itertools.product(LEVELS, repeat=4)
+]
+
+
+@pytest.fixture
+def compiled(tmp_path):
+    pytest.importorskip("numpy")  # compiling needs NumPy
+    source = str(tmp_path / "list_material.json")
+    shutil.copy(MATERIALS, source)
+    path = str(tmp_path / "list_material.kscat")
+    compile_json_file(source, path)
+    return path, source
+
+
+def test_round_trip_matches_json_store(compiled):
+    path, source = compiled
+    binary = CatalogStore(path, source).snapshot()
+    plain = CatalogStore(source).snapshot()
+    assert binary.binary is not None
+
+    with open(MATERIALS) as f:
+        data = json.load(f)
+    assert set(binary.categories) == set(data)
+    for category, source_items in data.items():
+        assert [dict(item) for item in binary.get(category)] == source_items
+        for query in (None, "rice", "urea"):
+            items, index = binary.select(category, query)
+            expected_items, expected_index = plain.select(category, query)
+            assert [dict(item) for item in items] == [dict(item) for item in expected_items]
+            if not items:
+                continue
+            for preference in PREFERENCES:
+                assert rank_items(items, preference, DEFAULT_FARMER, index) == rank_items(
+                    expected_items, preference, DEFAULT_FARMER, expected_index
+                )
+
+
+def test_numpy_engine_matches_json_store(compiled):
+    from QQDP_numpy import rank_items_numpy
+
+    path, source = compiled
+    binary = CatalogStore(path, source).snapshot()
+    plain = CatalogStore(source).snapshot()
+    for category in plain.categories:
+        for query in (None, "rice", "urea"):
+            expected_items = plain.select(category, query)[0]
+            if not expected_items:
+                continue
+            for preference in PREFERENCES:
+                expected = rank_items(expected_items, preference, DEFAULT_FARMER)
+                assert rank_items_numpy(binary.columns(category, query), preference, DEFAULT_FARMER) == expected
+                assert rank_items_numpy(plain.columns(category, query), preference, DEFAULT_FARMER) == expected
+
+
+def test_stale_catalog_is_rejected(compiled):
+    path, source = compiled
+    store = CatalogStore(path, source)
+    first = store.snapshot()
+
+    with open(source) as f:
+        data = json.load(f)
+    data["seeds"][0]["price"] += 1
+    with open(source, "w") as f:
+        json.dump(data, f)
+
+    with pytest.raises(ValueError, match="stale"):
+        BinaryCatalog(path, source)
+    with pytest.raises(ValueError, match="stale"):
+        CatalogStore(path, source).snapshot()
+    # A running store keeps serving what it had until the file is rebuilt.
+    assert store.snapshot() is first
+    assert store.reload_failures == 1
+
+    compile_json_file(source, path)
+    assert store.snapshot().get("seeds")[0]["price"] == data["seeds"][0]["price"]
+
+
+@pytest.mark.parametrize("damage", ["truncate", "header"])
+def test_corrupt_catalog_is_rejected(compiled, damage):
+    path = compiled[0]
+    with open(path, "r+b") as f:
+        if damage == "truncate":
+            f.truncate(os.path.getsize(path) // 2)
+        else:
+            f.seek(16)
+            f.write(b"\xff" * 32)
+
+    with pytest.raises(ValueError):
+        BinaryCatalog(path)
+    with pytest.raises(ValueError):
+        CatalogStore(path).snapshot()
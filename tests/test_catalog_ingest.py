@@ -0,0 +1,149 @@
+import os
+import csv
+import json
+import gzip
+import shutil
+import hashlib
+
+import pytest
+
+from catalog_ingest import ingest
+from catalog_store import CatalogStore
+from catalog_updates import ChangeLog, LiveCatalogStore
+
+MATERIALS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "list_material.json")
+FIELDS = [
+    "item_id", "category", "name", "seller_id", "seller_name", "product_quality", "reliability",
+    "avg_rating", "review_count", "available_qty", "required_qty", "seller_lat", "seller_lon", "price",
+]
+
+
+def base_items():
+    with open(MATERIALS) as f:
+        return json.load(f)
+
+
+def listing(item_id, category="seed", name="Rice Sona Masuri", price=400, **extra):
+    return {
+        "item_id": item_id, "category": category, "name": name, "seller_id": "SELLER_T1",
+        "seller_name": "Test Seeds", "product_quality": 0.8, "reliability": 0.7, "avg_rating": 4.2,
+        "review_count": 30, "available_qty": 300, "required_qty": 20, "seller_lat": 19.2,
+        "seller_lon": 72.9, "price": price, **extra,
+    }
+
+
+def write_csv(path, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+    return str(path)
+
+
+def write_jsonl(path, lines):
+    opener = gzip.open if str(path).endswith(".gz") else open
+    with opener(path, "wt", encoding="utf-8") as f:
+        for line in lines:
+            f.write((line if isinstance(line, str) else json.dumps(line)) + "\n")
+    return str(path)
+
+
+def read_catalog(out):
+    with open(os.path.join(out, "catalog.json")) as f:
+        return json.load(f)
+
+
+@pytest.mark.parametrize("fmt", ["csv", "jsonl"])
+def test_duplicate_item_id_replaces_listing_in_place(tmp_path, fmt):
+    rows = [
+        listing("NEW1"),
+        dict(base_items()["seeds"][0], price=999),  # an update to a --base listing
+        listing("NEW2", name="Wheat HD-3086"),
+        listing("NEW1", price=350),
+    ]
+    if fmt == "csv":
+        path = write_csv(tmp_path / "rows.csv", rows)
+    else:
+        path = write_jsonl(tmp_path / "rows.jsonl.gz", rows)
+    out = str(tmp_path / "out")
+    manifest = ingest([path], out, base=MATERIALS, progress_every=0)
+
+    seeds = read_catalog(out)["seeds"]
+    base_seeds = base_items()["seeds"]
+    assert [item["item_id"] for item in seeds] == [item["item_id"] for item in base_seeds] + ["NEW1", "NEW2"]
+    assert seeds[0] == dict(base_seeds[0], price=999)
+    assert seeds[-2] == listing("NEW1", price=350)
+    assert manifest["rows"] == 30 + 4
+    assert manifest["listings"] == 30 + 2
+    assert manifest["duplicates"] == 2
+
+
+def test_invalid_rows_are_rejected_and_counted(tmp_path):
+    jsonl = write_jsonl(tmp_path / "rows.jsonl", [
+        listing("OK1"),
+        '{"item_id": "BROKEN"',
+        listing("BAD1", price=-5),
+        listing("BAD2", category="tractor"),
+        {k: v for k, v in listing("BAD3").items() if k != "seller_lat"},
+    ])
+    bad_csv = dict(listing("BAD4"), avg_rating="four")
+    path_csv = write_csv(tmp_path / "rows.csv", [listing("OK2", category="fertilizer", name="Urea"), bad_csv])
+    out = str(tmp_path / "out")
+    manifest = ingest([jsonl, path_csv], out, progress_every=0)
+
+    assert manifest["rows"] == 2
+    assert manifest["rejected"] == 5
+    assert [(s["rows"], s["rejected"]) for s in manifest["sources"]] == [(1, 4), (1, 1)]
+    with open(os.path.join(out, "rejects.jsonl")) as f:
+        rejects = [json.loads(line) for line in f]
+    assert [(r["source"], r["line"]) for r in rejects] == [
+        (jsonl, 2), (jsonl, 3), (jsonl, 4), (jsonl, 5), (path_csv, 3),
+    ]
+    assert "item.price" in rejects[1]["error"]
+    assert "unknown category" in rejects[2]["error"]
+    assert "item.avg_rating" in rejects[4]["error"]
+    catalog = read_catalog(out)
+    assert {c: [i["item_id"] for i in items] for c, items in catalog.items()} == {
+        "seeds": ["OK1"], "fertilizers": ["OK2"],
+    }
+
+
+def test_manifest_counts_and_shard_digests(tmp_path):
+    path = write_jsonl(tmp_path / "rows.jsonl", [listing(f"NEW{n}") for n in range(7)])
+    out = str(tmp_path / "out")
+    manifest = ingest([path], out, base=MATERIALS, shard_size=4, progress_every=0)
+
+    with open(os.path.join(out, "manifest.json")) as f:
+        assert json.load(f) == manifest
+    catalog = read_catalog(out)
+    assert manifest["listings"] == sum(len(items) for items in catalog.values()) == 37
+    for category, entry in manifest["categories"].items():
+        assert entry["rows"] == len(catalog[category])
+        assert sum(shard["rows"] for shard in entry["shards"]) == entry["rows"]
+        assert all(shard["rows"] <= 4 for shard in entry["shards"])
+        lines = []
+        for shard in entry["shards"]:
+            with open(os.path.join(out, shard["path"]), "rb") as f:
+                raw = f.read()
+            assert hashlib.sha256(raw).hexdigest() == shard["sha256"]
+            lines += [json.loads(line) for line in raw.splitlines()]
+        assert lines == catalog[category]
+    assert CatalogStore(os.path.join(out, "catalog.json")).snapshot().count("seeds") == 17
+
+
+def test_changelog_replays_into_live_store(tmp_path):
+    base = str(tmp_path / "list_material.json")
+    shutil.copy(MATERIALS, base)
+    changelog = str(tmp_path / "changes.sqlite3")
+    path = write_jsonl(tmp_path / "rows.jsonl", [
+        listing("NEW1"),
+        dict(base_items()["fertilizers"][0], price=1),
+        listing("NEW1", price=350),
+    ])
+    out = str(tmp_path / "out")
+    manifest = ingest([path], out, base=base, changelog=changelog, progress_every=0)
+    assert manifest["changes_logged"] == 2  # listings, not rows
+
+    live = LiveCatalogStore(base, ChangeLog(changelog), poll_seconds=0).snapshot()
+    for category, items in read_catalog(out).items():
+        assert [dict(item) for item in live.get(category)] == items
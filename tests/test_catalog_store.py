@@ -0,0 +1,51 @@
+import os
+import json
+import shutil
+
+from catalog_store import CatalogStore
+
+MATERIALS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "list_material.json")
+
+
+def touch(path, offset):
+    st = os.stat(path)
+    os.utime(path, (st.st_atime + offset, st.st_mtime + offset))
+
+
+def test_bad_reload_keeps_previous_snapshot(tmp_path):
+    path = str(tmp_path / "catalog.json")
+    shutil.copy(MATERIALS, path)
+    store = CatalogStore(path)
+    first = store.snapshot()
+
+    with open(path, "w") as f:
+        f.write('{"seeds": [')  # half-written
+    touch(path, 5)
+    assert store.snapshot() is first
+    assert store.snapshot() is first
+    assert store.reload_failures == 1  # not re-read until the file moves again
+
+    with open(MATERIALS) as f:
+        data = json.load(f)
+    data["seeds"] = data["seeds"][:3]
+    with open(path, "w") as f:
+        json.dump(data, f)
+    touch(path, 10)
+    snapshot = store.snapshot()
+    assert snapshot.version == first.version + 1
+    assert len(snapshot.get("seeds")) == 3
+
+
+def test_mentions_product_checks_every_word(tmp_path):
+    path = str(tmp_path / "catalog.json")
+    with open(MATERIALS) as f:
+        data = json.load(f)
+    data["seeds"][0] = {**data["seeds"][0], "name": "Zorbax Hybrid"}
+    with open(path, "w") as f:
+        json.dump(data, f)
+    snapshot = CatalogStore(path).snapshot()
+
+    assert snapshot.mentions_product("zorbax")
+    # The catalog-only term is not the first word.
+    assert snapshot.mentions_product("do you have zorbax")
+    assert not snapshot.mentions_product("tell me a joke")
@@ -0,0 +1,118 @@
+import sys
+import threading
+
+import pytest
+
+from benchmarks.synthetic_catalog import DEFAULT_FARMER, generate_catalog
+from catalog_store import CatalogSnapshot
+from catalog_updates import LiveCatalog, validate_change
+from QQDP_scoring import rank_items_topk
+
+PREFERENCE = {"quality": "average", "quantity": "average", "distance": "average", "price": "high"}
+
+
+def catalog():
+    return generate_catalog(200, spread_km=30, seed=3)
+
+
+def apply(live, *changes):
+    live.apply([validate_change(change) for change in changes], live.version + 1)
+
+
+def first(data, word):
+    return next(item for item in data["seeds"] if word in item["name"].lower())
+
+
+def assert_same(live, data, query):
+    fresh = CatalogSnapshot(data, "fresh", 0, 1)
+    items = [dict(item) for item in live.select("seeds", query)[0]]
+    assert items == [dict(item) for item in fresh.select("seeds", query)[0]]
+    assert live.rank_topk("seeds", query, PREFERENCE, DEFAULT_FARMER, 10) == rank_items_topk(
+        fresh.select("seeds", query)[0], PREFERENCE, 10, DEFAULT_FARMER, fresh.select("seeds", query)[1]
+    )
+
+
+def test_patch_keeps_untouched_memos_and_patches_the_rest():
+    np = pytest.importorskip("numpy")
+    data = catalog()
+    live = LiveCatalog(CatalogSnapshot(data, "base", 0, 1), 1)
+    fertilizers = live.get("fertilizers")
+    wheat, wheat_grid = live.select("seeds", "wheat")
+    rice_columns = live.columns("seeds", "rice")
+
+    rice = first(data, "rice")
+    apply(live, {"op": "patch", "category": "seeds", "item_id": rice["item_id"], "price": 1, "available_qty": 5})
+    rice.update(price=1, available_qty=5)
+
+    assert live.get("fertilizers") is fertilizers
+    assert live.select("seeds", "wheat")[0] is wheat
+    assert live.select("seeds", "wheat")[1] is wheat_grid
+    columns = live.columns("seeds", "rice")
+    assert columns is not rice_columns
+    assert 1 not in rice_columns.columns["price"]
+
+    from QQDP_numpy import ColumnarCatalog
+
+    expected = ColumnarCatalog.from_items(CatalogSnapshot(data, "fresh", 0, 1).select("seeds", "rice")[0])
+    for field, column in expected.columns.items():
+        assert np.array_equal(columns.columns[field], column)
+    assert columns.labels == expected.labels
+    assert np.array_equal(columns.quality, expected.quality)
+    assert_same(live, data, "rice")
+    assert_same(live, data, None)
+
+
+def test_upsert_renaming_a_listing_keeps_its_position():
+    data = catalog()
+    live = LiveCatalog(CatalogSnapshot(data, "base", 0, 1), 1)
+    live.select("seeds", "rice")
+    live.select("seeds", "tomato")
+    live.rank_topk("seeds", "rice", PREFERENCE, DEFAULT_FARMER, 10)
+    order = [item["item_id"] for item in live.get("seeds")]
+
+    rice = first(data, "rice")
+    moved = {**rice, "name": "Tomato Hybrid", "seller_lat": DEFAULT_FARMER[0], "seller_lon": DEFAULT_FARMER[1]}
+    apply(live, {"op": "upsert", "category": "seeds", "item": moved})
+    rice.update(moved)
+
+    assert [item["item_id"] for item in live.get("seeds")] == order
+    assert rice["item_id"] not in {item["item_id"] for item in live.select("seeds", "rice")[0]}
+    assert rice["item_id"] in {item["item_id"] for item in live.select("seeds", "tomato")[0]}
+    for query in (None, "rice", "tomato"):
+        assert_same(live, data, query)
+
+
+def test_readers_never_see_part_of_a_batch():
+    data = catalog()
+    twins = {f"TWIN{n}" for n in range(20)}
+    data["seeds"] += [
+        {**data["seeds"][0], "item_id": item_id, "seller_lat": DEFAULT_FARMER[0], "seller_lon": DEFAULT_FARMER[1]}
+        for item_id in sorted(twins)
+    ]
+    live = LiveCatalog(CatalogSnapshot(data, "base", 0, 1), 1)
+    done = threading.Event()
+    torn = []
+
+    def read():
+        while not done.is_set():
+            ranked = live.rank_topk("seeds", None, PREFERENCE, DEFAULT_FARMER, len(data["seeds"]))
+            prices = {r["price"] for r in ranked if r["item_id"] in twins}
+            selected = {i["price"] for i in live.select("seeds")[0] if i["item_id"] in twins}
+            if len(prices) > 1 or len(selected) > 1:
+                torn.append((prices, selected))
+
+    reader = threading.Thread(target=read)
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-5)  # switch threads often, mid-batch too
+    reader.start()
+    try:
+        for price in range(200, 400):
+            apply(live, *(
+                {"op": "patch", "category": "seeds", "item_id": item_id, "price": price}
+                for item_id in twins
+            ))
+    finally:
+        done.set()
+        reader.join()
+        sys.setswitchinterval(interval)
+    assert not torn
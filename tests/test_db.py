@@ -0,0 +1,140 @@
+import json
+import multiprocessing
+
+import pytest
+
+import db
+
+
+def test_json_users(tmp_path):
+    backend = db.JsonBackend(str(tmp_path / "users.json"), str(tmp_path / "orders.json"))
+    assert backend.get_user("a@example.com") is None
+    assert not backend.user_exists("a@example.com")
+
+    assert backend.create_user("a@example.com", {"name": "A", "password_hash": "h1"})
+    assert not backend.create_user("a@example.com", {"name": "Other", "password_hash": "h2"})
+    assert backend.get_user("a@example.com") == {"name": "A", "password_hash": "h1"}
+
+    assert backend.update_password_hash("a@example.com", "h3")
+    assert not backend.update_password_hash("b@example.com", "h3")
+    with open(tmp_path / "users.json") as f:
+        assert json.load(f) == {"a@example.com": {"name": "A", "password_hash": "h3"}}
+
+
+def test_json_file_written_elsewhere_is_reread(tmp_path):
+    path = tmp_path / "users.json"
+    path.write_text(json.dumps({"a@example.com": {"name": "A", "password_hash": "h"}}))
+    reader = db.JsonBackend(str(path), str(tmp_path / "orders.json"))
+    writer = db.JsonBackend(str(path), str(tmp_path / "orders.json"))
+    assert reader.user_exists("a@example.com")
+
+    # Another worker signs up; the reader sees the new file, not its cache.
+    writer.create_user("b@example.com", {"name": "B", "password_hash": "h"})
+    assert reader.get_user("b@example.com") == {"name": "B", "password_hash": "h"}
+    assert not reader.create_user("b@example.com", {"name": "B2", "password_hash": "h"})
+
+
+def test_module_api_uses_selected_backend(tmp_path):
+    backend = db.JsonBackend(str(tmp_path / "users.json"), str(tmp_path / "orders.json"))
+    previous = db.init_db(backend)
+    try:
+        assert db.create_user("a@example.com", {"name": "A", "password_hash": "h"})
+        assert db.user_exists("a@example.com")
+        assert db.get_user("a@example.com")["name"] == "A"
+        db.save_order("a@example.com", {"product": "Urea"})
+        assert db.load_orders() == {"a@example.com": [{"product": "Urea"}]}
+    finally:
+        db.init_db(previous)
+
+
+def test_json_order_pages(tmp_path):
+    backend = db.JsonBackend(str(tmp_path / "users.json"), str(tmp_path / "orders.json"))
+    backend.save_order("other@example.com", {"order_date": "2025-06-01T00:00:00", "product": "Other"})
+    backend.save_order("a@example.com", {"product": "Undated"})
+    for day in (3, 1, 2, 2):
+        backend.save_order("a@example.com", {"order_date": f"2025-01-0{day}T10:00:00", "product": f"day{day}"})
+
+    pages, cursor = [], None
+    while True:
+        orders, cursor = backend.list_orders("a@example.com", cursor, limit=2)
+        pages.append([order["product"] for order in orders])
+        if cursor is None:
+            break
+    # Newest first, ties by insertion (later first), undated last.
+    assert pages == [["day3", "day2"], ["day2", "day1"], ["Undated"]]
+
+    # A new order does not shift later pages of an existing cursor.
+    first, cursor = backend.list_orders("a@example.com", None, limit=2)
+    backend.save_order("a@example.com", {"order_date": "2025-02-01T00:00:00", "product": "new"})
+    assert [o["product"] for o in backend.list_orders("a@example.com", cursor, limit=2)[0]] == ["day2", "day1"]
+
+    assert backend.list_orders("nobody@example.com") == ([], None)
+    with pytest.raises(ValueError):
+        backend.list_orders("a@example.com", "not-a-cursor")
+
+
+def test_sqlite_users_and_order_pages(tmp_path):
+    backend = db.SqliteBackend(str(tmp_path / "db.sqlite3"))
+    assert backend.create_user("a@example.com", {"name": "A", "password_hash": "h1"})
+    assert not backend.create_user("a@example.com", {"name": "Other", "password_hash": "h2"})
+    assert backend.update_password_hash("a@example.com", "h3")
+    assert not backend.update_password_hash("b@example.com", "h3")
+    assert backend.get_user("a@example.com") == {"name": "A", "password_hash": "h3"}
+    assert backend.user_exists("a@example.com") and not backend.user_exists("b@example.com")
+
+    backend.save_order("a@example.com", {"product": "Undated"})
+    for day in (3, 1, 2, 2):
+        backend.save_order("a@example.com", {"order_date": f"2025-01-0{day}T10:00:00", "product": f"day{day}"})
+    pages, cursor = [], None
+    while True:
+        orders, cursor = backend.list_orders("a@example.com", cursor, limit=2)
+        pages.append([order["product"] for order in orders])
+        if cursor is None:
+            break
+    assert pages == [["day3", "day2"], ["day2", "day1"], ["Undated"]]
+    with pytest.raises(ValueError):
+        backend.list_orders("a@example.com", "not-a-cursor")
+
+
+def test_sqlite_migrates_json_once(tmp_path):
+    users = tmp_path / "users.json"
+    orders = tmp_path / "orders.json"
+    users.write_text(json.dumps({"A@Example.com ": {"name": "A", "password_hash": "h"}}))
+    orders.write_text(json.dumps({"a@example.com": [{"product": "first"}, {"product": "second"}]}))
+
+    backend = db.SqliteBackend(str(tmp_path / "db.sqlite3"))
+    assert backend.migrate_from_json(str(users), str(orders)) == (1, 2)
+    assert backend.migrate_from_json(str(users), str(orders)) == (0, 0)
+    # A forced re-run picks up new users but never duplicates orders.
+    users.write_text(json.dumps({"b@example.com": {"name": "B", "password_hash": "h"}}))
+    assert backend.migrate_from_json(str(users), str(orders), force=True) == (1, 0)
+
+    assert backend.get_user("a@example.com") == {"name": "A", "password_hash": "h"}
+    assert [o["product"] for o in backend.list_orders("a@example.com")[0]] == ["second", "first"]
+
+
+def _sign_up_many(kind, path, worker, count):
+    backend = db.SqliteBackend(path) if kind == "sqlite" else db.JsonBackend(path, path + ".orders")
+    for n in range(count):
+        backend.create_user(f"w{worker}-{n}@example.com", {"name": "W", "password_hash": "h"})
+        backend.create_user("shared@example.com", {"name": f"W{worker}", "password_hash": "h"})
+        backend.save_order("shared@example.com", {"product": f"w{worker}-{n}"})
+
+
+@pytest.mark.parametrize("kind", ["sqlite", "json"])
+def test_concurrent_workers_lose_no_writes(tmp_path, kind):
+    path = str(tmp_path / ("db.sqlite3" if kind == "sqlite" else "users.json"))
+    if kind == "sqlite":
+        db.SqliteBackend(path)  # create the schema before the workers race
+    workers, count = 4, 40
+    ctx = multiprocessing.get_context("fork")
+    processes = [ctx.Process(target=_sign_up_many, args=(kind, path, w, count)) for w in range(workers)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+        assert process.exitcode == 0
+
+    backend = db.SqliteBackend(path) if kind == "sqlite" else db.JsonBackend(path, path + ".orders")
+    assert len(backend.load_users()) == workers * count + 1
+    assert len(backend.load_orders()["shared@example.com"]) == workers * count
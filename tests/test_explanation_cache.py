@@ -0,0 +1,78 @@
+import time
+import threading
+
+import pytest
+
+from explanation_cache import ExplanationCache
+
+
+def test_concurrent_misses_compute_once():
+    cache = ExplanationCache()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "explained"
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(cache.get_or_compute("k", compute)))
+    leader.start()
+    started.wait(5)
+    followers = [
+        threading.Thread(target=lambda: results.append(cache.get_or_compute("k", compute, timeout=5)))
+        for _ in range(4)
+    ]
+    for thread in followers:
+        thread.start()
+    while cache.stats()["coalesced"] < 4:
+        time.sleep(0.001)
+    release.set()
+    for thread in [leader, *followers]:
+        thread.join()
+
+    assert results == ["explained"] * 5
+    assert len(calls) == 1
+    assert cache.get_or_compute("k", compute) == "explained"
+    assert cache.stats()["hits"] == 1
+
+
+def test_follower_gives_up_at_its_deadline():
+    cache = ExplanationCache()
+    _, call, leader = cache.join("k")
+    assert leader
+
+    started = time.monotonic()
+    assert cache.get_or_compute("k", lambda: "unused", timeout=0.05) is None
+    assert time.monotonic() - started < 1
+    assert cache.stats()["wait_timeouts"] == 1
+
+    # The leader's late value is still cached.
+    cache.finish("k", call, "late")
+    assert cache.get_or_compute("k", lambda: "unused") == "late"
+
+
+def test_errors_reach_followers_and_are_not_cached():
+    cache = ExplanationCache()
+    _, call, _ = cache.join("k")
+    _, follower_call, leader = cache.join("k")
+    assert follower_call is call and not leader
+
+    cache.finish("k", call, error=RuntimeError("quota"))
+    with pytest.raises(RuntimeError):
+        cache.wait(call, timeout=1)
+    assert cache.get_or_compute("k", lambda: None) is None
+    assert cache.get_or_compute("k", lambda: "ok") == "ok"
+
+
+def test_ttl_and_lru_eviction():
+    cache = ExplanationCache(max_entries=2, ttl_seconds=0.05)
+    for key in ("a", "b", "c"):
+        cache.get_or_compute(key, lambda key=key: key.upper())
+    assert cache.peek("a") is None
+    assert cache.peek("c") == "C"
+    time.sleep(0.06)
+    assert cache.peek("c") is None
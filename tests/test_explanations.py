@@ -0,0 +1,160 @@
+import json
+import time
+import asyncio
+import threading
+
+from explanation_cache import ExplanationCache
+from explanations import astream_explanation, call_with_deadline, stream_explanation
+
+
+class FakeChunk:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeModel:
+    """generate_content(stream=True) yielding `parts`; fails after `fail_after` chunks if set."""
+
+    def __init__(self, parts, fail_after=None, gate=None):
+        self.parts = parts
+        self.fail_after = fail_after
+        self.gate = gate
+        self.calls = 0
+
+    def generate_content(self, prompt, stream=False, request_options=None):
+        self.calls += 1
+        return self._chunks()
+
+    def _chunks(self):
+        for n, text in enumerate(self.parts):
+            if n == self.fail_after:
+                raise RuntimeError("stream broke")
+            if self.gate is not None and n == 1:
+                self.gate.wait(5)
+            yield FakeChunk(text)
+
+    async def generate_content_async(self, prompt, stream=False, request_options=None):
+        self.calls += 1
+        return _AsyncChunks(self.parts, self.gate)
+
+
+class _AsyncChunks:
+    def __init__(self, parts, gate):
+        self.parts = list(parts)
+        self.gate = gate
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.parts:
+            raise StopAsyncIteration
+        if self.gate is not None:
+            await self.gate.wait()
+        return FakeChunk(self.parts.pop(0))
+
+
+def frames(stream):
+    """[(event, data)] from SSE text frames."""
+    out = []
+    for frame in stream:
+        event, data = frame.strip().split("\n")
+        out.append((event[len("event: "):], json.loads(data[len("data: "):])))
+    return out
+
+
+def test_streams_chunks_then_done_and_caches():
+    cache = ExplanationCache()
+    model = FakeModel(["Option 1 ", "is closest."])
+    events = frames(stream_explanation(model, "p", fallback="template", cache=cache, cache_key="k"))
+    assert events == [
+        ("chunk", {"text": "Option 1 "}),
+        ("chunk", {"text": "is closest."}),
+        ("done", {"reply": "Option 1 is closest."}),
+    ]
+    # Served from the cache the second time.
+    assert frames(stream_explanation(model, "p", cache=cache, cache_key="k")) == [
+        ("done", {"reply": "Option 1 is closest."})
+    ]
+    assert model.calls == 1
+
+
+def test_fallback_when_model_missing_or_stream_fails():
+    assert frames(stream_explanation(None, "p", fallback="template")) == [("fallback", {"reply": "template"})]
+
+    cache = ExplanationCache()
+    model = FakeModel(["a", "b", "c"], fail_after=2)
+    events = frames(stream_explanation(model, "p", fallback="template", cache=cache, cache_key="k"))
+    assert events[-1] == ("fallback", {"reply": "template"})
+    assert cache.peek("k") is None
+    assert cache.stats()["inflight"] == 0
+
+
+def test_concurrent_streams_call_the_model_once():
+    cache = ExplanationCache()
+    gate = threading.Event()
+    model = FakeModel(["Option 1 ", "is closest."], gate=gate)
+    leader = stream_explanation(model, "p", cache=cache, cache_key="k", timeout=5)
+    first = next(leader)  # leader is now streaming, held before its second chunk
+
+    follower = []
+    thread = threading.Thread(target=lambda: follower.extend(
+        frames(stream_explanation(model, "p", cache=cache, cache_key="k", timeout=5))
+    ))
+    thread.start()
+    while cache.stats()["coalesced"] < 1:
+        time.sleep(0.001)
+    gate.set()
+    rest = list(leader)
+    thread.join()
+
+    assert frames([first, *rest])[-1] == ("done", {"reply": "Option 1 is closest."})
+    assert follower == [("done", {"reply": "Option 1 is closest."})]
+    assert model.calls == 1
+
+
+def test_abandoned_stream_releases_followers():
+    cache = ExplanationCache()
+    model = FakeModel(["a", "b"])
+    leader = stream_explanation(model, "p", cache=cache, cache_key="k")
+    next(leader)
+    leader.close()  # client disconnected
+    assert cache.stats()["inflight"] == 0
+    assert frames(stream_explanation(model, "p", cache=cache, cache_key="k"))[-1] == ("done", {"reply": "ab"})
+
+
+def test_async_stream_coalesces_without_threads():
+    async def run():
+        cache = ExplanationCache()
+        gate = asyncio.Event()
+        model = FakeModel(["Option 1 ", "is closest."], gate=gate)
+
+        async def collect():
+            return [f async for f in astream_explanation(model, "p", cache=cache, cache_key="k", timeout=5)]
+
+        leader = asyncio.create_task(collect())
+        await asyncio.sleep(0.01)
+        follower = asyncio.create_task(collect())
+        await asyncio.sleep(0.01)
+        gate.set()
+        return model, await leader, await follower
+
+    model, leader, follower = asyncio.run(run())
+    assert frames(leader)[-1] == ("done", {"reply": "Option 1 is closest."})
+    assert frames(follower) == [("done", {"reply": "Option 1 is closest."})]
+    assert model.calls == 1
+
+
+def test_async_follower_falls_back_at_deadline():
+    async def run():
+        cache = ExplanationCache()
+        _, call, _ = cache.join("k")  # a leader that never finishes
+        return [f async for f in astream_explanation(FakeModel(["x"]), "p", fallback="template",
+                                                     cache=cache, cache_key="k", timeout=0.05)]
+
+    assert frames(asyncio.run(run())) == [("fallback", {"reply": "template"})]
+
+
+def test_call_with_deadline():
+    assert call_with_deadline(lambda: "fast", 1) == "fast"
+    assert call_with_deadline(lambda: time.sleep(0.5) or "slow", 0.05) is None
@@ -0,0 +1,125 @@
+import csv
+import random
+import difflib
+
+import pytest
+
+from gazetteer import FUZZY_CUTOFF, GAZETTEER_PATH, Gazetteer, LazyGazetteer, build
+
+DIRECTORY = [
+    # officename, pincode, district, latitude, longitude
+    ("Nashik Road S.O", "422101", "NASHIK", "19.95", "73.83"),
+    ("Nashik H.O", "422001", "NASHIK", "20.00", "73.79"),
+    ("Panchavati S.O", "422003", "NASHIK", "20.01", "73.80"),
+    ("Panchavati B.O", "422003", "NASHIK", "20.03", "73.82"),
+    ("Panchavati B.O", "422003", "NASHIK", "2.003", "73.82"),  # mistyped latitude
+    ("Rampur B.O", "413001", "SOLAPUR", "17.60", "75.90"),
+    ("Rampur B.O", "413002", "SOLAPUR", "17.70", "75.95"),
+    ("Rampur H.O", "244901", "RAMPUR", "28.80", "79.03"),
+    ("Shivajinagar S.O", "411005", "PUNE", "18.53", "73.85"),
+    ("Shivajinagar B.O", "413003", "SOLAPUR", "17.66", "75.91"),
+    ("Shivajinagar B.O", "413004", "SOLAPUR", "17.68", "75.93"),
+    ("Kothimir B.O", "504273", "KUMURAM BHEEM ASIFABAD", "19.36", "79.54"),
+    ("Nowhere B.O", "999999", "NOWHERE", "", ""),
+]
+
+
+@pytest.fixture
+def directory_gazetteer(tmp_path):
+    csv_path = tmp_path / "directory.csv"
+    with open(csv_path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["OfficeName", "Pincode", "District", "Latitude", "Longitude"])
+        writer.writerows(DIRECTORY)
+    aliases = tmp_path / "aliases.tsv"
+    aliases.write_text("# comment\nnasik\t19.9975\t73.7898\n")
+    out = tmp_path / "gazetteer.tsv.gz"
+    assert build(str(csv_path), str(out), str(aliases)) == (10, 14)
+    return Gazetteer.load(str(out))
+
+
+def test_build_medians_and_bounds(directory_gazetteer):
+    gaz = directory_gazetteer
+    # The out-of-India row does not move the PIN or the office.
+    assert gaz.lookup_pin("422003") == (20.02, 73.81)
+    assert gaz.lookup_pin("999999") is None
+    assert gaz.lookup_name("Panchavati") == (20.02, 73.81)
+    assert gaz.lookup_name("nasik") == (19.9975, 73.7898)
+
+
+def test_build_ambiguous_names(directory_gazetteer):
+    gaz = directory_gazetteer
+    # Two Solapur offices beat one elsewhere; each stays reachable by district.
+    assert gaz.lookup_name("shivajinagar") == (17.67, 75.92)
+    assert gaz.lookup_name("Shivajinagar, Pune") == (18.53, 73.85)
+    # A district keeps its own name; offices named after it are qualified.
+    assert gaz.lookup_name("rampur") == (28.80, 79.03)
+    assert gaz.lookup_name("rampur solapur") == (17.65, 75.925)
+
+
+def test_prefix_and_misspelling(directory_gazetteer):
+    gaz = directory_gazetteer
+    assert gaz.lookup_name("kothim") == (19.36, 79.54)
+    assert gaz.lookup_name("kotimir") == (19.36, 79.54)
+    assert gaz.lookup_name("panchvati") == (20.02, 73.81)
+    assert gaz.lookup_name("pu") is None
+    assert gaz.lookup_name("xyzzy") is None
+    assert gaz.lookup_name("") is None
+
+
+def test_fuzzy_index_matches_difflib_scan():
+    rng = random.Random(0)
+    names = ["".join(rng.choice("aeiounrstlkmpdgh") for _ in range(rng.randint(4, 14))) for _ in range(3000)]
+    places = {name: (float(n), 0.0) for n, name in enumerate(names)}
+    gaz = Gazetteer({}, places)
+    checked = 0
+    for name in rng.sample(names, 300):
+        if len(name) < 8:
+            continue
+        # One dropped letter: difflib ratio >= 2 * 7 / 15 > 0.9.
+        i = rng.randrange(len(name))
+        typo = name[:i] + name[i + 1:]
+        if typo in places or any(n.startswith(typo) for n in names):
+            continue
+        match = difflib.get_close_matches(typo, gaz._names, n=1, cutoff=FUZZY_CUTOFF)
+        assert gaz.lookup_name(typo) == places[match[0]]
+        checked += 1
+    assert checked > 100
+
+
+def test_bundled_directory(bundled):
+    gaz = bundled
+    assert len(gaz.pins) > 19000
+    for pin in ("110001", "400001", "411001", "560001", "504273"):
+        lat, lon = gaz.lookup_pin(pin)
+        assert 6 <= lat <= 37.5 and 68 <= lon <= 97.5
+    assert gaz.lookup_name("Pune") == (18.5204, 73.8567)
+    assert gaz.lookup_name("nashk") == gaz.lookup_name("nashik")
+    office, pin = gaz.lookup_name("kothimir"), gaz.lookup_pin("504273")
+    assert abs(office[0] - pin[0]) < 0.5 and abs(office[1] - pin[1]) < 0.5
+
+
+@pytest.fixture(scope="module")
+def bundled():
+    return Gazetteer.load(GAZETTEER_PATH)
+
+
+@pytest.mark.parametrize("reply", ["hello", "Yes", "no", "ok", "okay", "thanks", "Thank you!", "hi", "good"])
+def test_chat_replies_are_not_places(bundled, reply):
+    assert bundled.lookup_name(reply) is None
+
+
+@pytest.mark.parametrize("text", ["urea", "seeds please", "xyz", "a"])
+def test_short_or_distant_words_are_not_places(bundled, text):
+    # "urea" is one letter from Urena: too short to trust a spelling match.
+    assert bundled.lookup_name(text) is None
+
+
+def test_lazy_gazetteer_loads_on_first_lookup(tmp_path):
+    path = tmp_path / "gazetteer.tsv"
+    path.write_text("411001\t18.52\t73.85\npune\t18.52\t73.85\n")
+    lazy = LazyGazetteer(str(path))
+    path.write_text("411001\t18.5\t73.8\npune\t18.5\t73.8\n")  # read at first use, not before
+    assert lazy.lookup_pin("411001") == (18.5, 73.8)
+    assert lazy.lookup_name("Pune") == (18.5, 73.8)
+    assert lazy.get() is lazy.get()
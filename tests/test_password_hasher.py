@@ -0,0 +1,43 @@
+import os
+import signal
+
+import pytest
+
+from password_hasher import PasswordHasher
+
+METHOD = "pbkdf2:sha256:1000"
+
+
+@pytest.fixture
+def hasher():
+    hasher = PasswordHasher(METHOD, workers=1)
+    yield hasher
+    hasher.shutdown()
+
+
+def kill_pool(hasher):
+    for pid in list(hasher._executor._processes):
+        os.kill(pid, signal.SIGKILL)
+        os.waitpid(pid, 0)
+
+
+def test_hash_and_verify(hasher):
+    stored = hasher.hash("secret")
+    assert hasher.verify(stored, "secret") == (True, None)
+    assert hasher.verify(stored, "wrong") == (False, None)
+
+
+def test_rehash_on_method_change(hasher):
+    old = PasswordHasher("pbkdf2:sha256:500", workers=0).hash("secret")
+    valid, new_hash = hasher.verify(old, "secret")
+    assert valid and new_hash.startswith(METHOD + "$")
+    assert hasher.stats()["rehashed"] == 1
+
+
+def test_recovers_from_a_dead_pool_process(hasher):
+    hasher.hash("warm-up")
+    kill_pool(hasher)
+    stored = hasher.hash("secret")
+    assert hasher.verify(stored, "secret") == (True, None)
+    assert hasher.stats()["pool_restarts"] == 1
+    assert hasher.stats()["pending"] == 0
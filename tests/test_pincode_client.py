@@ -0,0 +1,122 @@
+import json
+import sqlite3
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from pincode_client import CircuitBreaker, PincodeClient
+
+FOUND = [{
+    "Message": "Number of pincode(s) found:2",
+    "Status": "Success",
+    "PostOffice": [
+        {"Name": "No coords", "Latitude": "NA", "Longitude": "NA"},
+        {"Name": "Shivajinagar", "Latitude": "18.5308", "Longitude": "73.8475"},
+    ],
+}]
+NOT_FOUND = [{"Message": "No records found", "Status": "Error", "PostOffice": None}]
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        pincode = self.path.rsplit("/", 1)[-1]
+        self.server.calls.append(pincode)
+        status, body = self.server.answers.get(pincode, (200, NOT_FOUND))
+        data = body if isinstance(body, bytes) else json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    httpd.daemon_threads = True
+    httpd.calls = []
+    httpd.answers = {}
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def make_client(server, threshold=3):
+    host, port = server.server_address[:2]
+    return PincodeClient(
+        base_url=f"http://{host}:{port}",
+        timeout=2,
+        breaker=CircuitBreaker(failure_threshold=threshold, reset_timeout=60),
+    )
+
+
+def test_found_and_cached(server):
+    server.answers["411005"] = (200, FOUND)
+    client = make_client(server)
+    assert client.lookup("411005") == (18.5308, 73.8475)
+    assert client.lookup("411005") == (18.5308, 73.8475)
+    assert server.calls == ["411005"]
+
+
+def test_not_found_is_cached_and_not_a_failure(server):
+    client = make_client(server, threshold=1)
+    assert client.lookup("999999") is None
+    assert client.lookup("999999") is None
+    assert server.calls == ["999999"]
+    assert client.breaker.state == "closed"
+
+
+@pytest.mark.parametrize("body", [
+    b"<html>Service Unavailable</html>",
+    {"Status": "Success"},
+    [None],
+    [{"Status": "Success", "PostOffice": {"Latitude": "18.5"}}],
+])
+def test_malformed_answer_counts_as_failure(server, body):
+    server.answers["411005"] = (200, body)
+    client = make_client(server, threshold=2)
+    assert client.lookup("411005") is None
+    assert client.breaker.failures == 1
+    # Not cached: the next lookup asks again and trips the breaker.
+    assert client.lookup("411005") is None
+    assert server.calls == ["411005", "411005"]
+    assert client.breaker.state == "open"
+
+
+def test_open_breaker_skips_the_api(server):
+    server.answers["411005"] = (500, {"error": "upstream"})
+    client = make_client(server, threshold=2)
+    for _ in range(4):
+        assert client.lookup("411005") is None
+    assert len(server.calls) == 2
+
+    server.answers["411005"] = (200, FOUND)
+    client.breaker.opened_at -= client.breaker.reset_timeout
+    assert client.breaker.state == "half-open"
+    assert client.lookup("411005") == (18.5308, 73.8475)
+    assert client.breaker.state == "closed"
+
+
+def test_cache_errors_do_not_lose_the_answer(server, monkeypatch, caplog):
+    server.answers["411005"] = (200, FOUND)
+    client = make_client(server, threshold=1)
+
+    def locked(*args):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(client.cache, "put", locked)
+    assert client.lookup("411005") == (18.5308, 73.8475)
+    assert client.breaker.state == "closed"
+    assert "cache write failed" in caplog.text
+
+    monkeypatch.setattr(client.cache, "get", locked)
+    assert client.lookup("411005") == (18.5308, 73.8475)
+    assert server.calls == ["411005", "411005"]
+    assert "cache read failed" in caplog.text
@@ -0,0 +1,68 @@
+import json
+import random
+import itertools
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from QQDP_numpy import ColumnarCatalog, rank_items_numpy, rank_items_numpy_batch
+from QQDP_scoring import MATERIALS_PATH, rank_items, rank_items_topk
+from benchmarks.synthetic_catalog import DEFAULT_FARMER, generate_items, random_point
+from spatial_index import GridIndex
+
+LEVELS = ("low", "average", "high")
+PREFERENCES = [
+    dict(zip(("quality", "quantity", "distance", "price"), levels))
+    for levels in itertools.product(LEVELS, repeat=4)
+]
+
+
+def farmers(seed, n=5):
+    rng = random.Random(seed)
+    return [random_point(rng, DEFAULT_FARMER, 30) for _ in range(n)]
+
+
+@pytest.mark.parametrize("category", ["seeds", "fertilizers", "pesticides"])
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_same_ranking_as_rank_items(category, seed):
+    items = generate_items(400, category, spread_km=40, seed=seed)
+    columnar = ColumnarCatalog.from_items(items)
+    for farmer in farmers(seed):
+        for preference in PREFERENCES:
+            expected = rank_items(items, preference, farmer)
+            assert rank_items_numpy(columnar, preference, farmer) == expected
+
+
+def test_top_k_and_candidate_positions():
+    items = generate_items(2000, "seeds", spread_km=60, seed=7)
+    columnar = ColumnarCatalog.from_items(items)
+    index = GridIndex(items)
+    for farmer in farmers(7):
+        positions = index.query(farmer[0], farmer[1], 25)
+        for preference in PREFERENCES[::7]:
+            for k in (1, 5, 50):
+                expected = rank_items_topk(items, preference, k, farmer)
+                assert rank_items_numpy(columnar, preference, farmer, k=k) == expected
+                assert rank_items_numpy(columnar, preference, farmer, positions, k=k) == expected
+
+
+def test_batch_matches_single_farmer():
+    items = generate_items(1500, "pesticides", spread_km=50, seed=3)
+    columnar = ColumnarCatalog.from_items(items)
+    points = farmers(3, n=40)
+    preferences = [PREFERENCES[n % len(PREFERENCES)] for n in range(len(points))]
+    # A small max_cells forces several distance-matrix blocks.
+    batch = rank_items_numpy_batch(columnar, points, preferences, k=5, max_cells=5000)
+    for farmer, preference, result in zip(points, preferences, batch):
+        assert result == rank_items_topk(items, preference, 5, farmer)
+
+
+def test_bundled_catalog():
+    with open(MATERIALS_PATH) as f:
+        data = json.load(f)
+    for category, items in data.items():
+        columnar = ColumnarCatalog.from_items(items)
+        for preference in PREFERENCES:
+            expected = rank_items(items, preference, DEFAULT_FARMER)
+            assert rank_items_numpy(columnar, preference, DEFAULT_FARMER) == expected
@@ -0,0 +1,105 @@
+import json
+import random
+import itertools
+
+from benchmarks.synthetic_catalog import DEFAULT_FARMER, generate_catalog, random_point
+from catalog_store import CatalogSnapshot, CatalogStore
+from QQDP_scoring import rank_items_topk
+from ranking_cache import RankingCache, rank_candidates
+
+LEVELS = ("low", "average", "high")
+PREFERENCES = [
+    dict(zip(("quality", "quantity", "distance", "price"), levels))
+    for levels in itertools.product(LEVELS, repeat=4)
+]
+
+
+def snapshot(version=1, seed=3):
+    return CatalogSnapshot(generate_catalog(600, spread_km=60, seed=seed), f"v{version}", 0, version)
+
+
+def test_key_is_cell_and_product_selection():
+    cache = RankingCache(cell_deg=0.01)
+    snap = snapshot()
+    lat, lon = DEFAULT_FARMER
+    corner = (cache.cell(lat, lon)[0] * 0.01 + 0.001, cache.cell(lat, lon)[1] * 0.01 + 0.001)
+
+    entry = cache.candidates(snap, "seeds", "rice", (lat, lon))
+    assert cache.candidates(snap, "seeds", "rice", corner) is entry  # same cell
+    assert cache.candidates(snap, "seeds", "Rice", (lat, lon)) is entry  # same canonical query
+    assert cache.stats()["hits"] == 2
+
+    assert cache.candidates(snap, "seeds", "rice", (lat + 0.01, lon)) is not entry
+    assert cache.candidates(snap, "seeds", "wheat", (lat, lon)) is not entry
+    assert cache.candidates(snap, "seeds", None, (lat, lon)) is not entry
+    assert cache.stats()["entries"] == 4
+
+    # Preference only weights the final score: every preference shares the entry.
+    for preference in PREFERENCES:
+        rank_candidates(cache.candidates(snap, "seeds", "rice", (lat, lon)), preference, (lat, lon), 10)
+    stats = cache.stats()
+    assert stats["entries"] == 4
+    assert stats["misses"] == 4
+
+
+def test_lru_eviction():
+    cache = RankingCache(max_entries=2)
+    snap = snapshot()
+    lat, lon = DEFAULT_FARMER
+    first = cache.candidates(snap, "seeds", None, (lat, lon))
+    cache.candidates(snap, "seeds", None, (lat + 0.05, lon))
+    cache.candidates(snap, "seeds", None, (lat, lon))  # refreshes the first cell
+    cache.candidates(snap, "seeds", None, (lat + 0.10, lon))
+    assert cache.stats()["evictions"] == 1
+    assert cache.candidates(snap, "seeds", None, (lat, lon)) is first
+
+
+def test_reload_invalidates(tmp_path):
+    data = generate_catalog(500, spread_km=20, seed=5)
+    path = tmp_path / "catalog.json"
+    path.write_text(json.dumps(data))
+    store = CatalogStore(str(path))
+    cache = RankingCache()
+    preference = {"quality": "average", "quantity": "average", "distance": "average", "price": "high"}
+
+    old = store.snapshot()
+    before = cache.candidates(old, "seeds", None, DEFAULT_FARMER)
+    assert before.rows
+
+    for item in data["seeds"]:
+        item["price"] *= 2
+    path.write_text(json.dumps(data, indent=1))  # new size, so the store re-reads it
+    new = store.snapshot()
+    assert new.version == old.version + 1
+
+    after = cache.candidates(new, "seeds", None, DEFAULT_FARMER)
+    assert after is not before
+    assert cache.stats()["invalidations"] == 1
+    assert cache.stats()["entries"] == 1
+    items, index = new.select("seeds")
+    assert rank_candidates(after, preference, DEFAULT_FARMER, 10) == rank_items_topk(
+        items, preference, 10, DEFAULT_FARMER, index
+    )
+    # A request still holding the old snapshot does not repopulate the cache.
+    stale = cache.candidates(old, "seeds", None, DEFAULT_FARMER)
+    assert [row[0]["price"] for row in stale.rows] == [row[0]["price"] / 2 for row in after.rows]
+    assert cache.candidates(new, "seeds", None, DEFAULT_FARMER) is after
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_same_ranking_as_rank_items_topk():
+    rng = random.Random(11)
+    snap = snapshot(seed=11)
+    cache = RankingCache(cell_deg=0.05)
+    farmers = [random_point(rng, DEFAULT_FARMER, 60) for _ in range(15)]
+    # Two farmers sharing a cell, so cached entries are reused too.
+    farmers.append((farmers[0][0] + 1e-4, farmers[0][1] - 1e-4))
+    for category, query in (("seeds", None), ("seeds", "rice"), ("fertilizers", "urea"), ("pesticides", None)):
+        items, index = snap.select(category, query)
+        for farmer in farmers:
+            for preference in PREFERENCES[::8]:
+                for k in (1, 5, 50):
+                    expected = rank_items_topk(items, preference, k, farmer, index)
+                    entry = cache.candidates(snap, category, query, farmer)
+                    assert rank_candidates(entry, preference, farmer, k) == expected
+    assert cache.stats()["hits"] > 0
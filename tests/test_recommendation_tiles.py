@@ -0,0 +1,108 @@
+import os
+import json
+import random
+
+import pytest
+
+from benchmarks.synthetic_catalog import DEFAULT_FARMER, generate_catalog
+from catalog_store import CatalogStore
+from catalog_updates import ChangeLog, LiveCatalogStore
+from product_flow import PREFERENCES, menu_products, preference_levels
+from QQDP_scoring import rank_items_topk
+from recommendation_tiles import RecommendationTiles, build_tiles, check_tiles
+
+CELL_DEG = 0.05
+K = 6
+BBOX = (DEFAULT_FARMER[0] - 0.15, DEFAULT_FARMER[1] - 0.15, DEFAULT_FARMER[0] + 0.15, DEFAULT_FARMER[1] + 0.15)
+
+
+@pytest.fixture
+def built(tmp_path):
+    path = tmp_path / "catalog.json"
+    path.write_text(json.dumps(generate_catalog(300, spread_km=30, seed=4)))
+    store = CatalogStore(str(path))
+    tiles_path = str(tmp_path / "catalog.tiles")
+    build_tiles(store.snapshot(), tiles_path, cell_deg=CELL_DEG, k=K, bbox=BBOX)
+    return store, RecommendationTiles.load(tiles_path)
+
+
+def farmers_in_bbox(seed, n):
+    rng = random.Random(seed)
+    return [(rng.uniform(BBOX[0], BBOX[2]), rng.uniform(BBOX[1], BBOX[3])) for _ in range(n)]
+
+
+def test_tiles_match_live_ranking(built):
+    store, tiles = built
+    snapshot = store.snapshot()
+    assert tiles.digest == snapshot.digest
+    for n, (category, query) in enumerate(menu_products()):
+        items, index = snapshot.select(category, query)
+        for farmer in farmers_in_bbox(n, 8):
+            for preference in PREFERENCES:
+                for k in (1, K):
+                    expected = rank_items_topk(items, preference_levels(preference), k, farmer, index)
+                    assert tiles.rank(snapshot, category, query, preference, farmer, k) == expected
+    assert tiles.stats()["misses"] == 0
+    assert check_tiles(tiles, snapshot, samples=300) == []
+
+
+def test_untiled_requests_fall_back(built):
+    store, tiles = built
+    snapshot = store.snapshot()
+    category, query = next(iter(menu_products()))
+    assert tiles.rank(snapshot, category, query, "price", DEFAULT_FARMER, K) is not None
+    assert tiles.rank(snapshot, category, query, "price", DEFAULT_FARMER, K + 1) is None
+    assert tiles.rank(snapshot, category, "not on the menu", "price", DEFAULT_FARMER, 3) is None
+    assert tiles.rank(snapshot, category, query, "price", (BBOX[2] + 1, BBOX[3]), 3) is None
+    assert tiles.stats()["misses"] == 3
+
+
+def test_touched_catalog_keeps_tiles_and_edited_catalog_falls_back(built, monkeypatch):
+    app = pytest.importorskip("app")
+    store, tiles = built
+    monkeypatch.setattr(app, "tiles", tiles)
+    category, query = next(iter(menu_products()))
+    farmer = DEFAULT_FARMER
+
+    def live(snapshot, preference):
+        items, index = snapshot.select(category, query)
+        return rank_items_topk(items, preference_levels(preference), K, farmer, index)
+
+    first = store.snapshot()
+    assert app.rank_top(first, category, query, "quality", farmer, K) == live(first, "quality")
+    assert tiles.hits == 1
+
+    # Same bytes, new mtime: the store keeps its snapshot and the tiles stay fresh.
+    st = os.stat(store.path)
+    os.utime(store.path, (st.st_atime + 5, st.st_mtime + 5))
+    assert store.snapshot() is first
+    app.rank_top(first, category, query, "quality", farmer, K)
+    assert tiles.hits == 2 and tiles.stale == 0
+
+    # Edited catalog: the digest moves on, so ranking falls back to live.
+    with open(store.path) as f:
+        data = json.load(f)
+    for item in data[category]:
+        item["price"] = round(item["price"] * 0.5, 2)
+    with open(store.path, "w") as f:
+        json.dump(data, f)
+    os.utime(store.path, (st.st_atime + 10, st.st_mtime + 10))
+    edited = store.snapshot()
+    assert edited.version == first.version + 1
+    for preference in PREFERENCES:
+        assert app.rank_top(edited, category, query, preference, farmer, K) == live(edited, preference)
+    assert tiles.stale == len(PREFERENCES)
+    assert tiles.hits == 2
+    assert check_tiles(tiles, edited) == [{"error": "tiles were built from a different catalog version"}]
+
+
+def test_seller_updates_make_tiles_stale(built, tmp_path):
+    store, tiles = built
+    live = LiveCatalogStore(store.path, ChangeLog(str(tmp_path / "changes.sqlite3")), poll_seconds=0)
+    category, query = next(iter(menu_products()))
+    assert tiles.rank(live.snapshot(), category, query, "price", DEFAULT_FARMER, 3) is not None
+
+    item_id = live.snapshot().get(category)[0]["item_id"]
+    live.apply([{"op": "patch", "category": category, "item_id": item_id, "price": 1}])
+    assert tiles.rank(live.snapshot(), category, query, "price", DEFAULT_FARMER, 3) is None
+    assert tiles.stale == 1
@@ -0,0 +1,65 @@
+import math
+
+import pytest
+
+pytest.importorskip("hypothesis")
+from hypothesis import given, settings, strategies as st
+
+from QQDP_scoring import MAX_DISTANCE_KM, haversine_km, within_radius_box
+
+lats = st.floats(min_value=-90, max_value=90, allow_nan=False)
+lons = st.floats(min_value=-180, max_value=180, allow_nan=False)
+points = st.tuples(lats, lons)
+radii = st.one_of(st.just(MAX_DISTANCE_KM), st.floats(min_value=0.01, max_value=5000))
+
+
+@st.composite
+def farmer_and_sellers(draw):
+    farmer = draw(points)
+    # Mix sellers anywhere with sellers close to the farmer (and across the
+    # antimeridian or a pole from it), where the box edges matter.
+    near = st.tuples(
+        st.floats(min_value=-3, max_value=3).map(lambda d: max(-90.0, min(90.0, farmer[0] + d))),
+        st.floats(min_value=-6, max_value=6).map(lambda d: (farmer[1] + d + 180) % 360 - 180),
+    )
+    sellers = draw(st.lists(st.one_of(points, near), max_size=40))
+    return farmer, sellers
+
+
+def items_at(sellers):
+    return [{"item_id": n, "seller_lat": lat, "seller_lon": lon} for n, (lat, lon) in enumerate(sellers)]
+
+
+@settings(max_examples=500, deadline=None)
+@given(farmer_and_sellers(), radii)
+def test_box_then_haversine_matches_brute_force(case, radius_km):
+    farmer, sellers = case
+    items = items_at(sellers)
+    expected = [
+        item["item_id"] for item in items
+        if haversine_km(farmer[0], farmer[1], item["seller_lat"], item["seller_lon"]) <= radius_km
+    ]
+    kept = within_radius_box(items, farmer, radius_km)
+    assert [
+        item["item_id"] for item in kept
+        if haversine_km(farmer[0], farmer[1], item["seller_lat"], item["seller_lon"]) <= radius_km
+    ] == expected
+
+
+@settings(max_examples=300, deadline=None)
+@given(points, radii)
+def test_box_keeps_sellers_on_the_circle(farmer, radius_km):
+    # Points just inside radius_km on 24 bearings, the hardest case for the box.
+    lat1, lon1 = math.radians(farmer[0]), math.radians(farmer[1])
+    d = radius_km * 0.999999 / 6371
+    sellers = []
+    for bearing_deg in range(0, 360, 15):
+        b = math.radians(bearing_deg)
+        lat2 = math.asin(math.sin(lat1) * math.cos(d) + math.cos(lat1) * math.sin(d) * math.cos(b))
+        lon2 = lon1 + math.atan2(math.sin(b) * math.sin(d) * math.cos(lat1), math.cos(d) - math.sin(lat1) * math.sin(lat2))
+        sellers.append((math.degrees(lat2), (math.degrees(lon2) + 180) % 360 - 180))
+    items = items_at(sellers)
+    inside = [item for item in items
+              if haversine_km(farmer[0], farmer[1], item["seller_lat"], item["seller_lon"]) <= radius_km]
+    kept = within_radius_box(items, farmer, radius_km)
+    assert all(item in kept for item in inside)